@@ -0,0 +1,66 @@
+"""
+micro benchmark of parsing the emoticon message
+
+    PYTHONPATH=src/ python benchmarks/bench_emoticon.py
+"""
+import asyncio
+import logging
+import time
+import timeit
+from xml.dom import minidom
+
+from wechaty_puppet import FileBox
+
+from wechaty_puppet_service.utils import message_emoticon, parse_emoticon
+
+MESSAGE = (
+    '<msg><emoji fromusername="wxid_from" tousername="wxid_to" type="2" '
+    'idbuffer="media:0_0" md5="e5a7d2b5c1b1f4b6d0c6a1e3b1f5d7a9" len="102400" '
+    'productid="" androidmd5="e5a7d2b5c1b1f4b6d0c6a1e3b1f5d7a9" androidlen="102400" '
+    's60v3md5="e5a7d2b5c1b1f4b6d0c6a1e3b1f5d7a9" s60v3len="102400" '
+    'cdnurl="http://emoji.qpic.cn/wx_emoji/abc/?a=1&amp;b=2" designerid="" '
+    'thumburl="" encrypturl="http://emoji.qpic.cn/wx_emoji/def/" '
+    'aeskey="0123456789abcdef0123456789abcdef" width="240" height="240" />'
+    '<gameext type="0" content="0" /></msg>'
+)
+NUMBER = 20000
+
+
+def minidom_emoticon(message: str) -> FileBox:
+    """the previous implementation which builds the dom"""
+    dom_tree = minidom.parseString(message)
+    collection = dom_tree.documentElement
+    return FileBox.from_url(
+        url=collection.getElementsByTagName('emoji')[0].getAttribute('cdnurl'),
+        name=collection.getElementsByTagName('emoji')[0].getAttribute('md5') + '.gif'
+    )
+
+
+async def cached_emoticons() -> None:
+    """the same sticker is received again and again"""
+    for _ in range(NUMBER):
+        await message_emoticon(MESSAGE)
+
+
+def main() -> None:
+    """compare the parsers, and the md5 cache of the same sticker"""
+    # the logging of FileBox is not the part of the benchmark
+    logging.disable(logging.WARNING)
+
+    results = {
+        'minidom + FileBox.from_url': timeit.timeit(
+            lambda: minidom_emoticon(MESSAGE), number=NUMBER),
+        'expat': timeit.timeit(
+            lambda: parse_emoticon(MESSAGE), number=NUMBER),
+    }
+    start = time.perf_counter()
+    asyncio.run(cached_emoticons())
+    results['expat + md5 cache'] = time.perf_counter() - start
+
+    baseline = results['minidom + FileBox.from_url']
+    for name, seconds in results.items():
+        print(f'{name:<30}{seconds / NUMBER * 1e6:>10.1f}us/op{baseline / seconds:>8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
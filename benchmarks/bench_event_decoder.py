@@ -0,0 +1,147 @@
+"""
+micro benchmark of decoding the event responses
+
+    PYTHONPATH=src/ python benchmarks/bench_event_decoder.py
+"""
+import json
+import logging
+import random
+import time
+from typing import Callable, List
+
+from wechaty_grpc.wechaty.puppet import EventResponse
+from wechaty_puppet import (
+    EventFriendshipPayload,
+    EventHeartbeatPayload,
+    EventMessagePayload,
+    EventRoomInvitePayload,
+    EventRoomTopicPayload,
+    EventScanPayload,
+    EventType,
+    PuppetOptions,
+    ScanStatus,
+)
+from wechaty_puppet.schemas.types import PayloadType
+
+from wechaty_puppet_service import PuppetService
+
+NUMBER = 100000
+
+# the share of the event types in the event stream
+EVENT_MIX = [
+    (0.70, EventType.EVENT_TYPE_MESSAGE, lambda i: {'messageId': f'message-{i}'}),
+    (0.10, EventType.EVENT_TYPE_HEARTBEAT, lambda i: {'data': 'heartbeat', 'timeout': 60}),
+    (0.05, EventType.EVENT_TYPE_ROOM_TOPIC, lambda i: {
+        'changerId': 'contact-id', 'newTopic': f'topic-{i}', 'oldTopic': 'topic',
+        'roomId': f'room-{i % 100}', 'timestamp': i}),
+    (0.05, EventType.EVENT_TYPE_FRIENDSHIP, lambda i: {'friendshipId': f'friendship-{i}'}),
+    (0.05, EventType.EVENT_TYPE_SCAN, lambda i: {'status': 2, 'qrcode': 'qrcode'}),
+    (0.05, EventType.EVENT_TYPE_ROOM_INVITE, lambda i: {'roomInvitationId': f'invitation-{i}'}),
+]
+
+
+def make_events() -> List[EventResponse]:
+    """the event responses in the mix"""
+    rand = random.Random(0)
+    weights = [weight for weight, _, _ in EVENT_MIX]
+    events = []
+    for i in range(NUMBER):
+        _, event_type, make_data = rand.choices(EVENT_MIX, weights)[0]
+        events.append(EventResponse(type=event_type, payload=json.dumps(make_data(i))))
+    return events
+
+
+# pylint: disable=W0212
+def legacy_on_event_response(puppet: PuppetService, response: EventResponse) -> None:
+    """the previous if/elif chain, for the event types in the mix"""
+    payload_data: dict = json.loads(response.payload)
+    if response.type == int(EventType.EVENT_TYPE_SCAN):
+        payload = EventScanPayload(
+            status=ScanStatus(payload_data['status']),
+            qrcode=payload_data.get('qrcode', None),
+            data=payload_data.get('data', None)
+        )
+        puppet._event_stream.emit('scan', payload)
+
+    elif response.type == int(EventType.EVENT_TYPE_DONG):
+        pass
+
+    elif response.type == int(EventType.EVENT_TYPE_MESSAGE):
+        event_message_payload = EventMessagePayload(message_id=payload_data['messageId'])
+        puppet.message_store.add(event_message_payload.message_id)
+        puppet._event_stream.emit('message', event_message_payload)
+
+    elif response.type == int(EventType.EVENT_TYPE_HEARTBEAT):
+        payload_data = {'data': payload_data['data']}
+        payload = EventHeartbeatPayload(**payload_data)
+        puppet._event_stream.emit('heartbeat', payload)
+
+    elif response.type == int(EventType.EVENT_TYPE_ERROR):
+        pass
+
+    elif response.type == int(EventType.EVENT_TYPE_FRIENDSHIP):
+        payload = EventFriendshipPayload(friendship_id=payload_data.get('friendshipId'))
+        puppet._event_stream.emit('friendship', payload)
+
+    elif response.type == int(EventType.EVENT_TYPE_ROOM_JOIN):
+        pass
+
+    elif response.type == int(EventType.EVENT_TYPE_ROOM_INVITE):
+        payload = EventRoomInvitePayload(
+            room_invitation_id=payload_data.get('roomInvitationId', None))
+        puppet._event_stream.emit('room-invite', payload)
+
+    elif response.type == int(EventType.EVENT_TYPE_ROOM_LEAVE):
+        pass
+
+    elif response.type == int(EventType.EVENT_TYPE_ROOM_TOPIC):
+        payload = EventRoomTopicPayload(
+            changer_id=payload_data.get('changerId'),
+            new_topic=payload_data.get('newTopic'),
+            old_topic=payload_data.get('oldTopic'),
+            room_id=payload_data.get('roomId'),
+            timestamp=payload_data.get('timestamp')
+        )
+        puppet._invalidate_payload(PayloadType.PAYLOAD_TYPE_ROOM, payload.room_id)
+        puppet.room_search_index.update(payload.room_id, payload.new_topic)
+        puppet._event_stream.emit('room-topic', payload)
+
+
+def events_per_second(handle: Callable[[EventResponse], None],
+                      events: List[EventResponse]) -> float:
+    """the throughput of handling the events"""
+    start = time.perf_counter()
+    for response in events:
+        handle(response)
+    return len(events) / (time.perf_counter() - start)
+
+
+def make_puppet(event_names: List[str]) -> PuppetService:
+    """the puppet with the listeners of the events"""
+    puppet = PuppetService(PuppetOptions(end_point='127.0.0.1:8788', token='your-token'))
+    for event_name in event_names:
+        puppet.on(event_name, lambda payload: None)
+    return puppet
+
+
+def main() -> None:
+    """compare the if/elif chain with the table-driven decoder"""
+    logging.disable(logging.WARNING)
+    events = make_events()
+
+    all_events = ['message', 'heartbeat', 'room-topic', 'friendship', 'scan', 'room-invite']
+    for title, event_names in [('all events are listened', all_events),
+                               ('only message is listened', ['message'])]:
+        legacy_puppet = make_puppet(event_names)
+        legacy = events_per_second(
+            lambda response, puppet=legacy_puppet: legacy_on_event_response(puppet, response),
+            events)
+        table = events_per_second(make_puppet(event_names)._on_event_response, events)
+
+        print(f'{title}:')
+        print(f'    if/elif chain    {legacy:>12,.0f} events/s')
+        print(f'    decoder table    {table:>12,.0f} events/s{table / legacy:>8.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+micro benchmark of the json codecs over the event payloads
+
+    PYTHONPATH=src/ python benchmarks/bench_json_codec.py
+"""
+import json
+import timeit
+from typing import Dict, List
+
+from wechaty_puppet_service.codec import CODEC_FACTORIES, JSONCodec
+
+# the payloads of the event stream, the message events are the majority
+PAYLOADS: List[str] = [
+    json.dumps({'messageId': f'message-{i}'}) for i in range(80)
+] + [
+    json.dumps({'data': 'heartbeat', 'timeout': 60000}) for _ in range(10)
+] + [
+    json.dumps({
+        'inviteeIdList': [f'wxid_{j}' for j in range(20)],
+        'inviterId': 'wxid_inviter',
+        'roomId': f'room-{i}@chatroom',
+        'timestamp': 1600000000 + i,
+    }) for i in range(5)
+] + [
+    json.dumps({
+        'changerId': 'wxid_changer',
+        'newTopic': '新的群名称 new topic',
+        'oldTopic': '旧的群名称 old topic',
+        'roomId': f'room-{i}@chatroom',
+        'timestamp': 1600000000 + i,
+    }, ensure_ascii=False) for i in range(5)
+]
+NUMBER = 2000
+
+
+def main() -> None:
+    """compare the loads and dumps of the installed codecs"""
+    codecs: Dict[str, JSONCodec] = {}
+    for name, factory in CODEC_FACTORIES.items():
+        try:
+            codecs[name] = factory()
+        except ImportError:
+            print(f'{name:<10}not installed')
+    objects = [json.loads(payload) for payload in PAYLOADS]
+
+    baseline: Dict[str, float] = {}
+    for name in reversed(list(codecs)):
+        codec = codecs[name]
+        results = {
+            'loads': timeit.timeit(
+                lambda: [codec.loads(payload) for payload in PAYLOADS], number=NUMBER),
+            'dumps': timeit.timeit(
+                lambda: [codec.dumps(obj) for obj in objects], number=NUMBER),
+        }
+        for operation, seconds in results.items():
+            baseline.setdefault(operation, seconds)
+            per_op = seconds / NUMBER / len(PAYLOADS) * 1e6
+            print(f'{name:<10}{operation:<8}{per_op:>8.2f}us/op'
+                  f'{baseline[operation] / seconds:>8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+benchmark of the event throughput by replaying a recorded event stream, the
+    recording is synthesized if it's not given
+
+    PYTHONPATH=src/ python benchmarks/bench_replay.py [events.rec]
+
+The recording can be captured by WECHATY_PUPPET_SERVICE_EVENT_RECORDING=events.rec
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Callable
+
+from wechaty_grpc.wechaty.puppet import EventResponse, EventType
+from wechaty_puppet import EventMessagePayload, MessagePayload, PuppetOptions
+
+from wechaty_puppet_service import PuppetService
+from wechaty_puppet_service.recording import EventRecorder, read_recording
+
+NUMBER = 50000
+ROOMS = 100
+
+
+def make_recording(path: str) -> None:
+    """messages of many rooms with the heartbeats in between"""
+    rand = random.Random(0)
+    recorder = EventRecorder(path, clock=lambda: 0.0)
+    for i in range(NUMBER):
+        if rand.random() < 0.1:
+            response = EventResponse(type=EventType.EVENT_TYPE_HEARTBEAT,
+                                     payload=json.dumps({'data': 'heartbeat'}))
+        else:
+            response = EventResponse(type=EventType.EVENT_TYPE_MESSAGE,
+                                     payload=json.dumps({'messageId': f'message-{i}'}))
+        recorder.record(response)
+    recorder.close()
+
+
+def make_puppet(path: str) -> PuppetService:
+    """the puppet with the payloads of the recorded messages cached"""
+    puppet = PuppetService(PuppetOptions(end_point='127.0.0.1:8788', token='your-token'))
+    # there is no service to fetch the evicted payloads
+    puppet.message_payload_cache.max_size = NUMBER
+    for _, response in read_recording(path):
+        if response.type == EventType.EVENT_TYPE_MESSAGE:
+            message_id = json.loads(response.payload)['messageId']
+            room_id = f'room-{hash(message_id) % ROOMS}'
+            puppet.message_payload_cache.set(
+                message_id, MessagePayload(id=message_id, room_id=room_id))
+    return puppet
+
+
+async def replay(path: str, setup: Callable[[PuppetService], None]) -> float:
+    """replay as fast as possible, with a listener which waits for 1ms"""
+    puppet = make_puppet(path)
+    setup(puppet)
+
+    async def on_message(_: EventMessagePayload) -> None:
+        await asyncio.sleep(0.001)
+
+    puppet.on('message', on_message)
+    start = time.perf_counter()
+    count = await puppet.replay_events(path, speed=None)
+    if puppet.event_queue is not None:
+        while len(puppet.event_queue):
+            await asyncio.sleep(0.001)
+    if puppet.event_dispatcher is not None:
+        await puppet.event_dispatcher.join()
+        await puppet.event_dispatcher.stop()
+    else:
+        # the emitter schedules the async listeners as tasks
+        while len(asyncio.all_tasks()) > 1:
+            await asyncio.sleep(0.001)
+    return count / (time.perf_counter() - start)
+
+
+def main() -> None:
+    """compare the throughput of the inline emitting and the dispatcher"""
+    logging.disable(logging.WARNING)
+    with tempfile.TemporaryDirectory() as directory:
+        path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(directory, 'events.rec')
+        if len(sys.argv) <= 1:
+            make_recording(path)
+
+        results = {
+            'inline emit': lambda puppet: None,
+            'dispatcher(32 workers)': lambda puppet: puppet.enable_event_dispatch(workers=32),
+            'queue + dispatcher': lambda puppet: (
+                puppet.enable_event_queue(), puppet.enable_event_dispatch(workers=32)),
+        }
+        for name, setup in results.items():
+            print(f'{name:<30}{asyncio.run(replay(path, setup)):>10.0f} events/s')
+
+
+if __name__ == '__main__':
+    main()
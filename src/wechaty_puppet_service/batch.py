@@ -0,0 +1,156 @@
+"""
+Python Wechaty - https://github.com/wechaty/python-wechaty
+
+Authors:    Huan LI (李卓桓) <https://github.com/huan>
+            Jingjing WU (吴京京) <https://github.com/wj-Mcat>
+
+2020-now @ Copyright Wechaty
+
+Licensed under the Apache License, Version 2.0 (the 'License');
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an 'AS IS' BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass, field
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    Iterable,
+    Optional,
+)
+
+from wechaty_puppet import get_logger
+
+from wechaty_puppet_service.cache import KeyType, ValueType
+
+log = get_logger('PayloadBatch')
+
+# the max count of in-flight calls of one batch, so a batch of N ids takes about
+# N / BATCH_CONCURRENCY round trips, eg: 16 round trips for 500 ids
+BATCH_CONCURRENCY = 32
+
+# seconds to collect the single calls into one micro batch
+MICRO_BATCH_WINDOW = 0.005
+MICRO_BATCH_MAX_SIZE = 500
+
+
+@dataclass
+class BatchResult(Generic[KeyType, ValueType]):
+    """the payloads and the errors of one batch, keyed by the ids"""
+    results: Dict[KeyType, ValueType] = field(default_factory=dict)
+    errors: Dict[KeyType, BaseException] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        """whether all of the ids are resolved"""
+        return not self.errors
+
+    def __len__(self) -> int:
+        return len(self.results) + len(self.errors)
+
+
+async def gather_batch(keys: Iterable[KeyType],
+                       fetch: Callable[[KeyType], Awaitable[ValueType]],
+                       concurrency: int = BATCH_CONCURRENCY
+                       ) -> BatchResult[KeyType, ValueType]:
+    """
+    fetch all of the keys with at most `concurrency` in-flight calls,
+        the failure of one key doesn't fail the others
+
+    Args:
+        keys (Iterable): the ids, the duplicated ones are fetched once
+        fetch (Callable): fetch the value of one key
+        concurrency (int): the max count of in-flight calls
+    """
+    result: BatchResult[KeyType, ValueType] = BatchResult()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch_one(key: KeyType) -> None:
+        async with semaphore:
+            try:
+                result.results[key] = await fetch(key)
+            # pylint: disable=W0703
+            except Exception as e:
+                result.errors[key] = e
+
+    await asyncio.gather(*[fetch_one(key) for key in dict.fromkeys(keys)])
+    return result
+
+
+# pylint: disable=R0902,R0903
+class MicroBatcher(Generic[KeyType, ValueType]):
+    """
+    collect the single-key loads issued within a short window into one batch,
+        so that a burst of lookups is sent out together with `concurrency` in-flight
+        calls, ie: about len(batch) / concurrency round trips instead of one by one
+    """
+
+    def __init__(self, fetch: Callable[[KeyType], Awaitable[ValueType]],
+                 window: float = MICRO_BATCH_WINDOW,
+                 max_size: int = MICRO_BATCH_MAX_SIZE,
+                 concurrency: int = BATCH_CONCURRENCY):
+        """
+        Args:
+            fetch (Callable): fetch the value of one key
+            window (float): seconds to wait for more keys after the first one
+            max_size (int): send out the batch immediately when it's full
+            concurrency (int): the max count of in-flight calls of one batch
+        """
+        self.fetch = fetch
+        self.window = window
+        self.max_size = max_size
+        self.concurrency = concurrency
+
+        self._pending: Dict[KeyType, asyncio.Future] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        self.batches: int = 0
+        self.loads: int = 0
+
+    async def load(self, key: KeyType) -> ValueType:
+        """load the value of key in the next batch"""
+        self.loads += 1
+        future = self._pending.get(key, None)
+        if future is None:
+            future = asyncio.get_event_loop().create_future()
+            self._pending[key] = future
+
+        if len(self._pending) >= self.max_size:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = asyncio.get_event_loop().call_later(self.window, self._dispatch)
+
+        return await asyncio.shield(future)
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        pending, self._pending = self._pending, {}
+        if pending:
+            self.batches += 1
+            asyncio.ensure_future(self._run(pending))
+
+    async def _run(self, pending: Dict[KeyType, asyncio.Future]) -> None:
+        log.debug('micro batch of %d keys', len(pending))
+        result = await gather_batch(pending.keys(), self.fetch, self.concurrency)
+        for key, future in pending.items():
+            if future.done():
+                continue
+            if key in result.errors:
+                future.set_exception(result.errors[key])
+            else:
+                future.set_result(result.results[key])
@@ -0,0 +1,222 @@
+"""
+Python Wechaty - https://github.com/wechaty/python-wechaty
+
+Authors:    Huan LI (李卓桓) <https://github.com/huan>
+            Jingjing WU (吴京京) <https://github.com/wj-Mcat>
+
+2020-now @ Copyright Wechaty
+
+Licensed under the Apache License, Version 2.0 (the 'License');
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an 'AS IS' BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+import time
+from collections import OrderedDict
+from functools import partial
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+# pylint: disable=C0103
+KeyType = TypeVar('KeyType', bound=Hashable)
+ValueType = TypeVar('ValueType')
+
+# the payloads are refreshed by the events, the ttl is the last line of defence
+PAYLOAD_CACHE_TTL = 10 * 60
+
+CONTACT_PAYLOAD_CACHE_SIZE = 10000
+ROOM_PAYLOAD_CACHE_SIZE = 2000
+ROOM_MEMBER_PAYLOAD_CACHE_SIZE = 50000
+
+# the message is handled soon after it's received, so its payloads are kept shortly
+MESSAGE_PAYLOAD_CACHE_TTL = 5 * 60
+MESSAGE_PAYLOAD_CACHE_SIZE = 5000
+
+
+# pylint: disable=R0902
+class TTLCache(Generic[KeyType, ValueType]):
+    """
+    bounded cache which evicts the least recently used item when it's full,
+        and the item is expired after the ttl
+
+    The version of the key is changed when it's deleted, so the value fetched
+        before the deletion can be rejected by `set(key, value, version=...)`.
+    """
+
+    def __init__(self, max_size: int, ttl: Optional[float] = PAYLOAD_CACHE_TTL):
+        """
+        Args:
+            max_size (int): the max count of items
+            ttl (float, optional): seconds that the item is alive, None means forever
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self._data: OrderedDict[KeyType, Tuple[float, ValueType]] = OrderedDict()
+        # the key -> the version when it's deleted, the other keys are in the base version
+        self._versions: Dict[KeyType, int] = {}
+        self._base_version: int = 0
+        self._version_counter = itertools.count(1)
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def get(self, key: KeyType) -> Optional[ValueType]:
+        """get the alive item and mark it as the most recently used one"""
+        item = self._data.get(key, None)
+        if item is None:
+            self.misses += 1
+            return None
+
+        expired_at, value = item
+        if expired_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def version(self, key: KeyType) -> int:
+        """the version of the key, which should be passed to `set()` after fetching"""
+        return self._versions.get(key, self._base_version)
+
+    def _bump(self, key: KeyType) -> None:
+        if len(self._versions) >= self.max_size:
+            # all of the in-flight values are rejected instead of keeping more versions
+            self._versions.clear()
+            self._base_version = next(self._version_counter)
+        self._versions[key] = next(self._version_counter)
+
+    def set(self, key: KeyType, value: ValueType, version: Optional[int] = None) -> bool:
+        """
+        save the item, and evict the least recently used one if it's full
+
+        Args:
+            version (int, optional): the version of key before the value is fetched
+
+        Return:
+            False if the key has been deleted since the version, and the value is
+                not saved
+        """
+        if version is not None and version != self.version(key):
+            return False
+
+        expired_at = float('inf') if self.ttl is None else time.monotonic() + self.ttl
+        self._data[key] = (expired_at, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+        return True
+
+    def delete(self, key: KeyType) -> None:
+        """remove the item if it exists, and reject the value fetched before it"""
+        self._data.pop(key, None)
+        self._bump(key)
+
+    def delete_if(self, predicate: Callable[[KeyType], bool]) -> None:
+        """remove all of the items whose key matches the predicate"""
+        for key in [key for key in self._data if predicate(key)]:
+            del self._data[key]
+            self._bump(key)
+
+    def clear(self) -> None:
+        """remove all of the items, and reject all of the values fetched before it"""
+        self._data.clear()
+        self._versions.clear()
+        self._base_version = next(self._version_counter)
+
+    def __contains__(self, key: KeyType) -> bool:
+        item = self._data.get(key, None)
+        return item is not None and item[0] >= time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """the metrics of the cache"""
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': self.hits / total if total else 0.0,
+        }
+
+
+class SingleFlight(Generic[KeyType, ValueType]):
+    """
+    merge the concurrent calls with the same key into one in-flight call,
+        and share its result with all of the callers
+    """
+
+    def __init__(self) -> None:
+        self._flights: Dict[KeyType, asyncio.Future] = {}
+
+        self.calls: int = 0
+        # the calls which are saved by sharing the in-flight one
+        self.shared: int = 0
+
+    async def do(self, key: KeyType, func: Callable[[], Awaitable[ValueType]]) -> ValueType:
+        """
+        call the func if there is no in-flight call with the same key,
+            otherwise wait for the in-flight one
+        """
+        flight = self._flights.get(key, None)
+        if flight is not None:
+            self.shared += 1
+        else:
+            self.calls += 1
+            flight = asyncio.ensure_future(func())
+            self._flights[key] = flight
+            flight.add_done_callback(partial(self._land, key))
+
+        # the shared call should not be cancelled by one of the callers
+        return await asyncio.shield(flight)
+
+    def _land(self, key: KeyType, flight: asyncio.Future) -> None:
+        if self._flights.get(key, None) is flight:
+            del self._flights[key]
+        # the exception has been raised to the callers if there are any
+        if not flight.cancelled():
+            flight.exception()
+
+    def forget(self, key: KeyType) -> None:
+        """the following calls will not share the in-flight one, eg: it's out of date"""
+        self._flights.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def stats(self) -> Dict[str, Any]:
+        """the metrics of the calls"""
+        return {
+            'in_flight': len(self._flights),
+            'calls': self.calls,
+            'shared': self.shared,
+        }
@@ -0,0 +1,270 @@
+"""
+Python Wechaty - https://github.com/wechaty/python-wechaty
+
+Authors:    Huan LI (李卓桓) <https://github.com/huan>
+            Jingjing WU (吴京京) <https://github.com/wj-Mcat>
+
+2020-now @ Copyright Wechaty
+
+Licensed under the Apache License, Version 2.0 (the 'License');
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an 'AS IS' BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from wechaty_grpc.wechaty import (
+    PuppetStub,
+)
+# pylint: disable=E0401
+from grpclib.client import Channel
+# pylint: disable=E0401
+from grpclib.const import Status
+# pylint: disable=E0401
+from grpclib.exceptions import GRPCError, StreamTerminatedError
+
+from wechaty_puppet import get_logger
+from wechaty_puppet.exceptions import WechatyPuppetError
+
+from wechaty_puppet_service.utils import extract_host_and_port
+
+log = get_logger('ChannelPool')
+
+# consecutive failures before the member is ejected from the pool
+MAX_FAILURES = 3
+# seconds that the ejected member will be re-admitted to the pool
+EJECTION_TIME = 30
+
+# the calls which are bound to the session of the event stream, eg: the dong
+#   event of ding() call will be sent back from the same service.
+PRIMARY_METHODS = {'start', 'stop', 'event', 'ding', 'logout'}
+
+_UNHEALTHY_STATUS = {Status.UNAVAILABLE, Status.DEADLINE_EXCEEDED}
+
+
+def _is_unhealthy_error(error: Exception) -> bool:
+    """connection level errors which are not caused by the request itself"""
+    if isinstance(error, GRPCError):
+        return error.status in _UNHEALTHY_STATUS
+    return isinstance(error, (OSError, StreamTerminatedError, asyncio.TimeoutError))
+
+
+# pylint: disable=R0902
+class PoolMember:
+    """a grpc channel to one of the service endpoints"""
+
+    def __init__(self, end_point: str, token: Optional[str] = None):
+        self.end_point = end_point
+
+        host, port = extract_host_and_port(end_point)
+        self.channel = Channel(host=host, port=port)
+        if token:
+            # pylint: disable=W0212
+            self.channel._authority = token
+
+        self.stub = PuppetStub(self.channel)
+
+        self.in_flight: int = 0
+        self.failures: int = 0
+        self.ejected_until: float = 0
+        # the ejected member waits for a passed health check to be re-admitted
+        self.needs_check: bool = False
+        self.checking: bool = False
+
+        self.calls: int = 0
+        self.errors: int = 0
+
+    def is_healthy(self, now: Optional[float] = None) -> bool:
+        """the ejected member is re-admitted after the ejection time"""
+        return not self.needs_check and (now or time.monotonic()) >= self.ejected_until
+
+    def eject(self, ejection_time: float, needs_check: bool = False) -> None:
+        """
+        eject the member from the pool for a while
+
+        Args:
+            ejection_time (float): seconds to eject the member
+            needs_check (bool): whether a health check should pass before it's re-admitted
+        """
+        self.ejected_until = time.monotonic() + ejection_time
+        self.needs_check = needs_check
+        # the re-admitted member starts with a clean record
+        self.failures = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """the metrics of the member"""
+        return {
+            'end_point': self.end_point,
+            'in_flight': self.in_flight,
+            'calls': self.calls,
+            'errors': self.errors,
+            'healthy': self.is_healthy(),
+        }
+
+
+class ChannelPool:
+    """
+    a pool of grpc channels to the services of the same account, which sends
+        every unary call to the member with the least outstanding requests
+    """
+
+    def __init__(self, end_points: List[str], token: Optional[str] = None,
+                 max_failures: int = MAX_FAILURES,
+                 ejection_time: float = EJECTION_TIME,
+                 health_check: Optional[Callable[[str], Awaitable[Optional[float]]]] = None):
+        """
+        Args:
+            end_points (List[str]): the endpoints, the first one is preferred
+            token (str, optional): the token of the service
+            max_failures (int): consecutive failures before the member is ejected
+            ejection_time (float): seconds to eject the unhealthy member
+            health_check (Callable, optional): probe the endpoint, which returns None
+                if it's unreachable. If it's set, the ejected member is re-admitted
+                only after the probe passes, otherwise after the ejection time
+        """
+        if not end_points:
+            raise WechatyPuppetError('there should be one endpoint in the channel pool at least')
+
+        self.members: List[PoolMember] = [
+            PoolMember(end_point, token) for end_point in end_points
+        ]
+        self.max_failures = max_failures
+        self.ejection_time = ejection_time
+        self.health_check = health_check
+        self._checks: Set[asyncio.Task] = set()
+
+    def _check_ejected(self, now: float) -> None:
+        """start the health checks of the members whose ejection time is over"""
+        for member in self.members:
+            if member.needs_check and not member.checking and now >= member.ejected_until:
+                member.checking = True
+                task = asyncio.ensure_future(self._readmit(member))
+                self._checks.add(task)
+                task.add_done_callback(self._checks.discard)
+
+    async def _readmit(self, member: PoolMember) -> None:
+        assert self.health_check is not None
+        try:
+            latency = await self.health_check(member.end_point)
+        finally:
+            member.checking = False
+
+        if latency is None:
+            member.eject(self.ejection_time, needs_check=True)
+            return
+        log.info('re-admit endpoint <%s> to the pool', member.end_point)
+        member.needs_check = False
+
+    @property
+    def primary(self) -> PoolMember:
+        """the first healthy member, which holds the event stream"""
+        now = time.monotonic()
+        if self.health_check is not None:
+            self._check_ejected(now)
+        for member in self.members:
+            if member.is_healthy(now):
+                return member
+        return min(self.members, key=lambda member: member.ejected_until)
+
+    def pick(self) -> PoolMember:
+        """the healthy member with the fewest in-flight calls"""
+        now = time.monotonic()
+        if self.health_check is not None:
+            self._check_ejected(now)
+        healthy = [member for member in self.members if member.is_healthy(now)]
+        if not healthy:
+            # fail open: the member which will be re-admitted first
+            return min(self.members, key=lambda member: member.ejected_until)
+        return min(healthy, key=lambda member: member.in_flight)
+
+    def eject(self, end_point: str, ejection_time: Optional[float] = None) -> None:
+        """
+        eject the member manually, eg: it can't be reached
+
+        Args:
+            end_point (str): the endpoint of the member
+            ejection_time (float, optional): seconds to eject it, defaults to the
+                ejection time of the pool
+        """
+        if ejection_time is None:
+            ejection_time = self.ejection_time
+        for member in self.members:
+            if member.end_point == end_point:
+                member.eject(ejection_time, needs_check=self.health_check is not None)
+
+    def record(self, member: PoolMember, error: Optional[Exception]) -> None:
+        """record the result of a call, the member is ejected after consecutive failures"""
+        if error is None:
+            member.failures = 0
+            return
+
+        member.errors += 1
+        if not _is_unhealthy_error(error):
+            return
+
+        member.failures += 1
+        if member.failures >= self.max_failures:
+            log.warning('eject endpoint <%s> from the pool for %ss after %s failures',
+                        member.end_point, self.ejection_time, member.failures)
+            member.eject(self.ejection_time, needs_check=self.health_check is not None)
+
+    async def call(self, method_name: str, **kwargs: Any) -> Any:
+        """invoke the unary call on the least loaded member"""
+        if method_name in PRIMARY_METHODS:
+            member = self.primary
+        else:
+            member = self.pick()
+
+        member.in_flight += 1
+        member.calls += 1
+        try:
+            response = await getattr(member.stub, method_name)(**kwargs)
+        except Exception as e:
+            self.record(member, e)
+            raise
+        finally:
+            member.in_flight -= 1
+
+        self.record(member, None)
+        return response
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """the metrics of all members"""
+        return [member.stats() for member in self.members]
+
+    def close(self) -> None:
+        """close all of the channels"""
+        for task in self._checks:
+            task.cancel()
+        for member in self.members:
+            member.channel.close()
+
+
+# pylint: disable=R0903
+class PooledPuppetStub:
+    """
+    PuppetStub compatible proxy which sends the calls through the ChannelPool
+    """
+
+    def __init__(self, pool: ChannelPool):
+        self._pool = pool
+
+    def __getattr__(self, name: str) -> Callable[..., Any]:
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if name == 'event':
+            # server stream can't be balanced, it's bound to the primary member
+            return self._pool.primary.stub.event
+        return partial(self._pool.call, name)
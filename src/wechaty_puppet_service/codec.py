@@ -0,0 +1,96 @@
+"""
+Python Wechaty - https://github.com/wechaty/python-wechaty
+
+Authors:    Huan LI (李卓桓) <https://github.com/huan>
+            Jingjing WU (吴京京) <https://github.com/wj-Mcat>
+
+2020-now @ Copyright Wechaty
+
+Licensed under the Apache License, Version 2.0 (the 'License');
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an 'AS IS' BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from __future__ import annotations
+
+import json
+from dataclasses import asdict, dataclass, is_dataclass
+from typing import Any, Callable, Dict, Optional, Union
+
+from wechaty_puppet.exceptions import WechatyPuppetConfigurationError
+
+# use the fastest installed backend
+AUTO_CODEC = 'auto'
+
+
+@dataclass
+class JSONCodec:
+    """the json backend which decodes the events and payloads"""
+    name: str
+    loads: Callable[[Union[str, bytes]], Any]
+    dumps: Callable[[Any], str]
+
+
+def _default(obj: Any) -> Any:
+    if is_dataclass(obj) and not isinstance(obj, type):
+        return asdict(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def _stdlib_codec() -> JSONCodec:
+    def dumps(obj: Any) -> str:
+        return json.dumps(obj, default=_default)
+
+    return JSONCodec(name='json', loads=json.loads, dumps=dumps)
+
+
+def _orjson_codec() -> JSONCodec:
+    # pylint: disable=C0415,E1101
+    import orjson
+
+    def dumps(obj: Any) -> str:
+        return orjson.dumps(obj, default=_default).decode('utf-8')
+
+    return JSONCodec(name='orjson', loads=orjson.loads, dumps=dumps)
+
+
+# the name of backend -> the factory of codec, the faster one is preferred
+CODEC_FACTORIES: Dict[str, Callable[[], JSONCodec]] = {
+    'orjson': _orjson_codec,
+    'json': _stdlib_codec,
+}
+
+
+def get_json_codec(name: Optional[str] = AUTO_CODEC) -> JSONCodec:
+    """
+    get the json codec by the name of backend
+
+    Args:
+        name (str, optional): orjson, json or auto, the auto one is the fastest
+            installed backend
+    """
+    name = name or AUTO_CODEC
+    if name == AUTO_CODEC:
+        for factory in CODEC_FACTORIES.values():
+            try:
+                return factory()
+            except ImportError:
+                continue
+
+    named_factory = CODEC_FACTORIES.get(name, None)
+    if named_factory is None:
+        raise WechatyPuppetConfigurationError(
+            f'unknown json codec <{name}>, it should be one of: '
+            f'{", ".join([AUTO_CODEC, *CODEC_FACTORIES])}')
+    try:
+        return named_factory()
+    except ImportError as e:
+        raise WechatyPuppetConfigurationError(
+            f'json codec <{name}> is not installed, try: pip install {name}') from e
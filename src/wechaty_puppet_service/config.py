@@ -27,6 +27,13 @@ logger = get_logger('WechatyPuppetServiceConfig')
 # send 1M data in every async request
 CHUNK_SIZE = 1024 * 1024
 
+# the endpoint resolved from chatie server is fresh in 1 hour, and it can be
+# served while refreshing in the background for another day
+ENDPOINT_CACHE_TTL = 60 * 60
+ENDPOINT_CACHE_MAX_STALE = 24 * 60 * 60
+
+CHATIE_ENDPOINT_URL = 'https://api.chatie.io/v0/hosties/{token}'
+
 
 def get_token() -> Optional[str]:
     """
@@ -44,3 +51,162 @@ def get_endpoint() -> Optional[str]:
     return os.environ.get('WECHATY_PUPPET_SERVICE_ENDPOINT', None) or \
         os.environ.get('ENDPOINT', None) or \
         os.environ.get('endpoint', None) or None
+
+
+def get_cache_dir() -> str:
+    """
+    get the directory which stores the local cache files of puppet service,
+        eg: the endpoint discovery cache
+    """
+    return os.environ.get('WECHATY_PUPPET_SERVICE_CACHE_DIR', None) or \
+        os.path.join(os.path.expanduser('~'), '.wechaty', 'puppet-service')
+
+
+def get_endpoint_cache_ttl() -> float:
+    """
+    get the time-to-live(seconds) of the cached endpoint from environment variable
+    """
+    ttl = os.environ.get('WECHATY_PUPPET_SERVICE_ENDPOINT_CACHE_TTL', None)
+    if ttl is None:
+        return ENDPOINT_CACHE_TTL
+    return float(ttl)
+
+
+def get_ding_interval() -> Optional[float]:
+    """
+    get the interval(seconds) of the liveness probe from environment variable,
+        the probe is disabled if it's not set
+    """
+    interval = os.environ.get('WECHATY_PUPPET_SERVICE_DING_INTERVAL', None)
+    if not interval:
+        return None
+    return float(interval)
+
+
+def get_payload_store_path() -> Optional[str]:
+    """
+    get the path of the sqlite payload store from environment variable,
+        the store is disabled if it's not set
+    """
+    return os.environ.get('WECHATY_PUPPET_SERVICE_PAYLOAD_STORE', None) or None
+
+
+def get_prefetch_on_ready() -> bool:
+    """
+    whether to prefetch all of the contacts and rooms on ready event
+    """
+    value = os.environ.get('WECHATY_PUPPET_SERVICE_PREFETCH', '')
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+
+def get_micro_batch_window() -> Optional[float]:
+    """
+    get the window(seconds) to collect the payload lookups into one batch from
+        environment variable, the micro batching is disabled if it's not set
+    """
+    window = os.environ.get('WECHATY_PUPPET_SERVICE_MICRO_BATCH_WINDOW', None)
+    if not window:
+        return None
+    return float(window)
+
+
+def get_message_store_size() -> Optional[int]:
+    """
+    get the max count of messages kept in memory from environment variable
+    """
+    size = os.environ.get('WECHATY_PUPPET_SERVICE_MESSAGE_STORE_SIZE', None)
+    if not size:
+        return None
+    return int(size)
+
+
+def get_message_spill_path() -> Optional[str]:
+    """
+    get the path of the sqlite database which keeps the messages evicted from
+        memory from environment variable, the spill is disabled if it's not set
+    """
+    return os.environ.get('WECHATY_PUPPET_SERVICE_MESSAGE_SPILL', None) or None
+
+
+def get_file_box_cache_dir() -> Optional[str]:
+    """
+    get the directory of the file box cache from environment variable,
+        the cache is disabled if it's not set
+    """
+    return os.environ.get('WECHATY_PUPPET_SERVICE_FILE_BOX_CACHE', None) or None
+
+
+def get_file_box_cache_size() -> Optional[int]:
+    """
+    get the byte budget of the file box cache from environment variable
+    """
+    size = os.environ.get('WECHATY_PUPPET_SERVICE_FILE_BOX_CACHE_SIZE', None)
+    if not size:
+        return None
+    return int(size)
+
+
+def get_json_codec_name() -> Optional[str]:
+    """
+    get the backend of json codec from environment variable: auto, orjson or json
+    """
+    return os.environ.get('WECHATY_PUPPET_SERVICE_JSON_CODEC', None) or None
+
+
+def get_event_dispatch_workers() -> Optional[int]:
+    """
+    get the count of workers which emit the events to the listeners from environment
+        variable, the events are emitted inline if it's not set
+    """
+    workers = os.environ.get('WECHATY_PUPPET_SERVICE_EVENT_DISPATCH_WORKERS', None)
+    if not workers:
+        return None
+    return int(workers)
+
+
+def get_event_queue_size() -> Optional[int]:
+    """
+    get the max count of events queued in memory between the reader of event stream
+        and the listeners from environment variable, the queue is disabled if it's not set
+    """
+    size = os.environ.get('WECHATY_PUPPET_SERVICE_EVENT_QUEUE_SIZE', None)
+    if not size:
+        return None
+    return int(size)
+
+
+def get_event_spill_path() -> Optional[str]:
+    """
+    get the path of sqlite database which keeps the overflowed events from
+        environment variable
+    """
+    return os.environ.get('WECHATY_PUPPET_SERVICE_EVENT_SPILL', None) or None
+
+
+def get_event_dedup_window() -> Optional[float]:
+    """
+    get the seconds to remember the received events from environment variable, the
+        duplicated events are suppressed in the window. It's disabled if it's not set
+    """
+    window = os.environ.get('WECHATY_PUPPET_SERVICE_EVENT_DEDUP_WINDOW', None)
+    if not window:
+        return None
+    return float(window)
+
+
+def get_event_recording_path() -> Optional[str]:
+    """
+    get the path of the file which records the raw event stream from environment variable
+    """
+    return os.environ.get('WECHATY_PUPPET_SERVICE_EVENT_RECORDING', None) or None
+
+
+def get_enrich_message_deadline() -> Optional[float]:
+    """
+    get the seconds to wait for the payloads of the enriched-message event from
+        environment variable, the enriched-message event is disabled if it's not set
+    """
+    deadline = os.environ.get('WECHATY_PUPPET_SERVICE_ENRICH_MESSAGE_DEADLINE', None)
+    if not deadline:
+        return None
+    return float(deadline)
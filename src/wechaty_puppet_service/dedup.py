@@ -0,0 +1,166 @@
+"""
+Python Wechaty - https://github.com/wechaty/python-wechaty
+
+Authors:    Huan LI (李卓桓) <https://github.com/huan>
+            Jingjing WU (吴京京) <https://github.com/wj-Mcat>
+
+2020-now @ Copyright Wechaty
+
+Licensed under the Apache License, Version 2.0 (the 'License');
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an 'AS IS' BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from __future__ import annotations
+
+import hashlib
+import time
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from wechaty_grpc.wechaty.puppet import EventType
+from wechaty_puppet import get_logger
+
+log = get_logger('EventDeduplicator')
+
+# seconds to remember the seen events
+EVENT_DEDUP_WINDOW = 600
+# the max count of the remembered events
+EVENT_DEDUP_SIZE = 100000
+
+# event type -> the fields of the decoded payload which identify the event
+DEDUP_ID_FIELDS: Dict[int, Tuple[str, ...]] = {
+    int(EventType.EVENT_TYPE_MESSAGE): ('messageId',),
+    int(EventType.EVENT_TYPE_FRIENDSHIP): ('friendshipId',),
+    int(EventType.EVENT_TYPE_ROOM_INVITE): ('roomInvitationId',),
+    int(EventType.EVENT_TYPE_ROOM_JOIN): ('roomId', 'inviterId', 'inviteeIdList', 'timestamp'),
+    int(EventType.EVENT_TYPE_ROOM_LEAVE): ('roomId', 'removerId', 'removeeIdList', 'timestamp'),
+    int(EventType.EVENT_TYPE_ROOM_TOPIC): ('roomId', 'changerId', 'newTopic', 'timestamp'),
+}
+
+
+def _fingerprint(event_type: int, data: dict) -> Optional[int]:
+    """
+    the 64-bit fingerprint of the event type and the ids of the decoded payload
+
+    Return:
+        None if any of the ids is missing, the event is never suppressed
+    """
+    ids = []
+    for field in DEDUP_ID_FIELDS[event_type]:
+        value = data.get(field, None)
+        if value is None or value == '' or value == []:
+            return None
+        ids.append(','.join(value) if isinstance(value, list) else str(value))
+
+    key = '\x1f'.join([str(event_type), *ids])
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8)
+    return int.from_bytes(digest.digest(), 'big')
+
+
+class SeenSet:
+    """
+    time-windowed and memory-bounded set of the 64-bit fingerprints.
+
+    The fingerprints are kept in two generations, the older one is dropped when the
+        newer one is as old as the window or half full. So a fingerprint is
+        remembered for at least the window unless more than half of the max size
+        of fingerprints are added in the window, and at most the max size of
+        fingerprints are kept.
+    """
+
+    def __init__(self, window: float = EVENT_DEDUP_WINDOW, max_size: int = EVENT_DEDUP_SIZE,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            window (float): seconds to remember the fingerprints
+            max_size (int): the max count of fingerprints
+            clock (Callable): the monotonic clock in seconds
+        """
+        self.window = window
+        self.max_size = max_size
+        self._clock = clock
+
+        self._current: Set[int] = set()
+        self._previous: Set[int] = set()
+        self._rotated_at = clock()
+
+    def _rotate(self) -> None:
+        now = self._clock()
+        if now - self._rotated_at >= self.window or \
+                len(self._current) >= self.max_size // 2:
+            self._current, self._previous = set(), self._current
+            self._rotated_at = now
+
+    def add(self, fingerprint: int) -> bool:
+        """
+        remember the fingerprint
+
+        Return:
+            True if it has been seen in the window
+        """
+        self._rotate()
+        if fingerprint in self._current or fingerprint in self._previous:
+            return True
+        self._current.add(fingerprint)
+        return False
+
+    def clear(self) -> None:
+        """forget all of the fingerprints"""
+        self._current.clear()
+        self._previous.clear()
+
+    def __len__(self) -> int:
+        return len(self._current) + len(self._previous)
+
+
+class EventDeduplicator:
+    """
+    suppress the events which are replayed by the service after reconnecting,
+        the events are identified by their type and the ids of the decoded payload,
+        eg: the message id, or the room id, the member ids and the timestamp of the
+        room events.
+    """
+
+    def __init__(self, window: float = EVENT_DEDUP_WINDOW, max_size: int = EVENT_DEDUP_SIZE,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            window (float): seconds to remember the events
+            max_size (int): the max count of the remembered events
+            clock (Callable): the monotonic clock in seconds
+        """
+        self.seen = SeenSet(window=window, max_size=max_size, clock=clock)
+        # event type -> the count of suppressed events
+        self.duplicates: Dict[int, int] = {}
+
+    def is_duplicate(self, event_type: int, data: dict) -> bool:
+        """
+        whether the event has been received in the window
+
+        Args:
+            event_type (int): the type of the event response
+            data (dict): the decoded json payload of the event response
+        """
+        if event_type not in DEDUP_ID_FIELDS:
+            return False
+        fingerprint = _fingerprint(event_type, data)
+        if fingerprint is None or not self.seen.add(fingerprint):
+            return False
+
+        self.duplicates[event_type] = self.duplicates.get(event_type, 0) + 1
+        log.debug('suppress the duplicated event <%s> of type <%s>', data, event_type)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """the metrics of the suppressed events"""
+        return {
+            'seen': len(self.seen),
+            'duplicates': dict(self.duplicates),
+        }
@@ -0,0 +1,209 @@
+"""
+Python Wechaty - https://github.com/wechaty/python-wechaty
+
+Authors:    Huan LI (李卓桓) <https://github.com/huan>
+            Jingjing WU (吴京京) <https://github.com/wj-Mcat>
+
+2020-now @ Copyright Wechaty
+
+Licensed under the Apache License, Version 2.0 (the 'License');
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an 'AS IS' BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
+from functools import partial
+from typing import Dict, Optional
+
+import requests
+
+from wechaty_puppet import get_logger
+from wechaty_puppet.exceptions import WechatyPuppetGrpcError
+
+from wechaty_puppet_service.config import (
+    CHATIE_ENDPOINT_URL,
+    ENDPOINT_CACHE_MAX_STALE,
+    get_cache_dir,
+    get_endpoint_cache_ttl,
+)
+
+log = get_logger('EndpointResolver')
+
+DISCOVERY_TIMEOUT = 10
+
+
+def fetch_endpoint(token: str, timeout: float = DISCOVERY_TIMEOUT) -> str:
+    """
+    fetch the endpoint of the token from chatie server, it's a blocking call
+
+    Args:
+        token (str): the token of puppet service
+        timeout (float): the timeout of http request
+
+    Return:
+        endpoint (str): <ip>:<port>
+    """
+    url = CHATIE_ENDPOINT_URL.format(token=token)
+    log.info('fetching endpoint from chatie-server: %s', url)
+    try:
+        response = requests.get(url, timeout=timeout)
+    except requests.RequestException as e:
+        raise WechatyPuppetGrpcError(
+            'can"t fetch endpoint from chatie server. '
+            'You can try it later, or make sure that your pc can connect to heroku server '
+        ) from e
+
+    if response.status_code != 200:
+        raise WechatyPuppetGrpcError(
+            'can"t fetch endpoint from chatie server. '
+            'You can try it later, or make sure that your pc can connect to heroku server '
+        )
+
+    data = response.json()
+
+    if 'ip' not in data or data['ip'] == '0.0.0.0':
+        raise WechatyPuppetGrpcError(
+            'Your service token has no available endpoint, is your token correct?'
+        )
+    if 'port' not in data:
+        raise WechatyPuppetGrpcError("can't find service server port")
+
+    return f'{data["ip"]}:{data["port"]}'
+
+
+class EndpointResolver:
+    """
+    resolve the endpoint of token from chatie server without blocking the event loop.
+
+    The resolved endpoint is persisted on disk, so that:
+        1. if it's fresh (younger than ttl), it's served without any http request
+        2. if it's stale (younger than max_stale), it's served directly and
+            refreshed in the background
+        3. otherwise it will be fetched from chatie server
+    """
+
+    def __init__(self, token: str,
+                 cache_file: Optional[str] = None,
+                 ttl: Optional[float] = None,
+                 max_stale: float = ENDPOINT_CACHE_MAX_STALE):
+        """
+        Args:
+            token (str): the token of puppet service
+            cache_file (str, optional): the path of cache file, Defaults to
+                <cache_dir>/endpoints.json
+            ttl (float, optional): seconds that cached endpoint is fresh
+            max_stale (float): seconds that stale endpoint can be served
+        """
+        self.token = token
+        self.cache_file = cache_file or os.path.join(get_cache_dir(), 'endpoints.json')
+        self.ttl = get_endpoint_cache_ttl() if ttl is None else ttl
+        self.max_stale = max_stale
+
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @property
+    def _cache_key(self) -> str:
+        """the token should not be saved on disk in plain text"""
+        return hashlib.sha256(self.token.encode('utf-8')).hexdigest()
+
+    def _load(self) -> Dict[str, dict]:
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict):
+            return {}
+        return data
+
+    def _save(self, endpoint: Optional[str]) -> None:
+        """save endpoint of the token to cache file atomically"""
+        data = self._load()
+        if endpoint is None:
+            data.pop(self._cache_key, None)
+        else:
+            data[self._cache_key] = {'endpoint': endpoint, 'updated_at': time.time()}
+
+        cache_dir = os.path.dirname(self.cache_file) or '.'
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix='.endpoints-')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.cache_file)
+        except OSError as e:
+            log.warning('can"t save endpoint cache file <%s>: %s', self.cache_file, e)
+
+    def cached(self) -> Optional[dict]:
+        """get the cached entry of the token: {'endpoint': str, 'updated_at': float}"""
+        entry = self._load().get(self._cache_key, None)
+        if not isinstance(entry, dict) or 'endpoint' not in entry:
+            return None
+        return entry
+
+    async def fetch(self) -> str:
+        """fetch endpoint from chatie server in executor, and save it to the cache"""
+        loop = asyncio.get_event_loop()
+        endpoint = await loop.run_in_executor(None, partial(fetch_endpoint, self.token))
+        await loop.run_in_executor(None, self._save, endpoint)
+        log.debug('endpoint from chatie-server : <%s>', endpoint)
+        return endpoint
+
+    async def _refresh(self) -> None:
+        try:
+            await self.fetch()
+        # pylint: disable=W0703
+        except Exception as e:
+            log.warning('refresh endpoint in background failed: %s', e)
+
+    def refresh_in_background(self) -> None:
+        """refresh the cached endpoint without waiting for it"""
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return
+        self._refresh_task = asyncio.ensure_future(self._refresh())
+
+    async def invalidate(self) -> None:
+        """remove the cached endpoint, eg: the endpoint is not reachable"""
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self._save, None)
+
+    async def resolve(self) -> str:
+        """
+        get the endpoint of the token, prefer to the cached one
+        """
+        loop = asyncio.get_event_loop()
+        entry = await loop.run_in_executor(None, self.cached)
+
+        if entry is not None:
+            age = time.time() - float(entry.get('updated_at', 0))
+            if age < self.ttl:
+                log.debug('endpoint <%s> is served from cache', entry['endpoint'])
+                return entry['endpoint']
+            if age < self.ttl + self.max_stale:
+                log.debug('endpoint <%s> is stale, refreshing it in the background',
+                          entry['endpoint'])
+                self.refresh_in_background()
+                return entry['endpoint']
+
+        try:
+            return await self.fetch()
+        except WechatyPuppetGrpcError:
+            if entry is None:
+                raise
+            log.warning('can"t fetch endpoint from chatie server, '
+                        'use the expired one <%s>', entry['endpoint'])
+            return entry['endpoint']
@@ -0,0 +1,229 @@
+"""
+Python Wechaty - https://github.com/wechaty/python-wechaty
+
+Authors:    Huan LI (李卓桓) <https://github.com/huan>
+            Jingjing WU (吴京京) <https://github.com/wj-Mcat>
+
+2020-now @ Copyright Wechaty
+
+Licensed under the Apache License, Version 2.0 (the 'License');
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an 'AS IS' BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from wechaty_puppet import get_logger
+
+from wechaty_puppet_service.monitor import percentile
+
+log = get_logger('EventDispatcher')
+
+EVENT_DISPATCH_WORKERS = 8
+# the max count of events which are dispatched but not handled yet
+EVENT_DISPATCH_QUEUE_SIZE = 1000
+# seconds to wait for the conversation of one event, eg: the message payload
+EVENT_DISPATCH_KEY_TIMEOUT = 1.0
+
+# the event name -> the listeners of it
+ListenersGetter = Callable[[str], List[Callable[..., Any]]]
+# (event name, payload) -> the conversation of the event, eg: the room id or the talker id
+ConversationKey = Callable[[str, Any], Awaitable[Optional[str]]]
+
+
+async def _no_conversation(_: str, __: Any) -> Optional[str]:
+    return None
+
+
+def _retrieve_exception(future: asyncio.Future) -> None:
+    """the failure of the lookup which is over the timeout is not reported"""
+    if not future.cancelled():
+        future.exception()
+
+
+# pylint: disable=R0902,R0917
+class EventDispatcher:
+    """
+    emit the events to the listeners with a bounded pool of workers.
+
+    The events are sharded by their conversation, so the events of one conversation
+        are handled in order by the same worker, while the different conversations
+        are handled in parallel. The events without conversation are sharded by the
+        event name.
+
+    The conversations of the events are resolved concurrently, and the events are
+        sharded in the order that they are dispatched. The event whose conversation
+        isn't resolved in time is sharded by the event name, so a hanging lookup
+        doesn't stall the other conversations.
+    """
+
+    def __init__(self, listeners: ListenersGetter,
+                 conversation_key: ConversationKey = _no_conversation,
+                 workers: int = EVENT_DISPATCH_WORKERS,
+                 max_size: int = EVENT_DISPATCH_QUEUE_SIZE,
+                 window: int = 1000,
+                 key_timeout: float = EVENT_DISPATCH_KEY_TIMEOUT):
+        """
+        Args:
+            listeners (Callable): get the listeners of the event name
+            conversation_key (Callable): resolve the conversation of the event
+            workers (int): the count of workers
+            max_size (int): the reader of event stream waits if there are more
+                pending events than it
+            window (int): the count of recent handler latencies to compute the metrics
+            key_timeout (float): seconds to wait for the conversation of one event
+        """
+        self._listeners = listeners
+        self._conversation_key = conversation_key
+        self.workers = workers
+        self.max_size = max_size
+        self.key_timeout = key_timeout
+
+        # the queues are created in the running loop
+        self._inbound: Optional[asyncio.Queue] = None
+        self._shards: List[asyncio.Queue] = []
+        self._tasks: List[asyncio.Task] = []
+        self._idle: Optional[asyncio.Event] = None
+        self._capacity: Optional[asyncio.Event] = None
+
+        # the count of events which are dispatched but not handled yet
+        self.depth: int = 0
+        self.handled: int = 0
+        self.errors: int = 0
+        # the events whose conversations are not resolved in time
+        self.key_timeouts: int = 0
+        self._latencies: Deque[float] = deque(maxlen=window)
+
+    @property
+    def started(self) -> bool:
+        """whether the workers are running"""
+        return bool(self._tasks)
+
+    def start(self) -> None:
+        """start the workers in the running loop"""
+        if self.started:
+            return
+        self._inbound = asyncio.Queue()
+        self._shards = [asyncio.Queue() for _ in range(self.workers)]
+        self._idle = asyncio.Event()
+        self._capacity = asyncio.Event()
+        self._update_events()
+
+        self._tasks = [asyncio.ensure_future(self._route())]
+        self._tasks.extend(asyncio.ensure_future(self._work(shard)) for shard in self._shards)
+
+    async def stop(self) -> None:
+        """stop the workers, the pending events are dropped"""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._inbound = None
+        self._shards = []
+        self.depth = 0
+
+    def dispatch(self, name: str, payload: Any) -> None:
+        """emit the event to the listeners in the background"""
+        self.start()
+        assert self._inbound is not None
+
+        key = asyncio.ensure_future(self._conversation_key(name, payload))
+        self._inbound.put_nowait((key, name, payload))
+        self.depth += 1
+        self._update_events()
+
+    async def wait_for_capacity(self) -> None:
+        """wait until the count of pending events is below the max size"""
+        while self._capacity is not None and self.depth >= self.max_size:
+            await self._capacity.wait()
+
+    async def join(self) -> None:
+        """wait until all of the dispatched events are handled"""
+        while self._idle is not None and self.depth > 0:
+            await self._idle.wait()
+
+    def _update_events(self) -> None:
+        if self._idle is None or self._capacity is None:
+            return
+        if self.depth == 0:
+            self._idle.set()
+        else:
+            self._idle.clear()
+        if self.depth < self.max_size:
+            self._capacity.set()
+        else:
+            self._capacity.clear()
+
+    async def _route(self) -> None:
+        assert self._inbound is not None
+        while True:
+            key_future, name, payload = await self._inbound.get()
+            try:
+                # the lookup keeps running after the timeout, eg: to cache the payload
+                key = await asyncio.wait_for(asyncio.shield(key_future), self.key_timeout)
+            except asyncio.TimeoutError:
+                self.key_timeouts += 1
+                log.warning('resolving the conversation of <%s> event is over %ss',
+                            name, self.key_timeout)
+                key_future.add_done_callback(_retrieve_exception)
+                key = None
+            # pylint: disable=W0703
+            except Exception as e:
+                log.warning('can"t resolve the conversation of <%s> event: %s', name, e)
+                key = None
+            shard = hash(key if key is not None else name) % self.workers
+            self._shards[shard].put_nowait((name, payload))
+
+    async def _work(self, shard: asyncio.Queue) -> None:
+        while True:
+            name, payload = await shard.get()
+            try:
+                await self._emit(name, payload)
+            finally:
+                self.depth -= 1
+                self._update_events()
+
+    async def _emit(self, name: str, payload: Any) -> None:
+        start = time.perf_counter()
+        for listener in self._listeners(name):
+            try:
+                result = listener(payload)
+                if asyncio.iscoroutine(result):
+                    await result
+            # pylint: disable=W0703
+            except Exception as e:
+                self.errors += 1
+                log.error('listener of <%s> event failed: %s', name, e)
+        self.handled += 1
+        self._latencies.append(time.perf_counter() - start)
+
+    @property
+    def queue_depths(self) -> Tuple[int, ...]:
+        """the count of events waiting in each worker"""
+        return tuple(shard.qsize() for shard in self._shards)
+
+    def stats(self) -> Dict[str, Any]:
+        """the metrics of the dispatched events"""
+        latencies = list(self._latencies)
+        return {
+            'depth': self.depth,
+            'queue_depths': self.queue_depths,
+            'handled': self.handled,
+            'errors': self.errors,
+            'key_timeouts': self.key_timeouts,
+            'latency_p50': percentile(latencies, 0.5),
+            'latency_p99': percentile(latencies, 0.99),
+            'latency_max': max(latencies) if latencies else None,
+        }
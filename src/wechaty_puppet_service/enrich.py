@@ -0,0 +1,200 @@
+"""
+Python Wechaty - https://github.com/wechaty/python-wechaty
+
+Authors:    Huan LI (李卓桓) <https://github.com/huan>
+            Jingjing WU (吴京京) <https://github.com/wj-Mcat>
+
+2020-now @ Copyright Wechaty
+
+Licensed under the Apache License, Version 2.0 (the 'License');
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an 'AS IS' BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set
+
+from wechaty_puppet import (
+    ContactPayload,
+    MessagePayload,
+    RoomPayload,
+    get_logger,
+)
+
+log = get_logger('MessageEnricher')
+
+ENRICHED_MESSAGE_EVENT = 'enriched-message'
+
+# seconds to wait for the payloads of one message
+ENRICH_DEADLINE = 3.0
+# the max count of messages which are being enriched
+ENRICH_MAX_PENDING = 1000
+
+
+@dataclass
+class EnrichedMessagePayload:
+    """the message event with the payloads of the message, the talker and the room"""
+    message_id: str
+    message: Optional[MessagePayload] = None
+    talker: Optional[ContactPayload] = None
+    room: Optional[RoomPayload] = None
+    # whether all of the payloads are fetched before the deadline
+    complete: bool = False
+
+
+# pylint: disable=R0902,R0917
+class MessageEnricher:
+    """
+    fetch the payloads of the message, and then the talker and the room of it
+        concurrently, as soon as the message event is received. The enriched
+        messages are emitted in the order of the message events, and the ones which
+        are not fully fetched before the deadline are emitted with the fetched
+        payloads only.
+
+    The fetches are not cancelled by the deadline, so the late payloads are still
+        cached for the following calls.
+    """
+
+    def __init__(self, message_payload: Callable[[str], Awaitable[MessagePayload]],
+                 contact_payload: Callable[[str], Awaitable[ContactPayload]],
+                 room_payload: Callable[[str], Awaitable[RoomPayload]],
+                 emit: Callable[[EnrichedMessagePayload], None],
+                 deadline: float = ENRICH_DEADLINE,
+                 max_pending: int = ENRICH_MAX_PENDING):
+        """
+        Args:
+            message_payload (Callable): get the message payload by id
+            contact_payload (Callable): get the contact payload by id
+            room_payload (Callable): get the room payload by id
+            emit (Callable): emit the enriched message
+            deadline (float): seconds to wait for the payloads of one message
+            max_pending (int): the reader of event stream waits if there are more
+                messages being enriched than it
+        """
+        self._message_payload = message_payload
+        self._contact_payload = contact_payload
+        self._room_payload = room_payload
+        self._emit = emit
+        self.deadline = deadline
+        self.max_pending = max_pending
+
+        self._pending: Deque[asyncio.Future] = deque()
+        # the fetches which are running, including the ones over the deadline
+        self._fetches: Set[asyncio.Task] = set()
+        self._late: Set[asyncio.Task] = set()
+        self._emitter: Optional[asyncio.Task] = None
+        # the signal is created in the running loop
+        self._changed: Optional[asyncio.Event] = None
+
+        self.enriched: int = 0
+        # the messages which are emitted without some of the payloads
+        self.partial: int = 0
+
+    def enrich(self, message_id: str) -> None:
+        """start fetching the payloads of the message"""
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        self._pending.append(asyncio.ensure_future(self._enrich(message_id)))
+        self._changed.set()
+        if self._emitter is None or self._emitter.done():
+            self._emitter = asyncio.ensure_future(self._emit_in_order())
+
+    async def _enrich(self, message_id: str) -> EnrichedMessagePayload:
+        payload = EnrichedMessagePayload(message_id=message_id)
+        fetch = asyncio.ensure_future(self._fetch(payload))
+        self._fetches.add(fetch)
+        fetch.add_done_callback(partial(self._fetch_done, message_id))
+        try:
+            # the fetch keeps running after the deadline, so the late payloads are cached
+            await asyncio.wait_for(asyncio.shield(fetch), timeout=self.deadline)
+            payload.complete = True
+        except asyncio.TimeoutError:
+            self._late.add(fetch)
+            log.warning('enriching message <%s> is over the deadline %ss',
+                        message_id, self.deadline)
+        # pylint: disable=W0703
+        except Exception as e:
+            log.warning('enriching message <%s> failed: %s', message_id, e)
+        return payload
+
+    def _fetch_done(self, message_id: str, fetch: asyncio.Task) -> None:
+        """the failure of the fetch which is over the deadline is logged here"""
+        self._fetches.discard(fetch)
+        late = fetch in self._late
+        self._late.discard(fetch)
+        if fetch.cancelled():
+            return
+        error = fetch.exception()
+        if error is not None and late:
+            log.warning('fetching message <%s> after the deadline failed: %s',
+                        message_id, error)
+
+    async def _fetch(self, payload: EnrichedMessagePayload) -> None:
+        message = await self._message_payload(payload.message_id)
+        payload.message = message
+
+        async def fetch_talker() -> None:
+            payload.talker = await self._contact_payload(message.from_id)
+
+        async def fetch_room() -> None:
+            payload.room = await self._room_payload(message.room_id)
+
+        fetches = []
+        if message.from_id:
+            fetches.append(fetch_talker())
+        if message.room_id:
+            fetches.append(fetch_room())
+        await asyncio.gather(*fetches)
+
+    async def _emit_in_order(self) -> None:
+        while self._pending:
+            payload: EnrichedMessagePayload = await self._pending[0]
+            self._pending.popleft()
+            assert self._changed is not None
+            self._changed.set()
+
+            self.enriched += 1
+            if not payload.complete:
+                self.partial += 1
+            try:
+                self._emit(payload)
+            # pylint: disable=W0703
+            except Exception as e:
+                log.error('emit enriched message <%s> failed: %s', payload.message_id, e)
+
+    async def wait_for_capacity(self) -> None:
+        """wait until the count of messages being enriched is below the max pending"""
+        while self._changed is not None and len(self._pending) >= self.max_pending:
+            self._changed.clear()
+            await self._changed.wait()
+
+    def stop(self) -> None:
+        """cancel the pending messages and the running fetches"""
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        for fetch in self._fetches:
+            fetch.cancel()
+        if self._emitter is not None:
+            self._emitter.cancel()
+            self._emitter = None
+
+    def stats(self) -> Dict[str, Any]:
+        """the metrics of the enriched messages"""
+        return {
+            'pending': len(self._pending),
+            'enriched': self.enriched,
+            'partial': self.partial,
+        }
@@ -0,0 +1,277 @@
+"""
+Python Wechaty - https://github.com/wechaty/python-wechaty
+
+Authors:    Huan LI (李卓桓) <https://github.com/huan>
+            Jingjing WU (吴京京) <https://github.com/wj-Mcat>
+
+2020-now @ Copyright Wechaty
+
+Licensed under the Apache License, Version 2.0 (the 'License');
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an 'AS IS' BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+from collections import deque
+from enum import Enum
+from typing import Any, Deque, Dict, List, Mapping, Optional
+
+from wechaty_grpc.wechaty.puppet import EventResponse, EventType
+from wechaty_puppet import get_logger
+
+from wechaty_puppet_service.store import FLUSH_BATCH_SIZE, _SqliteWorker
+
+log = get_logger('EventQueue')
+
+# the max count of events in memory
+EVENT_QUEUE_SIZE = 10000
+
+
+class OverflowPolicy(Enum):
+    """how to queue the event when the queue is above the high watermark"""
+    # replace the queued event of the same type
+    KEEP_LATEST = 'keep-latest'
+    # drop the event
+    DROP = 'drop'
+    # never drop the event, it's saved in the spill database when the memory is
+    #   full, or the reader waits if there is no spill database
+    SPILL = 'spill'
+
+
+# event type -> the overflow policy, the other types are never dropped
+DEFAULT_OVERFLOW_POLICIES: Dict[int, OverflowPolicy] = {
+    int(EventType.EVENT_TYPE_HEARTBEAT): OverflowPolicy.KEEP_LATEST,
+    int(EventType.EVENT_TYPE_SCAN): OverflowPolicy.KEEP_LATEST,
+    int(EventType.EVENT_TYPE_DONG): OverflowPolicy.KEEP_LATEST,
+}
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    data BLOB NOT NULL
+);
+'''
+
+
+class EventSpill(_SqliteWorker):
+    """
+    embedded sqlite database which keeps the overflowed events in order, all of the
+        database operations run in a dedicated thread
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): the path of sqlite database file, the events left by the
+                previous process are dropped
+        """
+        super().__init__(path)
+        self.size: int = 0
+
+    def _setup(self, conn: sqlite3.Connection) -> None:
+        conn.executescript(_SCHEMA)
+        with conn:
+            conn.execute('DELETE FROM events')
+
+    def _write(self, data: bytes) -> None:
+        conn = self._open()
+        with conn:
+            conn.execute('INSERT INTO events (data) VALUES (?)', (data,))
+
+    def _read(self, limit: int) -> List[bytes]:
+        conn = self._open()
+        with conn:
+            rows = conn.execute(
+                'SELECT seq, data FROM events ORDER BY seq LIMIT ?', (limit,)).fetchall()
+            if rows:
+                conn.execute('DELETE FROM events WHERE seq <= ?', (rows[-1][0],))
+        return [row[1] for row in rows]
+
+    async def put(self, response: EventResponse) -> None:
+        """append the event to the end"""
+        await self._run(self._write, bytes(response))
+        self.size += 1
+
+    async def pop(self, limit: int = FLUSH_BATCH_SIZE) -> List[EventResponse]:
+        """remove and return the oldest events"""
+        rows = await self._run(self._read, limit)
+        self.size -= len(rows)
+        return [EventResponse().parse(data) for data in rows]
+
+    async def close(self) -> None:
+        """close the database"""
+        await super().close()
+        self.size = 0
+
+
+# pylint: disable=R0902
+class EventQueue:
+    """
+    bounded queue between the reader of event stream and the handlers, so the
+        slow handlers don't hold back the reading and the heartbeats are received
+        in time.
+
+    When the depth reaches the high watermark, the queue is overflowing until the
+        depth drops to the low watermark, and the incoming events are queued by the
+        overflow policies of their types: only the latest heartbeat is kept, and the
+        messages are never dropped.
+    """
+
+    def __init__(self, max_size: int = EVENT_QUEUE_SIZE,
+                 high_watermark: Optional[int] = None,
+                 low_watermark: Optional[int] = None,
+                 policies: Optional[Mapping[int, OverflowPolicy]] = None,
+                 spill: Optional[EventSpill] = None):
+        """
+        Args:
+            max_size (int): the max count of events in memory
+            high_watermark (int, optional): start overflowing at this depth, defaults
+                to 3/4 of max size
+            low_watermark (int, optional): stop overflowing at this depth, defaults
+                to 1/4 of max size
+            policies (Mapping, optional): event type -> overflow policy, the default
+                policy is SPILL
+            spill (EventSpill, optional): keeps the events when the memory is full
+        """
+        self.max_size = max_size
+        self.high_watermark = max_size * 3 // 4 if high_watermark is None else high_watermark
+        self.low_watermark = max_size // 4 if low_watermark is None else low_watermark
+        self.policies: Dict[int, OverflowPolicy] = dict(
+            DEFAULT_OVERFLOW_POLICIES if policies is None else policies)
+        self.spill = spill
+
+        # the holder of event, so that the queued one can be replaced by the latest one
+        self._events: Deque[List[EventResponse]] = deque()
+        # event type -> the holder of the queued one which can be replaced
+        self._latest: Dict[int, List[EventResponse]] = {}
+        self._not_empty: Optional[asyncio.Event] = None
+        self._not_full: Optional[asyncio.Event] = None
+
+        self.overflowing: bool = False
+        self.max_depth: int = 0
+        # event type -> count
+        self.dropped: Dict[int, int] = {}
+        self.replaced: Dict[int, int] = {}
+        self.spilled: int = 0
+        # the times that the reader waits for the free space
+        self.blocked: int = 0
+
+    def _signals(self) -> None:
+        # the events are created in the running loop
+        if self._not_empty is None or self._not_full is None:
+            self._not_empty = asyncio.Event()
+            self._not_full = asyncio.Event()
+            self._update_signals()
+
+    def _update_signals(self) -> None:
+        assert self._not_empty is not None and self._not_full is not None
+        if self._events or (self.spill is not None and self.spill.size):
+            self._not_empty.set()
+        else:
+            self._not_empty.clear()
+        if len(self._events) < self.max_size:
+            self._not_full.set()
+        else:
+            self._not_full.clear()
+
+    def __len__(self) -> int:
+        return len(self._events) + (self.spill.size if self.spill is not None else 0)
+
+    def _update_overflowing(self) -> None:
+        depth = len(self)
+        self.max_depth = max(self.max_depth, depth)
+        if not self.overflowing and depth >= self.high_watermark:
+            self.overflowing = True
+            log.warning('event queue is overflowing with <%d> events', depth)
+        elif self.overflowing and depth <= self.low_watermark:
+            self.overflowing = False
+            log.info('event queue is drained to <%d> events', depth)
+
+    async def put(self, response: EventResponse) -> None:
+        """
+        queue the event by its overflow policy, it only waits when the memory is full
+            and there is no spill database
+        """
+        self._signals()
+        assert self._not_full is not None
+        self._update_overflowing()
+
+        policy = self.policies.get(response.type, OverflowPolicy.SPILL)
+        if self.overflowing and policy == OverflowPolicy.DROP:
+            self.dropped[response.type] = self.dropped.get(response.type, 0) + 1
+            return
+
+        holder = self._latest.get(response.type, None)
+        if self.overflowing and policy == OverflowPolicy.KEEP_LATEST and holder is not None:
+            holder[0] = response
+            self.replaced[response.type] = self.replaced.get(response.type, 0) + 1
+            return
+
+        if policy == OverflowPolicy.SPILL and self.spill is not None and (
+                self.spill.size or len(self._events) >= self.max_size):
+            # the spilled events are behind the ones in memory
+            await self.spill.put(response)
+            self.spilled += 1
+        else:
+            while len(self._events) >= self.max_size:
+                self.blocked += 1
+                await self._not_full.wait()
+            holder = [response]
+            self._events.append(holder)
+            if policy == OverflowPolicy.KEEP_LATEST:
+                self._latest[response.type] = holder
+
+        self._update_overflowing()
+        self._update_signals()
+
+    async def get(self) -> EventResponse:
+        """remove and return the oldest event, wait if there is none"""
+        self._signals()
+        assert self._not_empty is not None
+        while len(self) == 0:
+            await self._not_empty.wait()
+
+        if not self._events and self.spill is not None:
+            limit = min(FLUSH_BATCH_SIZE, self.max_size)
+            self._events.extend([response] for response in await self.spill.pop(limit))
+
+        holder = self._events.popleft()
+        response = holder[0]
+        if self._latest.get(response.type, None) is holder:
+            del self._latest[response.type]
+
+        self._update_overflowing()
+        self._update_signals()
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        """the metrics of the queue"""
+        return {
+            'depth': len(self),
+            'max_depth': self.max_depth,
+            'spilled_depth': self.spill.size if self.spill is not None else 0,
+            'overflowing': self.overflowing,
+            'dropped': dict(self.dropped),
+            'replaced': dict(self.replaced),
+            'spilled': self.spilled,
+            'blocked': self.blocked,
+        }
+
+    async def close(self) -> None:
+        """drop the queued events"""
+        self._events.clear()
+        self._latest.clear()
+        if self.spill is not None:
+            await self.spill.close()
+        if self._not_empty is not None:
+            self._update_signals()
@@ -0,0 +1,162 @@
+"""
+Python Wechaty - https://github.com/wechaty/python-wechaty
+
+Authors:    Huan LI (李卓桓) <https://github.com/huan>
+            Jingjing WU (吴京京) <https://github.com/wj-Mcat>
+
+2020-now @ Copyright Wechaty
+
+Licensed under the Apache License, Version 2.0 (the 'License');
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an 'AS IS' BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from wechaty_puppet import (
+    EventDongPayload,
+    EventErrorPayload,
+    EventFriendshipPayload,
+    EventHeartbeatPayload,
+    EventLoginPayload,
+    EventLogoutPayload,
+    EventMessagePayload,
+    EventReadyPayload,
+    EventRoomInvitePayload,
+    EventRoomJoinPayload,
+    EventRoomLeavePayload,
+    EventRoomTopicPayload,
+    EventScanPayload,
+    EventType,
+    ScanStatus,
+)
+
+# decode the json data of event response into the event payload
+EventDecoder = Callable[[dict], Any]
+# the internal handler of the decoded event payload, return False to stop emitting it
+EventHook = Callable[[Any], bool]
+
+
+def decode_scan(data: dict) -> EventScanPayload:
+    """decode scan event"""
+    return EventScanPayload(
+        status=ScanStatus(data['status']),
+        qrcode=data.get('qrcode', None),
+        data=data.get('data', None)
+    )
+
+
+def decode_dong(data: dict) -> EventDongPayload:
+    """decode dong event"""
+    return EventDongPayload(**data)
+
+
+def decode_message(data: dict) -> EventMessagePayload:
+    """decode message event"""
+    return EventMessagePayload(message_id=data['messageId'])
+
+
+def decode_heartbeat(data: dict) -> EventHeartbeatPayload:
+    """decode heartbeat event"""
+    # Huan(202005) FIXME:
+    #   https://github.com/wechaty/python-wechaty-puppet/issues/6
+    #   Workaround for unexpected server json payload key: timeout
+    return EventHeartbeatPayload(data=data['data'])
+
+
+def decode_error(data: dict) -> EventErrorPayload:
+    """decode error event"""
+    return EventErrorPayload(**data)
+
+
+def decode_friendship(data: dict) -> EventFriendshipPayload:
+    """decode friendship event"""
+    return EventFriendshipPayload(friendship_id=data.get('friendshipId'))
+
+
+def decode_room_join(data: dict) -> EventRoomJoinPayload:
+    """decode room-join event"""
+    return EventRoomJoinPayload(
+        invited_ids=data.get('inviteeIdList', []),
+        inviter_id=data.get('inviterId'),
+        room_id=data.get('roomId'),
+        timestamp=data.get('timestamp')
+    )
+
+
+def decode_room_invite(data: dict) -> EventRoomInvitePayload:
+    """decode room-invite event"""
+    return EventRoomInvitePayload(room_invitation_id=data.get('roomInvitationId', None))
+
+
+def decode_room_leave(data: dict) -> EventRoomLeavePayload:
+    """decode room-leave event"""
+    return EventRoomLeavePayload(
+        removed_ids=data.get('removeeIdList', []),
+        remover_id=data.get('removerId'),
+        room_id=data.get('roomId'),
+        timestamp=data.get('timestamp')
+    )
+
+
+def decode_room_topic(data: dict) -> EventRoomTopicPayload:
+    """decode room-topic event"""
+    return EventRoomTopicPayload(
+        changer_id=data.get('changerId'),
+        new_topic=data.get('newTopic'),
+        old_topic=data.get('oldTopic'),
+        room_id=data.get('roomId'),
+        timestamp=data.get('timestamp')
+    )
+
+
+def decode_ready(data: dict) -> EventReadyPayload:
+    """decode ready event"""
+    return EventReadyPayload(**data)
+
+
+def decode_login(data: dict) -> EventLoginPayload:
+    """decode login event"""
+    return EventLoginPayload(contact_id=data['contactId'])
+
+
+def decode_logout(data: dict) -> EventLogoutPayload:
+    """decode logout event"""
+    return EventLogoutPayload(contact_id=data['contactId'], data=data.get('data', None))
+
+
+# event type -> (event name, decoder)
+DEFAULT_EVENT_DECODERS: Dict[int, Tuple[str, EventDecoder]] = {
+    int(EventType.EVENT_TYPE_SCAN): ('scan', decode_scan),
+    int(EventType.EVENT_TYPE_DONG): ('dong', decode_dong),
+    int(EventType.EVENT_TYPE_MESSAGE): ('message', decode_message),
+    int(EventType.EVENT_TYPE_HEARTBEAT): ('heartbeat', decode_heartbeat),
+    int(EventType.EVENT_TYPE_ERROR): ('error', decode_error),
+    int(EventType.EVENT_TYPE_FRIENDSHIP): ('friendship', decode_friendship),
+    int(EventType.EVENT_TYPE_ROOM_JOIN): ('room-join', decode_room_join),
+    int(EventType.EVENT_TYPE_ROOM_INVITE): ('room-invite', decode_room_invite),
+    int(EventType.EVENT_TYPE_ROOM_LEAVE): ('room-leave', decode_room_leave),
+    int(EventType.EVENT_TYPE_ROOM_TOPIC): ('room-topic', decode_room_topic),
+    int(EventType.EVENT_TYPE_READY): ('ready', decode_ready),
+    int(EventType.EVENT_TYPE_LOGIN): ('login', decode_login),
+    int(EventType.EVENT_TYPE_LOGOUT): ('logout', decode_logout),
+}
+
+
+@dataclass
+class EventRoute:
+    """how to decode and handle one type of event"""
+    name: str
+    decode: EventDecoder
+    # the event is decoded even if there is no listener when it has a hook
+    hook: Optional[EventHook] = None
@@ -0,0 +1,331 @@
+"""
+Python Wechaty - https://github.com/wechaty/python-wechaty
+
+Authors:    Huan LI (李卓桓) <https://github.com/huan>
+            Jingjing WU (吴京京) <https://github.com/wj-Mcat>
+
+2020-now @ Copyright Wechaty
+
+Licensed under the Apache License, Version 2.0 (the 'License');
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an 'AS IS' BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+import requests
+
+from wechaty_puppet import FileBox, get_logger
+from wechaty_puppet.file_box.type import FileBoxOptionsBase64, FileBoxType
+
+from wechaty_puppet_service.cache import SingleFlight
+
+log = get_logger('FileBoxCache')
+
+# the byte budget of the cached files
+FILE_BOX_CACHE_SIZE = 1024 * 1024 * 1024
+
+DOWNLOAD_TIMEOUT = 60
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except OSError:
+        os.unlink(tmp_path)
+        raise
+
+
+def file_box_content(file_box: FileBox) -> Optional[bytes]:
+    """
+    get the content of the file box, the remote file is downloaded. It's a blocking call.
+
+    Return:
+        None if the content can't be read, eg: the qrcode
+    """
+    box_type = file_box.type()
+    if box_type == FileBoxType.Base64:
+        return base64.b64decode(file_box.base64)
+    if box_type == FileBoxType.Url:
+        response = requests.get(file_box.remoteUrl, headers=file_box.headers,
+                                timeout=DOWNLOAD_TIMEOUT)
+        response.raise_for_status()
+        return response.content
+    if box_type == FileBoxType.Buffer:
+        return file_box.buffer
+    if box_type == FileBoxType.Stream:
+        return file_box.stream
+    if box_type == FileBoxType.File:
+        with open(file_box.localPath, 'rb') as f:
+            return f.read()
+    return None
+
+
+class CachedFileBox(FileBox):
+    """
+    base64 file box of a cached file, the content is read from the disk when it's
+        used instead of when it's got from the cache
+    """
+
+    def __init__(self, path: str, name: str):
+        super().__init__(FileBoxOptionsBase64(name=name, base64=b''))
+        del self.__dict__['base64']
+        self._cached_path = path
+
+    def __getattr__(self, name: str) -> Any:
+        if name != 'base64':
+            raise AttributeError(name)
+        return self._read()
+
+    def _read(self) -> bytes:
+        with open(self._cached_path, 'rb') as f:
+            self.base64 = base64.b64encode(f.read())
+        return self.base64
+
+    def to_json_str(self) -> str:
+        # the content is serialized instead of the path of the cached file
+        if 'base64' not in self.__dict__:
+            self._read()
+        self.__dict__.pop('_cached_path', None)
+        return super().to_json_str()
+
+
+def _file_box_entry(digest: str, file_box: FileBox) -> Dict[str, Any]:
+    """the metadata of the file box which is saved with its content"""
+    entry = {
+        'digest': digest,
+        'name': file_box.name,
+        'mediaType': file_box.mediaType,
+        'metadata': dict(file_box.metadata or {}),
+    }
+    if file_box.type() == FileBoxType.Url:
+        entry['remoteUrl'] = file_box.remoteUrl
+        entry['headers'] = file_box.headers
+    return entry
+
+
+def _restore_file_box(path: str, entry: Dict[str, Any]) -> FileBox:
+    """create the file box of the cached file with the saved metadata"""
+    file_box = CachedFileBox(path, name=entry.get('name', None) or os.path.basename(path))
+    file_box.mediaType = entry.get('mediaType', None)
+    file_box.metadata = entry.get('metadata', None) or {}
+    if 'remoteUrl' in entry:
+        file_box.remoteUrl = entry['remoteUrl']
+        file_box.headers = entry.get('headers', None)
+    return file_box
+
+
+# pylint: disable=R0902
+class FileBoxCache:
+    """
+    content-addressed disk cache of the file boxes.
+
+    The content is saved once by its sha256 under `blobs/`, and the keys, eg: the
+        remote url or the message id, point to the content under `keys/`. The least
+        recently used contents are removed with their keys when the byte budget is
+        exceeded. The metadata of the file box, eg: the voiceLength and the mediaType,
+        is saved with the key, and the cached content is read when it's used.
+
+    All of the disk operations run in a dedicated thread.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = FILE_BOX_CACHE_SIZE):
+        """
+        Args:
+            directory (str): the directory of the cached files
+            max_bytes (int): the byte budget of the cached contents
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._single_flight: SingleFlight[str, FileBox] = SingleFlight()
+
+        # content hash -> size, in the order of access
+        self._blobs: Optional[OrderedDict[str, int]] = None
+        # content hash -> the key files which point to it
+        self._keys: Dict[str, Set[str]] = {}
+        # key file -> content hash
+        self._key_digests: Dict[str, str] = {}
+        self.total_bytes: int = 0
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.directory, 'blobs', digest[:2], digest)
+
+    def _key_path(self, key: str) -> str:
+        digest = _sha256(key.encode('utf-8'))
+        return os.path.join(self.directory, 'keys', digest[:2], digest)
+
+    def _scan(self) -> OrderedDict[str, int]:
+        if self._blobs is not None:
+            return self._blobs
+
+        blobs = []
+        for root, _, files in os.walk(os.path.join(self.directory, 'blobs')):
+            for name in files:
+                if name.startswith('.tmp-'):
+                    continue
+                stat = os.stat(os.path.join(root, name))
+                blobs.append((stat.st_mtime, name, stat.st_size))
+        blobs.sort()
+
+        self._blobs = OrderedDict((name, size) for _, name, size in blobs)
+        self.total_bytes = sum(self._blobs.values())
+
+        for root, _, files in os.walk(os.path.join(self.directory, 'keys')):
+            for name in files:
+                if name.startswith('.tmp-'):
+                    continue
+                key_path = os.path.join(root, name)
+                try:
+                    with open(key_path, 'r', encoding='utf-8') as f:
+                        digest = json.load(f).get('digest', '')
+                except (OSError, ValueError):
+                    continue
+                self._link(key_path, digest)
+        return self._blobs
+
+    def _link(self, key_path: str, digest: str) -> None:
+        old_digest = self._key_digests.get(key_path, None)
+        if old_digest is not None:
+            self._keys.get(old_digest, set()).discard(key_path)
+        self._key_digests[key_path] = digest
+        self._keys.setdefault(digest, set()).add(key_path)
+
+    def _load(self, key: str) -> Optional[FileBox]:
+        blobs = self._scan()
+        try:
+            with open(self._key_path(key), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        digest = entry.get('digest', '')
+        if digest not in blobs:
+            return None
+
+        path = self._blob_path(digest)
+        blobs.move_to_end(digest)
+        os.utime(path)
+        return _restore_file_box(path, entry)
+
+    def _save(self, key: str, file_box: FileBox, data: bytes) -> FileBox:
+        blobs = self._scan()
+        digest = _sha256(data)
+        path = self._blob_path(digest)
+        if digest not in blobs:
+            _write_atomic(path, data)
+            blobs[digest] = len(data)
+            self.total_bytes += len(data)
+        blobs.move_to_end(digest)
+
+        entry = _file_box_entry(digest, file_box)
+        key_path = self._key_path(key)
+        _write_atomic(key_path, json.dumps(entry).encode('utf-8'))
+        self._link(key_path, digest)
+        self._evict(keep=digest)
+        return _restore_file_box(path, entry)
+
+    def _evict(self, keep: str) -> None:
+        blobs = self._scan()
+        while self.total_bytes > self.max_bytes and len(blobs) > 1:
+            digest, size = next(iter(blobs.items()))
+            # the latest one is kept even if it's larger than the budget
+            if digest == keep:
+                break
+            del blobs[digest]
+            self.total_bytes -= size
+            self.evictions += 1
+            paths = [self._blob_path(digest)]
+            for key_path in self._keys.pop(digest, ()):
+                del self._key_digests[key_path]
+                paths.append(key_path)
+            for path in paths:
+                try:
+                    os.unlink(path)
+                except OSError as e:
+                    log.warning('can"t remove cached file <%s>: %s', path, e)
+
+    async def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def get(self, key: str) -> Optional[FileBox]:
+        """get the cached file box of the key"""
+        return await self._run(self._load, key)
+
+    async def put(self, key: str, file_box: FileBox) -> FileBox:
+        """
+        save the content of file box with the key, the remote file is downloaded
+
+        Return:
+            the file box which is read from the cached file, or the original one
+                if it can't be cached
+        """
+        loop = asyncio.get_event_loop()
+        try:
+            # the download doesn't block the disk operations of the other keys
+            data = await loop.run_in_executor(None, file_box_content, file_box)
+            if data is None:
+                return file_box
+            return await self._run(self._save, key, file_box, data)
+        except (requests.RequestException, OSError) as e:
+            # the file box is still usable without the cache
+            log.warning('can"t cache file box <%s>: %s', key, e)
+            return file_box
+
+    async def fetch(self, key: str, fetch: Callable[[], Awaitable[FileBox]]) -> FileBox:
+        """
+        get the cached file box of the key, or fetch and cache it. The concurrent
+            fetches of the same key are merged into one
+        """
+        async def load() -> FileBox:
+            file_box = await self.get(key)
+            if file_box is not None:
+                self.hits += 1
+                return file_box
+
+            self.misses += 1
+            return await self.put(key, await fetch())
+
+        return await self._single_flight.do(key, load)
+
+    def stats(self) -> Dict[str, Any]:
+        """the metrics of the cache"""
+        return {
+            'files': len(self._blobs or ()),
+            'bytes': self.total_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
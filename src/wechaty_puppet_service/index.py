@@ -0,0 +1,153 @@
+"""
+Python Wechaty - https://github.com/wechaty/python-wechaty
+
+Authors:    Huan LI (李卓桓) <https://github.com/huan>
+            Jingjing WU (吴京京) <https://github.com/wj-Mcat>
+
+2020-now @ Copyright Wechaty
+
+Licensed under the Apache License, Version 2.0 (the 'License');
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an 'AS IS' BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Optional, Set
+
+
+class RoomMemberIndex:
+    """
+    bidirectional index of room -> members and contact -> rooms.
+
+    The members of a room are indexed once from `room_member_list`, and then they
+        are kept current by the room-join/room-leave events. The members are kept
+        in the order of the service, and the new ones are appended.
+    """
+
+    def __init__(self) -> None:
+        # room_id -> the ordered member ids, the values are not used
+        self._members: Dict[str, Dict[str, None]] = {}
+        self._rooms: Dict[str, Set[str]] = {}
+
+        # whether the members of all rooms are indexed, it's set by the builder
+        self.complete: bool = False
+        # count of the changes which make the index incomplete
+        self.generation: int = 0
+
+        # room_id -> count of the changes, to discard the out-of-date member list
+        #   which is fetched before the change
+        self._versions: Dict[str, int] = {}
+
+    def version(self, room_id: str) -> int:
+        """the count of the changes of the room"""
+        return self._versions.get(room_id, 0)
+
+    def _touch(self, room_id: str) -> None:
+        self._versions[room_id] = self._versions.get(room_id, 0) + 1
+
+    def invalidate(self) -> None:
+        """some rooms are not indexed, eg: the members are dropped to be fetched again"""
+        self.complete = False
+        self.generation += 1
+
+    def set_members(self, room_id: str, member_ids: Iterable[str],
+                    version: Optional[int] = None) -> bool:
+        """
+        index all of the members of the room
+
+        Args:
+            room_id (str): the id of room
+            member_ids (Iterable): the ids of all members
+            version (int, optional): the version of room when the members are fetched,
+                the members are dropped if the room has been changed since then
+        Return:
+            whether the members are indexed
+        """
+        if version is not None and version != self.version(room_id):
+            return False
+
+        self._unlink(room_id)
+        members = dict.fromkeys(member_ids)
+        self._members[room_id] = members
+        for member_id in members:
+            self._rooms.setdefault(member_id, set()).add(room_id)
+        self._touch(room_id)
+        return True
+
+    def add_members(self, room_id: str, member_ids: Iterable[str]) -> None:
+        """the contacts join the room"""
+        self._touch(room_id)
+        members = self._members.get(room_id, None)
+        if members is None:
+            # eg: a new room, its members are fetched on demand
+            self.invalidate()
+            return
+        for member_id in member_ids:
+            members[member_id] = None
+            self._rooms.setdefault(member_id, set()).add(room_id)
+
+    def remove_members(self, room_id: str, member_ids: Iterable[str]) -> None:
+        """the contacts leave the room"""
+        self._touch(room_id)
+        members = self._members.get(room_id, None)
+        if members is None:
+            return
+        for member_id in member_ids:
+            members.pop(member_id, None)
+            self._discard_room(member_id, room_id)
+
+    def remove_room(self, room_id: str) -> None:
+        """
+        drop the room from the index, eg: the account left it. If it should be indexed
+            again, the index is invalidated by the caller
+        """
+        self._touch(room_id)
+        self._unlink(room_id)
+
+    def _unlink(self, room_id: str) -> None:
+        for member_id in self._members.pop(room_id, {}):
+            self._discard_room(member_id, room_id)
+
+    def _discard_room(self, contact_id: str, room_id: str) -> None:
+        rooms = self._rooms.get(contact_id, None)
+        if rooms is None:
+            return
+        rooms.discard(room_id)
+        if not rooms:
+            del self._rooms[contact_id]
+
+    def has_room(self, room_id: str) -> bool:
+        """whether the members of the room are indexed"""
+        return room_id in self._members
+
+    def members(self, room_id: str) -> Optional[List[str]]:
+        """the ids of members, None if the room is not indexed"""
+        members = self._members.get(room_id, None)
+        if members is None:
+            return None
+        return list(members)
+
+    def rooms(self, contact_id: str) -> List[str]:
+        """the ids of indexed rooms which the contact is in"""
+        return list(self._rooms.get(contact_id, ()))
+
+    def room_ids(self) -> List[str]:
+        """the ids of indexed rooms"""
+        return list(self._members)
+
+    def clear(self) -> None:
+        """drop all of the rooms"""
+        for room_id in list(self._members):
+            self.remove_room(room_id)
+        self.invalidate()
+
+    def __len__(self) -> int:
+        return len(self._members)
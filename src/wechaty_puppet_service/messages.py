@@ -0,0 +1,320 @@
+"""
+Python Wechaty - https://github.com/wechaty/python-wechaty
+
+Authors:    Huan LI (李卓桓) <https://github.com/huan>
+            Jingjing WU (吴京京) <https://github.com/wj-Mcat>
+
+2020-now @ Copyright Wechaty
+
+Licensed under the Apache License, Version 2.0 (the 'License');
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an 'AS IS' BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from __future__ import annotations
+
+import sqlite3
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from wechaty_puppet import (
+    MessagePayload,
+    MessageQueryFilter,
+    MessageType,
+    get_logger,
+)
+
+from wechaty_puppet_service.store import _SqliteWorker
+
+log = get_logger('MessageStore')
+
+MESSAGE_STORE_SIZE = 10000
+# the max count of messages in the spill database, the oldest ones are dropped
+MESSAGE_SPILL_SIZE = 1000000
+
+# the fields of message payload which are indexed
+MESSAGE_INDEX_FIELDS = ('room_id', 'from_id', 'to_id', 'type')
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS messages (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    room_id TEXT NOT NULL,
+    from_id TEXT NOT NULL,
+    to_id TEXT NOT NULL,
+    type INTEGER NOT NULL,
+    timestamp INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_room_id ON messages (room_id);
+CREATE INDEX IF NOT EXISTS messages_from_id ON messages (from_id);
+CREATE INDEX IF NOT EXISTS messages_to_id ON messages (to_id);
+CREATE INDEX IF NOT EXISTS messages_timestamp ON messages (timestamp);
+'''
+
+
+def _query_items(query: Optional[MessageQueryFilter]) -> List[Tuple[str, Any]]:
+    """the indexed (field, value) pairs which are specified in the query"""
+    if query is None:
+        return []
+    items: List[Tuple[str, Any]] = []
+    for field_name in MESSAGE_INDEX_FIELDS:
+        value = getattr(query, field_name)
+        if value is not None:
+            items.append((field_name, int(value) if field_name == 'type' else value))
+    return items
+
+
+def match_message(payload: MessagePayload, query: Optional[MessageQueryFilter],
+                  since: Optional[int] = None, until: Optional[int] = None) -> bool:
+    """whether the message payload matches the query and the time range"""
+    if since is not None and payload.timestamp < since:
+        return False
+    if until is not None and payload.timestamp > until:
+        return False
+    if query is None:
+        return True
+    if query.id is not None and payload.id != query.id:
+        return False
+    for field_name, value in _query_items(query):
+        field_value = getattr(payload, field_name)
+        if field_name == 'type':
+            field_value = int(field_value)
+        if field_value != value:
+            return False
+    return query.text is None or query.text in (payload.text or '')
+
+
+class MessageSpill(_SqliteWorker):
+    """
+    embedded sqlite database which keeps the messages evicted from the memory,
+        all of the database operations run in a dedicated thread
+    """
+
+    def __init__(self, path: str, max_size: int = MESSAGE_SPILL_SIZE):
+        """
+        Args:
+            path (str): the path of sqlite database file
+            max_size (int): the max count of messages, the oldest ones are dropped
+        """
+        super().__init__(path)
+        self.max_size = max_size
+
+        self._pending: List[MessagePayload] = []
+
+    def _setup(self, conn: sqlite3.Connection) -> None:
+        conn.executescript(_SCHEMA)
+
+    def _write(self, payloads: List[MessagePayload]) -> None:
+        conn = self._open()
+        with conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO messages '
+                '(id, room_id, from_id, to_id, type, timestamp, text, data) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [(payload.id, payload.room_id or '', payload.from_id or '',
+                  payload.to_id or '', int(payload.type), payload.timestamp or 0,
+                  payload.text or '', bytes(payload)) for payload in payloads]
+            )
+            conn.execute(
+                'DELETE FROM messages WHERE seq <= (SELECT MAX(seq) FROM messages) - ?',
+                (self.max_size,))
+
+    def _query(self, query: Optional[MessageQueryFilter], since: Optional[int],
+               until: Optional[int], limit: Optional[int]) -> List[MessagePayload]:
+        conditions: List[str] = []
+        params: List[Any] = []
+        for field_name, value in _query_items(query):
+            conditions.append(f'{field_name} = ?')
+            params.append(value)
+        if query is not None and query.id is not None:
+            conditions.append('id = ?')
+            params.append(query.id)
+        if query is not None and query.text is not None:
+            conditions.append('instr(text, ?) > 0')
+            params.append(query.text)
+        if since is not None:
+            conditions.append('timestamp >= ?')
+            params.append(since)
+        if until is not None:
+            conditions.append('timestamp <= ?')
+            params.append(until)
+
+        sql = 'SELECT data FROM messages'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY seq DESC'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+
+        rows = self._open().execute(sql, params).fetchall()
+        payloads = []
+        for row in reversed(rows):
+            payload = MessagePayload().parse(row[0])
+            # the type has been mapped before it's saved
+            payload.type = MessageType(payload.type)
+            payloads.append(payload)
+        return payloads
+
+    def put(self, payload: MessagePayload) -> None:
+        """save the message in the next flush"""
+        self._pending.append(payload)
+        self._schedule_flush(len(self._pending))
+
+    async def flush(self) -> None:
+        """write all of the pending messages to the database"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        await self._run(self._write, pending)
+
+    async def query(self, query: Optional[MessageQueryFilter] = None,
+                    since: Optional[int] = None, until: Optional[int] = None,
+                    limit: Optional[int] = None) -> List[MessagePayload]:
+        """the matched messages in the arrival order"""
+        await self.flush()
+        return await self._run(self._query, query, since, until, limit)
+
+
+class MessageStore:
+    """
+    bounded ring buffer of the received messages, indexed by room, talker,
+        listener and type. The evicted messages are kept in the optional spill
+        database.
+
+    The messages are recorded by id from the event stream, and their payloads
+        are recorded when they are fetched.
+    """
+
+    def __init__(self, max_size: int = MESSAGE_STORE_SIZE,
+                 spill: Optional[MessageSpill] = None):
+        """
+        Args:
+            max_size (int): the max count of messages in memory
+            spill (MessageSpill, optional): keeps the evicted messages
+        """
+        self.max_size = max_size
+        self.spill = spill
+
+        # message_id -> payload, None means the payload is not fetched yet
+        self._messages: OrderedDict[str, Optional[MessagePayload]] = OrderedDict()
+        # (field, value) -> message_ids in the arrival order
+        self._indexes: Dict[Tuple[str, Any], Dict[str, None]] = {}
+
+    def add(self, message_id: str) -> None:
+        """record the message which is received from the event stream"""
+        if message_id in self._messages:
+            return
+        self._messages[message_id] = None
+        self._evict()
+
+    def update(self, payload: MessagePayload) -> None:
+        """record the payload of the message"""
+        old_payload = self._messages.get(payload.id, None)
+        if old_payload is not None:
+            self._unindex(old_payload)
+
+        self._messages[payload.id] = payload
+        for key in self._index_keys(payload):
+            self._indexes.setdefault(key, {})[payload.id] = None
+        self._evict()
+
+    def get(self, message_id: str) -> Optional[MessagePayload]:
+        """the recorded payload of the message"""
+        return self._messages.get(message_id, None)
+
+    @staticmethod
+    def _index_keys(payload: MessagePayload) -> Iterable[Tuple[str, Any]]:
+        for field_name in MESSAGE_INDEX_FIELDS:
+            value = getattr(payload, field_name)
+            if value:
+                yield (field_name, int(value) if field_name == 'type' else value)
+
+    def _unindex(self, payload: MessagePayload) -> None:
+        for key in self._index_keys(payload):
+            message_ids = self._indexes.get(key, None)
+            if message_ids is None:
+                continue
+            message_ids.pop(payload.id, None)
+            if not message_ids:
+                del self._indexes[key]
+
+    def _evict(self) -> None:
+        while len(self._messages) > self.max_size:
+            _, payload = self._messages.popitem(last=False)
+            if payload is None:
+                continue
+            self._unindex(payload)
+            if self.spill is not None:
+                self.spill.put(payload)
+
+    def _candidates(self, query: Optional[MessageQueryFilter]) -> List[str]:
+        if query is not None and query.id is not None:
+            return [query.id] if query.id in self._messages else []
+
+        postings: List[Dict[str, None]] = [
+            self._indexes.get(key, {}) for key in _query_items(query)]
+        if not postings:
+            return list(self._messages)
+        # the messages in the smallest posting are verified one by one
+        smallest = min(postings, key=len)
+        return list(smallest)
+
+    def query_memory(self, query: Optional[MessageQueryFilter] = None,
+                     since: Optional[int] = None, until: Optional[int] = None,
+                     limit: Optional[int] = None) -> List[MessagePayload]:
+        """the matched messages in memory, in the arrival order"""
+        matched: List[MessagePayload] = []
+        for message_id in reversed(self._candidates(query)):
+            payload = self._messages.get(message_id, None)
+            if payload is None or not match_message(payload, query, since, until):
+                continue
+            matched.append(payload)
+            if limit is not None and len(matched) >= limit:
+                break
+        matched.reverse()
+        return matched
+
+    async def query(self, query: Optional[MessageQueryFilter] = None,
+                    since: Optional[int] = None, until: Optional[int] = None,
+                    limit: Optional[int] = None) -> List[MessagePayload]:
+        """
+        the matched messages in the arrival order, the spill database is queried
+            if there are not enough messages in memory
+
+        Args:
+            query (MessageQueryFilter, optional): the text is matched as substring,
+                and the other fields are matched exactly
+            since (int, optional): the min timestamp
+            until (int, optional): the max timestamp
+            limit (int, optional): return the latest ones only
+        """
+        matched = self.query_memory(query, since, until, limit)
+        if self.spill is None or (limit is not None and len(matched) >= limit):
+            return matched
+
+        remaining = None if limit is None else limit - len(matched)
+        spilled = await self.spill.query(query, since, until, remaining)
+        # the evicted message is back to memory if its payload is fetched again
+        spilled = [payload for payload in spilled if payload.id not in self._messages]
+        return spilled + matched
+
+    def clear(self) -> None:
+        """drop all of the messages in memory"""
+        self._messages.clear()
+        self._indexes.clear()
+
+    def __contains__(self, message_id: str) -> bool:
+        return message_id in self._messages
+
+    def __len__(self) -> int:
+        return len(self._messages)
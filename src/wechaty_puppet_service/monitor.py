@@ -0,0 +1,197 @@
+"""
+Python Wechaty - https://github.com/wechaty/python-wechaty
+
+Authors:    Huan LI (李卓桓) <https://github.com/huan>
+            Jingjing WU (吴京京) <https://github.com/wj-Mcat>
+
+2020-now @ Copyright Wechaty
+
+Licensed under the Apache License, Version 2.0 (the 'License');
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an 'AS IS' BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+import math
+import time
+import uuid
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from wechaty_puppet import get_logger
+
+log = get_logger('LivenessMonitor')
+
+# the prefix of ding data, so that the dong of probe can be recognized
+DING_PREFIX = 'wechaty-puppet-service-probe:'
+
+DING_INTERVAL = 30
+DING_TIMEOUT = 10
+
+# the connection is degraded if p99 of rtt(seconds) or loss ratio is above it
+RTT_THRESHOLD = 5
+LOSS_THRESHOLD = 0.2
+
+
+def percentile(samples: List[float], ratio: float) -> Optional[float]:
+    """
+    nearest-rank percentile of the samples
+
+    Examples:
+        >>> percentile([1, 2, 3, 4], 0.5)
+        2
+    """
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = max(0, math.ceil(ratio * len(ordered)) - 1)
+    return ordered[index]
+
+
+# pylint: disable=R0902,R0917
+class LivenessMonitor:
+    """
+    send tagged ding to the service periodically, and match it with the dong
+        event to measure the round trip time of client -> service -> wechat
+    """
+
+    def __init__(self, ding: Callable[[str], Awaitable[Any]],
+                 interval: float = DING_INTERVAL,
+                 timeout: float = DING_TIMEOUT,
+                 window: int = 100,
+                 rtt_threshold: float = RTT_THRESHOLD,
+                 loss_threshold: float = LOSS_THRESHOLD):
+        """
+        Args:
+            ding (Callable): send the ding data to the service
+            interval (float): seconds between two probes
+            timeout (float): seconds to wait for the dong, otherwise it's lost
+            window (int): the count of recent probes to compute the metrics
+            rtt_threshold (float): the connection is degraded if p99 is above it
+            loss_threshold (float): the connection is degraded if loss ratio is above it
+        """
+        self._ding = ding
+        self.interval = interval
+        self.timeout = timeout
+        self.rtt_threshold = rtt_threshold
+        self.loss_threshold = loss_threshold
+
+        # rtt of the probe, or None if it's lost
+        self._samples: Deque[Optional[float]] = deque(maxlen=window)
+        self._waiters: Dict[str, asyncio.Future] = {}
+        self._sequence = itertools.count()
+        self._session = uuid.uuid4().hex[:8]
+
+        self._task: Optional[asyncio.Task] = None
+        self.degraded: bool = False
+
+    def on_dong(self, data: Optional[str]) -> bool:
+        """
+        match the dong event with the probe
+
+        Return:
+            True if it's the dong of probe, which should not be emitted to the listeners
+        """
+        if not data or not data.startswith(DING_PREFIX):
+            return False
+        waiter = self._waiters.pop(data, None)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(time.perf_counter())
+        return True
+
+    async def probe(self) -> Optional[float]:
+        """
+        send one tagged ding and wait for the dong
+
+        Return:
+            the round trip time(seconds), or None if the dong is lost
+        """
+        tag = f'{DING_PREFIX}{self._session}:{next(self._sequence)}'
+        waiter = asyncio.get_event_loop().create_future()
+        self._waiters[tag] = waiter
+
+        start = time.perf_counter()
+        rtt: Optional[float] = None
+        try:
+            await self._ding(tag)
+            end = await asyncio.wait_for(waiter, timeout=self.timeout)
+            rtt = end - start
+        except asyncio.TimeoutError:
+            log.debug('dong of <%s> is lost', tag)
+        # pylint: disable=W0703
+        except Exception as e:
+            log.warning('ding <%s> failed: %s', tag, e)
+        finally:
+            self._waiters.pop(tag, None)
+
+        self._samples.append(rtt)
+        self._check()
+        return rtt
+
+    def _check(self) -> None:
+        p99, loss = self.p99, self.loss_ratio
+        degraded = loss > self.loss_threshold or (p99 is not None and p99 > self.rtt_threshold)
+        if degraded != self.degraded:
+            if degraded:
+                log.warning('connection is degraded: p99 rtt <%s>s, loss ratio <%.2f>', p99, loss)
+            else:
+                log.info('connection is recovered: p99 rtt <%s>s, loss ratio <%.2f>', p99, loss)
+        self.degraded = degraded
+
+    @property
+    def rtts(self) -> List[float]:
+        """the rtt of recent probes which got dong"""
+        return [sample for sample in self._samples if sample is not None]
+
+    @property
+    def p50(self) -> Optional[float]:
+        """median of rtt in seconds"""
+        return percentile(self.rtts, 0.5)
+
+    @property
+    def p99(self) -> Optional[float]:
+        """p99 of rtt in seconds"""
+        return percentile(self.rtts, 0.99)
+
+    @property
+    def loss_ratio(self) -> float:
+        """ratio of the probes which don't get dong in time"""
+        if not self._samples:
+            return 0.0
+        return sum(1 for sample in self._samples if sample is None) / len(self._samples)
+
+    def stats(self) -> Dict[str, Any]:
+        """the metrics of recent probes"""
+        return {
+            'probes': len(self._samples),
+            'p50': self.p50,
+            'p99': self.p99,
+            'loss_ratio': self.loss_ratio,
+            'degraded': self.degraded,
+        }
+
+    async def _run(self) -> None:
+        while True:
+            await self.probe()
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        """start probing in the background"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    def stop(self) -> None:
+        """stop probing"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,71 @@
+"""
+Python Wechaty - https://github.com/wechaty/python-wechaty
+
+Authors:    Huan LI (李卓桓) <https://github.com/huan>
+            Jingjing WU (吴京京) <https://github.com/wj-Mcat>
+
+2020-now @ Copyright Wechaty
+
+Licensed under the Apache License, Version 2.0 (the 'License');
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an 'AS IS' BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+PREFETCH_CONCURRENCY = 16
+# report the progress after every so many payloads
+PREFETCH_REPORT_INTERVAL = 500
+
+
+# pylint: disable=R0902
+@dataclass
+class PrefetchProgress:
+    """the progress of prefetching the payloads"""
+    contacts: int = 0
+    rooms: int = 0
+    # the calls which list the members of the rooms
+    member_lists: int = 0
+    room_members: int = 0
+
+    fetched: int = 0
+    failed: int = 0
+
+    started_at: float = field(default_factory=time.monotonic)
+    finished_at: Optional[float] = None
+
+    @property
+    def total(self) -> int:
+        """count of the payloads and member lists which are discovered"""
+        return self.contacts + self.rooms + self.member_lists + self.room_members
+
+    @property
+    def done(self) -> int:
+        """count of the payloads which are fetched or failed"""
+        return self.fetched + self.failed
+
+    @property
+    def elapsed(self) -> float:
+        """seconds since the prefetching is started"""
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    @property
+    def throughput(self) -> float:
+        """fetched payloads per second"""
+        elapsed = self.elapsed
+        return self.fetched / elapsed if elapsed > 0 else 0.0
+
+    def __str__(self) -> str:
+        return (f'{self.done}/{self.total} payloads, {self.failed} failed, '
+                f'{self.elapsed:.1f}s, {self.throughput:.1f}/s')
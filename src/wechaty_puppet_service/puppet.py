@@ -20,45 +20,58 @@ limitations under the License.
 """
 from __future__ import annotations
 
-import json
-from typing import Callable, Optional, List
+import asyncio
+import re
+import time
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    Optional,
+    List,
+    Set,
+    Tuple,
+    Union,
+    cast,
+)
 from dataclasses import asdict
-import requests
+from functools import partial
 
 from wechaty_grpc.wechaty import (
     PuppetStub,
 )
 from wechaty_grpc.wechaty.puppet import (
+    EventResponse,
     MessageFileResponse,
     MessageImageResponse
 )
 # pylint: disable=E0401
 from grpclib.client import Channel
 # pylint: disable=E0401
+from grpclib.exceptions import GRPCError, StreamTerminatedError
+# pylint: disable=E0401
 from pyee import AsyncIOEventEmitter
+from wechaty_puppet.file_box.type import FileBoxType
 from wechaty_puppet.schemas.types import PayloadType
 
 from wechaty_puppet import (
-    EventScanPayload,
-    ScanStatus,
-
     EventReadyPayload,
 
     EventDongPayload,
     EventRoomTopicPayload,
     EventRoomLeavePayload,
     EventRoomJoinPayload,
-    EventRoomInvitePayload,
 
     EventMessagePayload,
     EventLogoutPayload,
     EventLoginPayload,
-    EventFriendshipPayload,
-    EventHeartbeatPayload,
     EventErrorPayload,
     FileBox, RoomMemberPayload, RoomPayload, RoomInvitationPayload,
     RoomQueryFilter, FriendshipPayload, ContactPayload, MessagePayload,
-    MessageQueryFilter,
+    MessageQueryFilter, ContactQueryFilter,
 
     ImageType,
     EventType,
@@ -80,12 +93,111 @@ from wechaty_puppet.exceptions import (
 )
 
 from wechaty_puppet_service.config import (
+    get_ding_interval,
     get_endpoint,
+    get_enrich_message_deadline,
+    get_event_dedup_window,
+    get_event_dispatch_workers,
+    get_event_queue_size,
+    get_event_recording_path,
+    get_event_spill_path,
+    get_file_box_cache_dir,
+    get_file_box_cache_size,
+    get_json_codec_name,
+    get_message_spill_path,
+    get_message_store_size,
+    get_micro_batch_window,
+    get_payload_store_path,
+    get_prefetch_on_ready,
     get_token,
 )
+from wechaty_puppet_service.batch import (
+    BATCH_CONCURRENCY,
+    BatchResult,
+    MicroBatcher,
+    gather_batch,
+)
+from wechaty_puppet_service.cache import (
+    CONTACT_PAYLOAD_CACHE_SIZE,
+    MESSAGE_PAYLOAD_CACHE_SIZE,
+    MESSAGE_PAYLOAD_CACHE_TTL,
+    ROOM_MEMBER_PAYLOAD_CACHE_SIZE,
+    ROOM_PAYLOAD_CACHE_SIZE,
+    SingleFlight,
+    TTLCache,
+)
+from wechaty_puppet_service.channel_pool import (
+    ChannelPool,
+    PooledPuppetStub,
+    PoolMember,
+)
+from wechaty_puppet_service.dedup import (
+    EVENT_DEDUP_SIZE,
+    EVENT_DEDUP_WINDOW,
+    EventDeduplicator,
+)
+from wechaty_puppet_service.discovery import EndpointResolver
+from wechaty_puppet_service.dispatch import (
+    EVENT_DISPATCH_QUEUE_SIZE,
+    EVENT_DISPATCH_WORKERS,
+    EventDispatcher,
+)
+from wechaty_puppet_service.codec import JSONCodec, get_json_codec
+from wechaty_puppet_service.enrich import (
+    ENRICH_DEADLINE,
+    ENRICHED_MESSAGE_EVENT,
+    EnrichedMessagePayload,
+    MessageEnricher,
+)
+from wechaty_puppet_service.event_queue import (
+    EVENT_QUEUE_SIZE,
+    EventQueue,
+    EventSpill,
+    OverflowPolicy,
+)
+from wechaty_puppet_service.events import (
+    DEFAULT_EVENT_DECODERS,
+    EventDecoder,
+    EventHook,
+    EventRoute,
+)
+from wechaty_puppet_service.file_box_cache import FILE_BOX_CACHE_SIZE, FileBoxCache
+from wechaty_puppet_service.index import RoomMemberIndex
+from wechaty_puppet_service.messages import (
+    MESSAGE_STORE_SIZE,
+    MessageSpill,
+    MessageStore,
+)
+from wechaty_puppet_service.monitor import DING_INTERVAL, LivenessMonitor
+from wechaty_puppet_service.prefetch import (
+    PREFETCH_CONCURRENCY,
+    PREFETCH_REPORT_INTERVAL,
+    PrefetchProgress,
+)
+from wechaty_puppet_service.recording import EventRecorder, replay_recording
+from wechaty_puppet_service.search import (
+    CONTACT_FILTER_FIELDS,
+    ContactSearchIndex,
+    RoomSearchIndex,
+    contact_search_fields,
+)
+from wechaty_puppet_service.store import PAYLOAD_STORE_MAX_AGE, PayloadStore
+from wechaty_puppet_service.subscription import (
+    EVENT_BATCH_SIZE,
+    EVENT_BATCH_WAIT_MS,
+    EVENT_SUBSCRIPTION_SIZE,
+    EventSubscription,
+    StreamEvent,
+)
+from wechaty_puppet_service.supervisor import (
+    EVENT_STREAM_STALL_TIMEOUT,
+    EventStreamMetrics,
+    ExponentialBackoff,
+)
 from wechaty_puppet_service.utils import (
-    extract_host_and_port,
-    ping_endpoint,
+    probe_endpoint,
+    probe_endpoints,
+    split_endpoints,
     message_emoticon
 )
 
@@ -160,12 +272,13 @@ def _map_message_type(message_payload: MessagePayload) -> MessagePayload:
     return message_payload
 
 
-# pylint: disable=R0904
+# pylint: disable=R0902,R0904
 class PuppetService(Puppet):
     """
     grpc wechaty puppet implementation
     """
 
+    # pylint: disable=R0914,R0915
     def __init__(self, options: PuppetOptions, name: str = 'puppet_service'):
         """init PuppetService from options or environment
 
@@ -206,13 +319,151 @@ class PuppetService(Puppet):
             log.warning(f'there are endpoint<{options.end_point}> and token<{options.token}>, '
                         f'and the endpoint will be used for service ...')
 
-        self.channel: Optional[Channel] = None
+        self._channel_pool: Optional[ChannelPool] = None
         self._puppet_stub: Optional[PuppetStub] = None
 
         self._event_stream: AsyncIOEventEmitter = AsyncIOEventEmitter()
 
         self.login_user_id: Optional[str] = None
 
+        self._endpoint_resolver: Optional[EndpointResolver] = None
+
+        self.event_stream_stall_timeout: float = EVENT_STREAM_STALL_TIMEOUT
+        self.event_stream_metrics: EventStreamMetrics = EventStreamMetrics()
+        self.event_stream_backoff: ExponentialBackoff = ExponentialBackoff()
+
+        ding_interval = get_ding_interval()
+        self.liveness_monitor: LivenessMonitor = LivenessMonitor(
+            ding=self.ding, interval=ding_interval or DING_INTERVAL)
+        self._liveness_probe_enabled = ding_interval is not None
+
+        self.contact_payload_cache: TTLCache[str, ContactPayload] = \
+            TTLCache(max_size=CONTACT_PAYLOAD_CACHE_SIZE)
+        self.room_payload_cache: TTLCache[str, RoomPayload] = \
+            TTLCache(max_size=ROOM_PAYLOAD_CACHE_SIZE)
+        # (room_id, contact_id) -> RoomMemberPayload
+        self.room_member_payload_cache: TTLCache[Tuple[str, str], RoomMemberPayload] = \
+            TTLCache(max_size=ROOM_MEMBER_PAYLOAD_CACHE_SIZE)
+
+        self.message_payload_cache: TTLCache[str, MessagePayload] = TTLCache(
+            max_size=MESSAGE_PAYLOAD_CACHE_SIZE, ttl=MESSAGE_PAYLOAD_CACHE_TTL)
+        # (kind, message_id) -> the decoded url-link, mini-program or contact of message
+        self.message_extract_cache: TTLCache[Tuple[str, str], Any] = TTLCache(
+            max_size=MESSAGE_PAYLOAD_CACHE_SIZE, ttl=MESSAGE_PAYLOAD_CACHE_TTL)
+
+        # room -> members and contact -> rooms, kept current by room-join/room-leave
+        self.room_member_index: RoomMemberIndex = RoomMemberIndex()
+        # topic -> rooms, kept current by room-topic
+        self.room_search_index: RoomSearchIndex = RoomSearchIndex()
+        # name/alias/weixin -> contacts, kept current by contact_alias and dirty_payload
+        self.contact_search_index: ContactSearchIndex = ContactSearchIndex()
+
+        # merge the concurrent read-only calls: (method_name, *args) -> response
+        self.single_flight: SingleFlight[tuple, Any] = SingleFlight()
+
+        # collect the payload lookups of a short window into one batch
+        self.contact_payload_batcher: Optional[MicroBatcher[str, ContactPayload]] = None
+        self.room_payload_batcher: Optional[MicroBatcher[str, RoomPayload]] = None
+        self.room_member_payload_batcher: \
+            Optional[MicroBatcher[Tuple[str, str], RoomMemberPayload]] = None
+        micro_batch_window = get_micro_batch_window()
+        if micro_batch_window is not None:
+            self.enable_micro_batch(micro_batch_window)
+
+        store_path = get_payload_store_path()
+        self.payload_store: Optional[PayloadStore] = \
+            PayloadStore(store_path) if store_path else None
+        self._reconcile_task: Optional[asyncio.Task] = None
+
+        spill_path = get_message_spill_path()
+        self.message_store: MessageStore = MessageStore(
+            max_size=get_message_store_size() or MESSAGE_STORE_SIZE,
+            spill=MessageSpill(spill_path) if spill_path else None
+        )
+
+        file_box_cache_dir = get_file_box_cache_dir()
+        self.file_box_cache: Optional[FileBoxCache] = FileBoxCache(
+            file_box_cache_dir, max_bytes=get_file_box_cache_size() or FILE_BOX_CACHE_SIZE
+        ) if file_box_cache_dir else None
+
+        self.json_codec: JSONCodec = get_json_codec(get_json_codec_name())
+        log.info('using json codec <%s>', self.json_codec.name)
+
+        # emit the events in parallel by conversation, or inline if it's None
+        self.event_dispatcher: Optional[EventDispatcher] = None
+        dispatch_workers = get_event_dispatch_workers()
+        if dispatch_workers is not None:
+            self.enable_event_dispatch(workers=dispatch_workers)
+
+        # the consumers of events()
+        self._subscriptions: Set[EventSubscription] = set()
+
+        # suppress the events replayed after reconnecting, or None
+        self.event_deduplicator: Optional[EventDeduplicator] = None
+        dedup_window = get_event_dedup_window()
+        if dedup_window is not None:
+            self.enable_event_dedup(window=dedup_window)
+
+        # emit the enriched-message event with the prefetched payloads, or None
+        self.message_enricher: Optional[MessageEnricher] = None
+        enrich_deadline = get_enrich_message_deadline()
+        if enrich_deadline is not None:
+            self.enable_message_enrichment(deadline=enrich_deadline)
+
+        # record the raw event stream to replay it offline, or None
+        recording_path = get_event_recording_path()
+        self.event_recorder: Optional[EventRecorder] = \
+            EventRecorder(recording_path) if recording_path else None
+
+        # decouple the reading of event stream from the listeners, or None
+        self.event_queue: Optional[EventQueue] = None
+        self._event_queue_task: Optional[asyncio.Task] = None
+        event_queue_size = get_event_queue_size()
+        if event_queue_size is not None:
+            self.enable_event_queue(max_size=event_queue_size,
+                                    spill_path=get_event_spill_path())
+
+        # the internal handlers of the events, which keep the local states current
+        hooks: Dict[int, EventHook] = {
+            int(EventType.EVENT_TYPE_DONG): self._on_dong_event,
+            int(EventType.EVENT_TYPE_MESSAGE): self._on_message_event,
+            int(EventType.EVENT_TYPE_ERROR): self._on_error_event,
+            int(EventType.EVENT_TYPE_ROOM_JOIN): self._on_room_join_event,
+            int(EventType.EVENT_TYPE_ROOM_LEAVE): self._on_room_leave_event,
+            int(EventType.EVENT_TYPE_ROOM_TOPIC): self._on_room_topic_event,
+            int(EventType.EVENT_TYPE_READY): self._on_ready_event,
+            int(EventType.EVENT_TYPE_LOGIN): self._on_login_event,
+            int(EventType.EVENT_TYPE_LOGOUT): self._on_logout_event,
+        }
+        # event type -> route, looked up for every event
+        self._event_routes: Dict[int, EventRoute] = {
+            event_type: EventRoute(name=name, decode=decoder, hook=hooks.get(event_type))
+            for event_type, (name, decoder) in DEFAULT_EVENT_DECODERS.items()
+        }
+
+        self.prefetch_on_ready: bool = get_prefetch_on_ready()
+        self._prefetch_task: Optional[asyncio.Task] = None
+        # all of the running prefetches, which are cancelled when logged out
+        self._prefetch_tasks: Set[asyncio.Task] = set()
+
+    @property
+    def channel(self) -> Optional[Channel]:
+        """
+        the channel of the primary service which holds the event stream
+        """
+        if self._channel_pool is None:
+            return None
+        return self._channel_pool.primary.channel
+
+    @property
+    def channel_pool(self) -> ChannelPool:
+        """
+        get the pool of channels to the services, guaranteed to be not null or raises an error.
+        """
+        if self._channel_pool is None:
+            raise WechatyPuppetError('channel_pool should not be none')
+        return self._channel_pool
+
     @property
     def puppet_stub(self) -> PuppetStub:
         """
@@ -228,7 +479,8 @@ class PuppetService(Puppet):
         get all room list
         :return:
         """
-        response = await self.puppet_stub.room_list()
+        response = await self.single_flight.do(
+            ('room_list',), self.puppet_stub.room_list)
         if response is None:
             raise WechatyPuppetGrpcError('can"t get room_list response')
         return response.ids
@@ -241,11 +493,240 @@ class PuppetService(Puppet):
         :param image_type:
         :return:
         """
-        response: MessageImageResponse = await self.puppet_stub.message_image(
-            id=message_id,
-            type=image_type)
-        file_box = FileBox.from_json(response.filebox)
-        return file_box
+        async def fetch() -> FileBox:
+            response: MessageImageResponse = await self.puppet_stub.message_image(
+                id=message_id,
+                type=image_type)
+            return FileBox.from_json(self.json_codec.loads(response.filebox))
+
+        return await self._cached_file_box(f'message_image:{message_id}:{image_type}', fetch)
+
+    async def _cached_file_box(self, key: str, fetch: Callable[[], Awaitable[FileBox]]
+                               ) -> FileBox:
+        """
+        get the file box from the file box cache if it's enabled, or fetch it
+        """
+        if self.file_box_cache is None:
+            return await fetch()
+        return await self.file_box_cache.fetch(key, fetch)
+
+    async def _cached_remote_file_box(self, file_box: FileBox) -> FileBox:
+        """
+        download the remote file box once, and read it from the file box cache later
+        """
+        if self.file_box_cache is None or file_box.type() != FileBoxType.Url:
+            return file_box
+
+        async def fetch() -> FileBox:
+            return file_box
+
+        return await self.file_box_cache.fetch(f'url:{file_box.remoteUrl}', fetch)
+
+    def enable_event_dispatch(self, workers: int = EVENT_DISPATCH_WORKERS,
+                              max_size: int = EVENT_DISPATCH_QUEUE_SIZE) -> None:
+        """
+        emit the events to the listeners with a pool of workers instead of inline, so
+            a slow listener doesn't stall the event stream. The events of one room or
+            one talker are handled in order, and the different ones in parallel.
+
+        The message payload is fetched to find the conversation of the message event,
+            and it's cached for the listeners.
+
+        Args:
+            workers (int): the count of workers
+            max_size (int): stop reading the event stream if there are more pending
+                events than it
+        """
+        self.event_dispatcher = EventDispatcher(
+            listeners=self._event_stream.listeners,
+            conversation_key=self._event_conversation,
+            workers=workers,
+            max_size=max_size,
+        )
+
+    def enable_event_dedup(self, window: float = EVENT_DEDUP_WINDOW,
+                           max_size: int = EVENT_DEDUP_SIZE) -> None:
+        """
+        suppress the message, friendship and room events which have been received
+            in the window, eg: replayed by the service after reconnecting
+
+        Args:
+            window (float): seconds to remember the events
+            max_size (int): the max count of the remembered events
+        """
+        self.event_deduplicator = EventDeduplicator(window=window, max_size=max_size)
+
+    def enable_event_queue(self, max_size: int = EVENT_QUEUE_SIZE,
+                           high_watermark: Optional[int] = None,
+                           low_watermark: Optional[int] = None,
+                           policies: Optional[Dict[int, OverflowPolicy]] = None,
+                           spill_path: Optional[str] = None) -> None:
+        """
+        queue the events between the reader of event stream and the listeners, so
+            the slow listeners don't hold back the heartbeats. Above the high
+            watermark, only the latest heartbeat, scan and dong are kept, and the
+            other events are saved in the spill database when the memory is full.
+
+        Args:
+            max_size (int): the max count of events in memory
+            high_watermark (int, optional): start applying the overflow policies
+            low_watermark (int, optional): stop applying the overflow policies
+            policies (Dict, optional): event type -> overflow policy
+            spill_path (str, optional): the path of sqlite database for the overflowed
+                events, the reader waits when the memory is full if it's not set
+        """
+        self.event_queue = EventQueue(
+            max_size=max_size,
+            high_watermark=high_watermark,
+            low_watermark=low_watermark,
+            policies=policies,
+            spill=EventSpill(spill_path) if spill_path else None,
+        )
+
+    def start_recording(self, path: str) -> EventRecorder:
+        """
+        append the raw event responses received from the service to the recording
+            file, which can be replayed by `replay_events()` without the service
+        """
+        self.stop_recording()
+        self.event_recorder = EventRecorder(path)
+        return self.event_recorder
+
+    def stop_recording(self) -> None:
+        """close the recording file"""
+        if self.event_recorder is not None:
+            self.event_recorder.close()
+            self.event_recorder = None
+
+    async def replay_events(self, path: str, speed: Optional[float] = 1.0) -> int:
+        """
+        feed the recorded event responses to the listeners as if they are received
+            from the service, eg: to benchmark the listeners with the real traffic
+
+        Args:
+            path (str): the path of recording file
+            speed (float, optional): 1 is real time, 2 is twice as fast, None or 0
+                is as fast as possible
+
+        Return:
+            the count of replayed events
+        """
+        self._start_event_queue()
+        return await replay_recording(path, self._receive_event, speed=speed)
+
+    def _start_event_queue(self) -> None:
+        if self.event_queue is not None and (
+                self._event_queue_task is None or self._event_queue_task.done()):
+            self._event_queue_task = asyncio.ensure_future(self._consume_event_queue())
+
+    async def _receive_event(self, response: EventResponse) -> None:
+        """pass the event response through the queue and the listeners"""
+        if self.event_queue is not None:
+            await self.event_queue.put(response)
+            return
+        self._handle_event_response(response)
+        await self._wait_for_consumers()
+
+    def _handle_event_response(self, response: EventResponse) -> None:
+        """emit the event, the failure of one bad event doesn't break the event stream"""
+        try:
+            self._on_event_response(response)
+        # pylint: disable=W0703
+        except Exception:
+            log.exception('handle <%s> event failed', response.type)
+
+    async def _consume_event_queue(self) -> None:
+        """handle the queued events in order"""
+        assert self.event_queue is not None
+        while True:
+            response = await self.event_queue.get()
+            self._handle_event_response(response)
+            await self._wait_for_consumers()
+
+    def enable_message_enrichment(self, deadline: float = ENRICH_DEADLINE) -> None:
+        """
+        emit the `enriched-message` event with the payloads of the message, the talker
+            and the room, which are fetched as soon as the message event is received.
+            The talker and the room are fetched concurrently, and the enriched messages
+            are emitted in the order of message events.
+
+        The payloads are only fetched when there are listeners of `enriched-message`.
+
+        Args:
+            deadline (float): seconds to wait for the payloads, the enriched message
+                is emitted with the fetched payloads only after it
+        """
+        self.message_enricher = MessageEnricher(
+            message_payload=self.message_payload,
+            contact_payload=self.contact_payload,
+            room_payload=self.room_payload,
+            emit=partial(self._emit_event, ENRICHED_MESSAGE_EVENT),
+            deadline=deadline,
+        )
+
+    async def _event_conversation(self, name: str, payload: Any) -> Optional[str]:
+        """the room id or the talker id of the event"""
+        message: Optional[MessagePayload] = None
+        if isinstance(payload, EnrichedMessagePayload):
+            message = payload.message
+        elif isinstance(payload, EventMessagePayload):
+            message = await self.message_payload(payload.message_id)
+        if message is not None:
+            if message.room_id:
+                return message.room_id
+            # the messages sent by the login user belong to the conversation of listener
+            if message.from_id == self.login_user_id:
+                return message.to_id
+            return message.from_id
+        room_id = getattr(payload, 'room_id', None)
+        if room_id:
+            return room_id
+        log.debug('there is no conversation of <%s> event', name)
+        return None
+
+    async def events(self, types: Optional[Iterable[str]] = None,
+                     max_batch: int = EVENT_BATCH_SIZE,
+                     max_wait_ms: float = EVENT_BATCH_WAIT_MS,
+                     max_size: int = EVENT_SUBSCRIPTION_SIZE
+                     ) -> AsyncIterator[List[StreamEvent]]:
+        """
+        consume the decoded events in batches, eg:
+
+            async for batch in puppet.events(types=['message'], max_batch=50):
+                await save([event.payload.message_id for event in batch])
+
+        The reader of event stream waits when the consumer falls behind by `max_size`
+            events, instead of buffering them without limit.
+
+        Args:
+            types (Iterable[str], optional): the event names, eg: message, room-join.
+                All of the events are received if it's None
+            max_batch (int): the max count of events in one batch
+            max_wait_ms (float): milliseconds to wait for more events after the first
+                one of a batch
+            max_size (int): the max count of the buffered events
+        """
+        subscription = EventSubscription(names=types, max_size=max_size)
+        self._subscriptions.add(subscription)
+        try:
+            while True:
+                batch = await subscription.get_batch(max_batch, max_wait_ms)
+                if not batch:
+                    return
+                yield batch
+        finally:
+            subscription.close()
+            self._subscriptions.discard(subscription)
+
+    async def _wait_for_consumers(self) -> None:
+        """hold back the reading of event stream until the consumers catch up"""
+        if self.event_dispatcher is not None:
+            # the slow listeners hold back the reading of event stream
+            await self.event_dispatcher.wait_for_capacity()
+        for subscription in list(self._subscriptions):
+            await subscription.wait_for_capacity()
+        if self.message_enricher is not None:
+            await self.message_enricher.wait_for_capacity()
 
     def on(self, event_name: str, caller: Callable[..., None]) -> None:
         """
@@ -271,9 +752,73 @@ class PuppetService(Puppet):
         get contact list
         :return:
         """
-        response = await self.puppet_stub.contact_list()
+        response = await self.single_flight.do(
+            ('contact_list',), self.puppet_stub.contact_list)
         return response.ids
 
+    async def contact_search(self, query: Union[str, ContactQueryFilter, None] = None
+                             ) -> List[str]:
+        """
+        find the contact_ids from the local index, the index is built at the first search
+
+        Args:
+            query (str | ContactQueryFilter, optional): the str is searched in the
+                name, alias, weixin and the other text fields. The fields of filter
+                are matched exactly if they are str, or searched if they are
+                compiled regex patterns
+        Return:
+            the ids of matched contacts
+        """
+        if not self.contact_search_index.complete:
+            await self._build_contact_search_index()
+        index = self.contact_search_index
+
+        if query is None:
+            return index.ids()
+        if isinstance(query, str):
+            return index.search(query)
+
+        contact_ids: Optional[Set[str]] = None
+        for field_name in CONTACT_FILTER_FIELDS:
+            value = getattr(query, field_name)
+            if value is None:
+                continue
+            matched = set(index.match(field_name, value))
+            contact_ids = matched if contact_ids is None else contact_ids & matched
+        if query.id is not None:
+            if contact_ids is None:
+                contact_ids = set(index.ids())
+            contact_ids = contact_ids & {query.id}
+
+        return index.ids() if contact_ids is None else list(contact_ids)
+
+    async def _build_contact_search_index(self) -> None:
+        """
+        index all contacts, only the contacts not indexed yet are fetched
+        """
+        contact_ids = await self.contact_list()
+        for contact_id in set(self.contact_search_index.ids()) - set(contact_ids):
+            self.contact_search_index.remove(contact_id)
+
+        missing = [contact_id for contact_id in contact_ids
+                   if contact_id not in self.contact_search_index]
+        versions = {contact_id: self.contact_payload_cache.version(contact_id)
+                    for contact_id in missing}
+        result = await self.contact_payload_batch(missing)
+        # the cached payloads are returned without being indexed by contact_payload(),
+        #   and the ones invalidated during the batch are fetched in the next search
+        stale = 0
+        for contact_id, payload in result.results.items():
+            if self.contact_payload_cache.version(contact_id) == versions[contact_id]:
+                self.contact_search_index.update(contact_id, contact_search_fields(payload))
+            else:
+                stale += 1
+        if not result.ok or stale:
+            log.warning('can"t index <%s> contacts, retry in the next search',
+                        len(result.errors) + stale)
+            return
+        self.contact_search_index.complete = True
+
     async def tag_contact_delete(self, tag_id: str) -> None:
         """
         delete some tag
@@ -329,8 +874,10 @@ class PuppetService(Puppet):
         :param contact_id:
         :return:
         """
-        response = await self.puppet_stub.tag_contact_list(
-            contact_id=contact_id)
+        response = await self.single_flight.do(
+            ('tag_contact_list', contact_id),
+            partial(self.puppet_stub.tag_contact_list, contact_id=contact_id)
+        )
         return response.ids
 
     async def message_send_text(self, conversation_id: str, message: str,
@@ -401,18 +948,24 @@ class PuppetService(Puppet):
         response = await self.puppet_stub.message_send_mini_program(
             conversation_id=conversation_id,
             # TODO -> check mini_program key
-            mini_program=json.dumps(asdict(mini_program))
+            mini_program=self.json_codec.dumps(asdict(mini_program))
         )
         return response.id
 
     async def message_search(self, query: Optional[MessageQueryFilter] = None
                              ) -> List[str]:
         """
-        # TODO -> this function should not be here ?
-        :param query:
-        :return:
+        find the message_ids from the local message store, which keeps the received
+            messages whose payloads are fetched
+
+        Args:
+            query (MessageQueryFilter, optional): the text is matched as substring,
+                and the other fields are matched exactly
+        Return:
+            the ids of matched messages in the arrival order
         """
-        return []
+        payloads = await self.message_store.query(query)
+        return [payload.id for payload in payloads]
 
     async def message_recall(self, message_id: str) -> bool:
         """
@@ -429,9 +982,36 @@ class PuppetService(Puppet):
         :param message_id:
         :return:
         """
-        response = await self.puppet_stub.message_payload(id=message_id)
+        payload = self.message_payload_cache.get(message_id)
+        if payload is not None:
+            return payload
 
-        return _map_message_type(response)
+        async def fetch() -> MessagePayload:
+            response = await self.puppet_stub.message_payload(id=message_id)
+            # the shared response is mapped once, the mapping is in place
+            return _map_message_type(response)
+
+        version = self.message_payload_cache.version(message_id)
+        payload = await self.single_flight.do(('message_payload', message_id), fetch)
+        # the payload fetched before the invalidation is not saved
+        if self.message_payload_cache.set(message_id, payload, version=version):
+            self.message_store.update(payload)
+        return payload
+
+    async def _message_extract(self, kind: str, message_id: str,
+                               extract: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        extract the data of message once, the concurrent and the following calls
+            of the same kind share the result
+        """
+        key = (kind, message_id)
+        value = self.message_extract_cache.get(key)
+        if value is not None:
+            return value
+
+        value = await self.single_flight.do(key, extract)
+        self.message_extract_cache.set(key, value)
+        return value
 
     async def message_forward(self, to_id: str, message_id: str) -> None:
         """
@@ -449,7 +1029,7 @@ class PuppetService(Puppet):
             url_payload = await self.message_url(message_id=message_id)
             await self.message_send_url(
                 conversation_id=to_id,
-                url=json.dumps(asdict(url_payload))
+                url=self.json_codec.dumps(asdict(url_payload))
             )
         elif payload.type == MessageType.MESSAGE_TYPE_MINI_PROGRAM:
             mini_program = await self.message_mini_program(message_id=message_id)
@@ -473,9 +1053,11 @@ class PuppetService(Puppet):
         :param message_id:
         :return:
         """
-        response: MessageFileResponse = await self.puppet_stub.message_file(id=message_id)
-        file_box = FileBox.from_json(response.filebox)
-        return file_box
+        async def fetch() -> FileBox:
+            response: MessageFileResponse = await self.puppet_stub.message_file(id=message_id)
+            return FileBox.from_json(self.json_codec.loads(response.filebox))
+
+        return await self._cached_file_box(f'message_file:{message_id}', fetch)
 
     async def message_contact(self, message_id: str) -> str:
         """
@@ -483,8 +1065,11 @@ class PuppetService(Puppet):
         :param message_id:
         :return:
         """
-        response = await self.puppet_stub.message_contact(id=message_id)
-        return response.id
+        async def extract() -> str:
+            response = await self.puppet_stub.message_contact(id=message_id)
+            return response.id
+
+        return await self._message_extract('message_contact', message_id, extract)
 
     async def message_url(self, message_id: str) -> UrlLinkPayload:
         """
@@ -492,15 +1077,18 @@ class PuppetService(Puppet):
         :param message_id:
         :return:
         """
-        response = await self.puppet_stub.message_url(id=message_id)
-        # parse url_link data from response
-        payload_data = json.loads(response.url_link)
-        return UrlLinkPayload(
-            url=payload_data.get('url', ''),
-            title=payload_data.get('title', ''),
-            description=payload_data.get('description', ''),
-            thumbnailUrl=payload_data.get('thumbnailUrl', ''),
-        )
+        async def extract() -> UrlLinkPayload:
+            response = await self.puppet_stub.message_url(id=message_id)
+            # parse url_link data from response
+            payload_data = self.json_codec.loads(response.url_link)
+            return UrlLinkPayload(
+                url=payload_data.get('url', ''),
+                title=payload_data.get('title', ''),
+                description=payload_data.get('description', ''),
+                thumbnailUrl=payload_data.get('thumbnailUrl', ''),
+            )
+
+        return await self._message_extract('message_url', message_id, extract)
 
     async def message_mini_program(self, message_id: str) -> MiniProgramPayload:
         """
@@ -512,14 +1100,17 @@ class PuppetService(Puppet):
         if self.puppet_stub is None:
             raise Exception('puppet_stub should not be none')
 
-        response = await self.puppet_stub.message_mini_program(id=message_id)
-        response_dict = json.loads(response.mini_program)
-        try:
-            mini_program = MiniProgramPayload(**response_dict)
-        except Exception as e:
-            raise WechatyPuppetPayloadError(f'can"t init mini-program payload {response_dict}')\
-                from e
-        return mini_program
+        async def extract() -> MiniProgramPayload:
+            response = await self.puppet_stub.message_mini_program(id=message_id)
+            response_dict = self.json_codec.loads(response.mini_program)
+            try:
+                mini_program = MiniProgramPayload(**response_dict)
+            except Exception as e:
+                raise WechatyPuppetPayloadError(
+                    f'can"t init mini-program payload {response_dict}') from e
+            return mini_program
+
+        return await self._message_extract('message_mini_program', message_id, extract)
 
     async def contact_alias(self, contact_id: str, alias: Optional[str] = None
                             ) -> str:
@@ -531,6 +1122,9 @@ class PuppetService(Puppet):
         """
         response = await self.puppet_stub.contact_alias(
             id=contact_id, alias=alias)
+        if alias is not None:
+            self._invalidate_payload(PayloadType.PAYLOAD_TYPE_CONTACT, contact_id)
+            self.contact_search_index.update_field(contact_id, 'alias', alias)
         if response.alias is None and alias is None:
             raise WechatyPuppetGrpcError(f'can"t get contact<{contact_id}> alias')
         return response.alias
@@ -547,7 +1141,21 @@ class PuppetService(Puppet):
         :param contact_id:
         :return:
         """
-        response = await self.puppet_stub.contact_payload(id=contact_id)
+        payload = self.contact_payload_cache.get(contact_id)
+        if payload is not None:
+            return payload
+
+        fetch: Callable[[], Awaitable[ContactPayload]] = \
+            partial(self.puppet_stub.contact_payload, id=contact_id)
+        if self.contact_payload_batcher is not None:
+            fetch = partial(self.contact_payload_batcher.load, contact_id)
+
+        version = self.contact_payload_cache.version(contact_id)
+        response = await self.single_flight.do(('contact_payload', contact_id), fetch)
+        # the payload fetched before the invalidation is not saved
+        if self.contact_payload_cache.set(contact_id, response, version=version):
+            self.contact_search_index.update(contact_id, contact_search_fields(response))
+            self._persist_payload(PayloadType.PAYLOAD_TYPE_CONTACT, contact_id, response)
         return response
 
     async def contact_avatar(self, contact_id: str,
@@ -560,7 +1168,10 @@ class PuppetService(Puppet):
         """
         response = await self.puppet_stub.contact_avatar(
             id=contact_id, filebox=file_box)
-        return FileBox.from_json(response.filebox)
+        avatar = FileBox.from_json(self.json_codec.loads(response.filebox))
+        if file_box is None:
+            avatar = await self._cached_remote_file_box(avatar)
+        return avatar
 
     async def contact_tag_ids(self, contact_id: str) -> List[str]:
         """
@@ -626,7 +1237,7 @@ class PuppetService(Puppet):
         :return:
         """
         response = await self.puppet_stub.friendship_payload(
-            id=friendship_id, payload=json.dumps(payload)
+            id=friendship_id, payload=self.json_codec.dumps(payload)
         )
         return response
 
@@ -656,13 +1267,59 @@ class PuppetService(Puppet):
     async def room_search(self,
                           query: Optional[RoomQueryFilter] = None) -> List[str]:
         """
-        find the room_ids
-        search room
-        :param query:
-        :return:
-        """
-        room_list_response = await self.puppet_stub.room_list()
-        return room_list_response.ids
+        find the room_ids from the local index of topics, the index is built
+            at the first search
+
+        Args:
+            query (RoomQueryFilter, optional): the topic is matched exactly if it's
+                str, or searched if it's compiled regex pattern
+        Return:
+            the ids of matched rooms
+        """
+        if not self.room_search_index.complete:
+            await self._build_room_search_index()
+        index = self.room_search_index
+
+        if query is None:
+            return index.ids()
+
+        room_ids: Optional[List[str]] = None
+        if query.topic is not None:
+            if isinstance(query.topic, re.Pattern):
+                room_ids = index.regex(query.topic)
+            else:
+                room_ids = index.exact(query.topic)
+        if query.id is not None:
+            if room_ids is None:
+                room_ids = index.ids()
+            room_ids = [room_id for room_id in room_ids if room_id == query.id]
+
+        return index.ids() if room_ids is None else room_ids
+
+    async def _build_room_search_index(self) -> None:
+        """
+        index the topics of all rooms, only the rooms not indexed yet are fetched
+        """
+        room_ids = await self.room_list()
+        for room_id in set(self.room_search_index.ids()) - set(room_ids):
+            self.room_search_index.remove(room_id)
+
+        missing = [room_id for room_id in room_ids if room_id not in self.room_search_index]
+        versions = {room_id: self.room_payload_cache.version(room_id) for room_id in missing}
+        result = await self.room_payload_batch(missing)
+        # the cached payloads are returned without being indexed by room_payload(),
+        #   and the ones invalidated during the batch are fetched in the next search
+        stale = 0
+        for room_id, payload in result.results.items():
+            if self.room_payload_cache.version(room_id) == versions[room_id]:
+                self.room_search_index.update(room_id, payload.topic)
+            else:
+                stale += 1
+        if not result.ok or stale:
+            log.warning('can"t index the topics of <%s> rooms, retry in the next search',
+                        len(result.errors) + stale)
+            return
+        self.room_search_index.complete = True
 
     async def room_invitation_payload(self,
                                       room_invitation_id: str,
@@ -743,7 +1400,21 @@ class PuppetService(Puppet):
         :param room_id:
         :return:
         """
-        response = await self.puppet_stub.room_payload(id=room_id)
+        payload = self.room_payload_cache.get(room_id)
+        if payload is not None:
+            return payload
+
+        fetch: Callable[[], Awaitable[RoomPayload]] = \
+            partial(self.puppet_stub.room_payload, id=room_id)
+        if self.room_payload_batcher is not None:
+            fetch = partial(self.room_payload_batcher.load, room_id)
+
+        version = self.room_payload_cache.version(room_id)
+        response = await self.single_flight.do(('room_payload', room_id), fetch)
+        # the payload fetched before the invalidation, eg: room-topic, is not saved
+        if self.room_payload_cache.set(room_id, response, version=version):
+            self.room_search_index.update(room_id, response.topic)
+            self._persist_payload(PayloadType.PAYLOAD_TYPE_ROOM, room_id, response)
         return response
 
     async def room_members(self, room_id: str) -> List[str]:
@@ -752,9 +1423,54 @@ class PuppetService(Puppet):
         :param room_id:
         :return:
         """
-        response = await self.puppet_stub.room_member_list(id=room_id)
+        member_ids = self.room_member_index.members(room_id)
+        if member_ids is not None:
+            return member_ids
+
+        version = self.room_member_index.version(room_id)
+        response = await self.single_flight.do(
+            ('room_members', room_id),
+            partial(self.puppet_stub.room_member_list, id=room_id)
+        )
+        self.room_member_index.set_members(room_id, response.member_ids, version=version)
         return response.member_ids
 
+    async def contact_room_list(self, contact_id: str) -> List[str]:
+        """
+        get the ids of rooms which the contact is in from the local index. The members
+            of all rooms are indexed once, and then they are kept current by the
+            room-join/room-leave events
+
+        Args:
+            contact_id (str): the id of contact
+        Return:
+            the ids of rooms
+        """
+        if not self.room_member_index.complete:
+            await self._build_room_member_index()
+        return self.room_member_index.rooms(contact_id)
+
+    async def _build_room_member_index(self) -> None:
+        """
+        index the members of all rooms, only the rooms not indexed yet are fetched
+        """
+        index = self.room_member_index
+        generation = index.generation
+        room_ids = await self.room_list()
+        for room_id in set(index.room_ids()) - set(room_ids):
+            index.remove_room(room_id)
+
+        missing = [room_id for room_id in room_ids if not index.has_room(room_id)]
+        await gather_batch(missing, self.room_members)
+        # the member lists which are out of date or invalidated during the build are
+        #   fetched in the next call
+        unindexed = [room_id for room_id in room_ids if not index.has_room(room_id)]
+        if unindexed or index.generation != generation:
+            log.warning('can"t index the members of <%s> rooms, retry in the next call',
+                        len(unindexed))
+            return
+        index.complete = True
+
     async def room_add(self, room_id: str, contact_id: str) -> None:
         """
         add contact to room
@@ -763,6 +1479,7 @@ class PuppetService(Puppet):
         :return:
         """
         await self.puppet_stub.room_add(id=room_id, contact_id=contact_id)
+        self._invalidate_payload(PayloadType.PAYLOAD_TYPE_ROOM, room_id)
 
     async def room_delete(self, room_id: str, contact_id: str) -> None:
         """
@@ -772,6 +1489,8 @@ class PuppetService(Puppet):
         :return:
         """
         await self.puppet_stub.room_del(id=room_id, contact_id=contact_id)
+        self._invalidate_payload(PayloadType.PAYLOAD_TYPE_ROOM, room_id)
+        self.room_member_payload_cache.delete((room_id, contact_id))
 
     async def room_quit(self, room_id: str) -> None:
         """
@@ -789,6 +1508,7 @@ class PuppetService(Puppet):
         :return:
         """
         await self.puppet_stub.room_topic(id=room_id, topic=new_topic)
+        self._invalidate_payload(PayloadType.PAYLOAD_TYPE_ROOM, room_id)
 
     async def room_announce(self, room_id: str,
                             announcement: Optional[str] = None) -> str:
@@ -827,8 +1547,23 @@ class PuppetService(Puppet):
         :param contact_id:
         :return:
         """
-        member_payload = await self.puppet_stub.room_member_payload(
-            id=room_id, member_id=contact_id)
+        member_payload = self.room_member_payload_cache.get((room_id, contact_id))
+        if member_payload is not None:
+            return member_payload
+
+        fetch: Callable[[], Awaitable[RoomMemberPayload]] = partial(
+            self.puppet_stub.room_member_payload, id=room_id, member_id=contact_id)
+        if self.room_member_payload_batcher is not None:
+            fetch = partial(self.room_member_payload_batcher.load, (room_id, contact_id))
+
+        version = self.room_member_payload_cache.version((room_id, contact_id))
+        room_version = self.room_member_index.version(room_id)
+        member_payload = await self.single_flight.do(
+            ('room_member_payload', room_id, contact_id), fetch)
+        # the payload fetched before the members of room are changed is not saved
+        if self.room_member_index.version(room_id) == room_version:
+            self.room_member_payload_cache.set(
+                (room_id, contact_id), member_payload, version=version)
         return member_payload
 
     async def room_avatar(self, room_id: str) -> FileBox:
@@ -839,7 +1574,7 @@ class PuppetService(Puppet):
         """
         room_avatar_response = await self.puppet_stub.room_avatar(id=room_id)
 
-        file_box_data = json.loads(room_avatar_response.filebox)
+        file_box_data = self.json_codec.loads(room_avatar_response.filebox)
 
         if 'remoteUrl' not in file_box_data:
             raise WechatyPuppetPayloadError('invalid room avatar response')
@@ -848,67 +1583,327 @@ class PuppetService(Puppet):
             url=file_box_data['remoteUrl'],
             name=f'avatar-{room_id}.jpeg'
         )
-        return file_box
+        return await self._cached_remote_file_box(file_box)
 
     async def dirty_payload(self, payload_type: PayloadType, payload_id: str) -> None:
         """
         mark the payload dirty status, and remove it from the cache
         """
+        self._invalidate_payload(payload_type, payload_id)
+        if payload_type == PayloadType.PAYLOAD_TYPE_CONTACT:
+            # it's indexed again in the next search
+            self.contact_search_index.remove(payload_id)
+            self.contact_search_index.complete = False
         await self.puppet_stub.dirty_payload(
             type=payload_type.value,
             id=payload_id
         )
 
-    def _init_puppet(self) -> None:
+    def _invalidate_payload(self, payload_type: PayloadType, payload_id: str) -> None:
+        """
+        remove the payload from the local cache
+        """
+        if payload_type == PayloadType.PAYLOAD_TYPE_MESSAGE:
+            self.message_payload_cache.delete(payload_id)
+            self.single_flight.forget(('message_payload', payload_id))
+            return
+        if payload_type == PayloadType.PAYLOAD_TYPE_CONTACT:
+            self.contact_payload_cache.delete(payload_id)
+            self.single_flight.forget(('contact_payload', payload_id))
+        elif payload_type == PayloadType.PAYLOAD_TYPE_ROOM:
+            self.room_payload_cache.delete(payload_id)
+            self.single_flight.forget(('room_payload', payload_id))
+            self.single_flight.forget(('room_members', payload_id))
+        elif payload_type == PayloadType.PAYLOAD_TYPE_ROOM_MEMBER:
+            # the payload_id of room-member is the room_id
+            self.room_member_payload_cache.delete_if(lambda key: key[0] == payload_id)
+            self.room_member_index.remove_room(payload_id)
+            self.room_member_index.invalidate()
+            self.single_flight.forget(('room_members', payload_id))
+            return
+
+        if self.payload_store is not None:
+            self.payload_store.delete(payload_type.value, payload_id)
+
+    def _persist_payload(self, payload_type: PayloadType, payload_id: str,
+                         payload: Union[ContactPayload, RoomPayload]) -> None:
+        """
+        save the payload to the payload store in the background
+        """
+        if self.payload_store is not None:
+            self.payload_store.put(payload_type.value, payload_id, bytes(payload))
+
+    async def _load_payload_store(self) -> None:
+        """
+        warm up the payload caches from the payload store, so the payloads can be
+            served without the calls to the service at startup
+        """
+        if self.payload_store is None:
+            return
+
+        contacts = await self.payload_store.load(PayloadType.PAYLOAD_TYPE_CONTACT.value)
+        for contact_id, (data, _) in contacts.items():
+            contact_payload = ContactPayload().parse(data)
+            self.contact_payload_cache.set(contact_id, contact_payload)
+            self.contact_search_index.update(contact_id, contact_search_fields(contact_payload))
+
+        rooms = await self.payload_store.load(PayloadType.PAYLOAD_TYPE_ROOM.value)
+        for room_id, (data, _) in rooms.items():
+            room_payload = RoomPayload().parse(data)
+            self.room_payload_cache.set(room_id, room_payload)
+            self.room_search_index.update(room_id, room_payload.topic)
+
+        log.info('load <%s> contacts and <%s> rooms from payload store <%s>',
+                 len(contacts), len(rooms), self.payload_store.path)
+
+    async def reconcile_payload_store(self, concurrency: int = 16) -> None:
+        """
+        remove the contacts and rooms which are gone from the payload store, and
+            refresh the outdated ones
+        """
+        if self.payload_store is None:
+            return
+
+        await self._reconcile_payloads(self.payload_store,
+                                       PayloadType.PAYLOAD_TYPE_CONTACT,
+                                       await self.contact_list(),
+                                       self.contact_payload, concurrency)
+        await self._reconcile_payloads(self.payload_store,
+                                       PayloadType.PAYLOAD_TYPE_ROOM,
+                                       await self.room_list(),
+                                       self.room_payload, concurrency)
+
+    async def _reconcile_payloads(self, store: PayloadStore,
+                                  payload_type: PayloadType, ids: List[str],
+                                  fetch: Callable[[str], Awaitable[Any]],
+                                  concurrency: int) -> None:
+        records = await store.load(payload_type.value)
+        alive_ids = set(ids)
+        now = time.time()
+
+        removed_ids = [payload_id for payload_id in records if payload_id not in alive_ids]
+        for payload_id in removed_ids:
+            self._invalidate_payload(payload_type, payload_id)
+
+        outdated_ids = [
+            payload_id for payload_id, (_, updated_at) in records.items()
+            if payload_id in alive_ids and now - updated_at > PAYLOAD_STORE_MAX_AGE
+        ]
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def refresh(payload_id: str) -> None:
+            async with semaphore:
+                self._invalidate_payload(payload_type, payload_id)
+                await fetch(payload_id)
+
+        await asyncio.gather(*[refresh(payload_id) for payload_id in outdated_ids])
+        log.info('reconcile <%s> payload store: <%s> removed, <%s> refreshed',
+                 payload_type.name, len(removed_ids), len(outdated_ids))
+
+    def enable_micro_batch(self, window: float, concurrency: int = BATCH_CONCURRENCY) -> None:
+        """
+        collect the contact/room/room-member payload lookups issued within the window
+            into one batch, which is sent out with at most `concurrency` in-flight calls
+
+        Args:
+            window (float): seconds to wait for more lookups after the first one
+            concurrency (int): the max count of in-flight calls of one batch
         """
-        start puppet channel contact_self_qr_code
+        self.contact_payload_batcher = MicroBatcher(
+            lambda contact_id: self.puppet_stub.contact_payload(id=contact_id),
+            window=window, concurrency=concurrency)
+        self.room_payload_batcher = MicroBatcher(
+            lambda room_id: self.puppet_stub.room_payload(id=room_id),
+            window=window, concurrency=concurrency)
+        self.room_member_payload_batcher = MicroBatcher(
+            lambda key: self.puppet_stub.room_member_payload(id=key[0], member_id=key[1]),
+            window=window, concurrency=concurrency)
+
+    async def contact_payload_batch(self, contact_ids: List[str],
+                                    concurrency: int = BATCH_CONCURRENCY
+                                    ) -> BatchResult[str, ContactPayload]:
         """
-        log.info('init puppet ...')
+        get the payloads of contacts with at most `concurrency` in-flight calls,
+            the cached ones are served locally
 
-        # 1. if there is no endpoint, it should fetch it from chatie server with token
-        if not self.options.end_point:
+        Return:
+            the payloads and the errors keyed by contact_id
+        """
+        return await gather_batch(contact_ids, self.contact_payload, concurrency)
 
-            url = f'https://api.chatie.io/v0/hosties/{self.options.token}'
-            log.info('fetching endpoint from chatie-server: %s', url)
-            response = requests.get(url)
+    async def room_payload_batch(self, room_ids: List[str],
+                                 concurrency: int = BATCH_CONCURRENCY
+                                 ) -> BatchResult[str, RoomPayload]:
+        """
+        get the payloads of rooms with at most `concurrency` in-flight calls,
+            the cached ones are served locally
 
-            if response.status_code != 200:
-                raise WechatyPuppetGrpcError(
-                    'can"t fetch endpoint from chatie server. '
-                    'You can try it later, or make sure that your pc can connect to heroku server '
-                )
+        Return:
+            the payloads and the errors keyed by room_id
+        """
+        return await gather_batch(room_ids, self.room_payload, concurrency)
 
-            data = response.json()
+    async def room_member_payload_batch(self, room_id: str, contact_ids: List[str],
+                                        concurrency: int = BATCH_CONCURRENCY
+                                        ) -> BatchResult[str, RoomMemberPayload]:
+        """
+        get the payloads of room members with at most `concurrency` in-flight calls,
+            the cached ones are served locally
 
-            if 'ip' not in data or data['ip'] == '0.0.0.0':
-                raise WechatyPuppetGrpcError(
-                    'Your service token has no available endpoint, is your token correct?'
-                )
-            if 'port' not in data:
-                raise WechatyPuppetGrpcError("can't find service server port")
+        Return:
+            the payloads and the errors keyed by contact_id
+        """
+        return await gather_batch(
+            contact_ids, partial(self.room_member_payload, room_id), concurrency)
 
-            self.options.end_point = f'{data["ip"]}:{data["port"]}'
-            log.debug('endpoint from chatie-server : <%s>', self.options.end_point)
+    async def prefetch(self, concurrency: int = PREFETCH_CONCURRENCY,
+                       room_members: bool = True,
+                       on_progress: Optional[Callable[[PrefetchProgress], None]] = None
+                       ) -> PrefetchProgress:
+        """
+        preload the payloads of all contacts, rooms and room members into the caches,
+            so that the first access of them is not a call to the service.
+            It's cancelled when the account is logged out, and then
+            asyncio.CancelledError is raised.
 
-        if ping_endpoint(self.options.end_point) is False:
+        Args:
+            concurrency (int): the max count of in-flight calls
+            room_members (bool): whether to preload the room member payloads
+            on_progress (Callable, optional): called with the progress periodically
+
+        Return:
+            the final progress with the throughput
+        """
+        task = asyncio.ensure_future(self._prefetch(concurrency, room_members, on_progress))
+        self._prefetch_tasks.add(task)
+        try:
+            return await task
+        finally:
+            self._prefetch_tasks.discard(task)
+
+    async def _prefetch(self, concurrency: int, room_members: bool,
+                        on_progress: Optional[Callable[[PrefetchProgress], None]]
+                        ) -> PrefetchProgress:
+        progress = PrefetchProgress()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(func: Callable[..., Awaitable[Any]], *args: str) -> Any:
+            result = None
+            async with semaphore:
+                try:
+                    result = await func(*args)
+                    progress.fetched += 1
+                except (WechatyPuppetError, GRPCError, StreamTerminatedError, OSError) as e:
+                    progress.failed += 1
+                    log.debug('prefetch %s%s failed: %s', func.__name__, args, e)
+
+            if progress.done % PREFETCH_REPORT_INTERVAL == 0:
+                log.info('prefetching: %s', progress)
+                if on_progress is not None:
+                    on_progress(progress)
+            return result
+
+        log.info('prefetching the payloads of contacts and rooms ...')
+        contact_ids, room_ids = await asyncio.gather(self.contact_list(), self.room_list())
+        progress.contacts, progress.rooms = len(contact_ids), len(room_ids)
+
+        await asyncio.gather(
+            *[fetch(self.contact_payload, contact_id) for contact_id in contact_ids],
+            *[fetch(self.room_payload, room_id) for room_id in room_ids],
+        )
+
+        if room_members:
+            progress.member_lists = len(room_ids)
+            member_lists = await asyncio.gather(
+                *[fetch(self.room_members, room_id) for room_id in room_ids])
+            member_ids = [
+                (room_id, member_id)
+                for room_id, members in zip(room_ids, member_lists)
+                for member_id in members or []
+            ]
+            progress.room_members = len(member_ids)
+            await asyncio.gather(*[
+                fetch(self.room_member_payload, room_id, member_id)
+                for room_id, member_id in member_ids
+            ])
+
+        progress.finished_at = time.monotonic()
+        log.info('prefetch finished: %s', progress)
+        if on_progress is not None:
+            on_progress(progress)
+        return progress
+
+    def _reset_account_state(self) -> None:
+        """
+        cancel the background tasks and drop the indexes which depend on the
+            logged-in account
+        """
+        for task in (*self._prefetch_tasks, self._prefetch_task, self._reconcile_task):
+            if task is not None and not task.done():
+                task.cancel()
+        self._prefetch_task = None
+        self._reconcile_task = None
+        self.room_member_index.clear()
+        self.room_search_index.clear()
+        self.contact_search_index.clear()
+        self.message_store.clear()
+
+    async def _reconcile_payload_store(self) -> None:
+        try:
+            await self.reconcile_payload_store()
+        # pylint: disable=W0703
+        except Exception as e:
+            log.warning('reconcile payload store failed: %s', e)
+
+    async def _init_puppet(self) -> None:
+        """
+        start puppet channel contact_self_qr_code
+        """
+        log.info('init puppet ...')
+
+        # 1. if there is no endpoint, it should resolve it from chatie server with token
+        if not self.options.end_point:
+            if self._endpoint_resolver is None:
+                self._endpoint_resolver = EndpointResolver(token=self.options.token)
+
+            end_point = await self._endpoint_resolver.resolve()
+
+            # the cached endpoint can be out of date, so fetch the latest one
+            if await probe_endpoint(end_point) is None:
+                log.warning('endpoint <%s> is unreachable, fetching the latest one', end_point)
+                await self._endpoint_resolver.invalidate()
+                end_point = await self._endpoint_resolver.fetch()
+        else:
+            end_point = self.options.end_point
+
+        # 2. there can be multi services for the same account: <endpoint>,<endpoint>
+        end_points = split_endpoints(end_point)
+        # the start doesn't wait for the timeout of the unreachable endpoints
+        healthy = await probe_endpoints(end_points)
+        if healthy is None:
             raise WechatyPuppetConfigurationError(
-                f"can't not ping endpoint: {self.options.end_point}"
+                f"can't not ping endpoint: {end_point}"
             )
+        healthy_end_point, latency = healthy
+        log.debug('endpoint <%s> is reachable in %.1fms', healthy_end_point, latency * 1000)
 
-        host, port = extract_host_and_port(self.options.end_point)
-        self.channel = Channel(host=host, port=port)
-
-        # pylint: disable=W0212
-        self.channel._authority = self.options.token
+        # the first reachable one holds the event stream, and the others which didn't
+        #   answer the probe in time are re-admitted once their health checks pass
+        end_points.remove(healthy_end_point)
+        self._channel_pool = ChannelPool([healthy_end_point, *end_points],
+                                         token=self.options.token,
+                                         health_check=probe_endpoint)
+        for unchecked_end_point in end_points:
+            self._channel_pool.eject(unchecked_end_point, ejection_time=0)
 
-        self._puppet_stub = PuppetStub(self.channel)
+        self._puppet_stub = cast(PuppetStub, PooledPuppetStub(self._channel_pool))
 
     async def start(self) -> None:
         """
         start puppet_stub
         :return:
         """
-        self._init_puppet()
+        await self._init_puppet()
 
         log.info('starting the puppet ...')
 
@@ -918,6 +1913,9 @@ class PuppetService(Puppet):
             await self.puppet_stub.start()
 
         log.info('puppet has started ...')
+        await self._load_payload_store()
+        if self._liveness_probe_enabled:
+            self.liveness_monitor.start()
         await self._listen_for_event()
         return None
 
@@ -926,13 +1924,31 @@ class PuppetService(Puppet):
         stop the grpc channel connection
         """
         log.info('stop()')
+        self.liveness_monitor.stop()
+        self._reset_account_state()
+        if self._event_queue_task is not None:
+            self._event_queue_task.cancel()
+            self._event_queue_task = None
+        if self.event_queue is not None:
+            await self.event_queue.close()
+        if self.event_dispatcher is not None:
+            await self.event_dispatcher.stop()
+        for subscription in self._subscriptions:
+            subscription.close()
+        self.stop_recording()
+        if self.message_enricher is not None:
+            self.message_enricher.stop()
+        if self.payload_store is not None:
+            await self.payload_store.close()
+        if self.message_store.spill is not None:
+            await self.message_store.spill.close()
         self._event_stream.remove_all_listeners()
         if self._puppet_stub is not None:
             await self._puppet_stub.stop()
             self._puppet_stub = None
-        if self.channel:
-            self.channel.close()
-            self.channel = None
+        if self._channel_pool is not None:
+            self._channel_pool.close()
+            self._channel_pool = None
 
     async def logout(self) -> None:
         """
@@ -950,6 +1966,7 @@ class PuppetService(Puppet):
             log.error('logout() rejection %s', exception)
         finally:
             payload = EventLogoutPayload(contact_id=self.login_user_id, data='logout')
+            self._reset_account_state()
             self._event_stream.emit('logout', payload)
             self.login_user_id = None
 
@@ -972,121 +1989,185 @@ class PuppetService(Puppet):
 
         await self.puppet_stub.ding(data=data)
 
-    # pylint: disable=R0912,R0915
     async def _listen_for_event(self) -> None:
         """
-        listen event from service server with heartbeat
+        listen event from service server with heartbeat, the event stream will be
+            reconnected with backoff when it's broken or stalled, and the listeners
+            are kept during the reconnection.
         """
         # listen event from grpclib
         log.info('listening the event from the puppet ...')
 
-        async for response in self.puppet_stub.event():
-            if response is not None:
-                payload_data: dict = json.loads(response.payload)
-                if response.type == int(EventType.EVENT_TYPE_SCAN):
-                    log.debug('receive scan info <%s>', payload_data)
-                    # create qr_code
-                    payload = EventScanPayload(
-                        status=ScanStatus(payload_data['status']),
-                        qrcode=payload_data.get('qrcode', None),
-                        data=payload_data.get('data', None)
-                    )
-                    self._event_stream.emit('scan', payload)
-
-                elif response.type == int(EventType.EVENT_TYPE_DONG):
-                    log.debug('receive dong info <%s>', payload_data)
-                    payload = EventDongPayload(**payload_data)
-                    self._event_stream.emit('dong', payload)
-
-                elif response.type == int(EventType.EVENT_TYPE_MESSAGE):
-                    # payload = get_message_payload_from_response(response)
-                    log.debug('receive message info <%s>', payload_data)
-                    event_message_payload = EventMessagePayload(
-                        message_id=payload_data['messageId'])
-                    self._event_stream.emit('message', event_message_payload)
-
-                elif response.type == int(EventType.EVENT_TYPE_HEARTBEAT):
-                    log.debug('receive heartbeat info <%s>', payload_data)
-                    # Huan(202005) FIXME:
-                    #   https://github.com/wechaty/python-wechaty-puppet/issues/6
-                    #   Workaround for unexpected server json payload key: timeout
-                    # if 'timeout' in payload_data:
-                    #     del payload_data['timeout']
-                    payload_data = {'data': payload_data['data']}
-                    payload = EventHeartbeatPayload(**payload_data)
-                    self._event_stream.emit('heartbeat', payload)
-
-                elif response.type == int(EventType.EVENT_TYPE_ERROR):
-                    log.info('receive error info <%s>', payload_data)
-                    payload = EventErrorPayload(**payload_data)
-                    self._event_stream.emit('error', payload)
-
-                elif response.type == int(EventType.EVENT_TYPE_FRIENDSHIP):
-                    log.debug('receive friendship info <%s>', payload_data)
-                    payload = EventFriendshipPayload(
-                        friendship_id=payload_data.get('friendshipId')
-                    )
-                    self._event_stream.emit('friendship', payload)
-
-                elif response.type == int(EventType.EVENT_TYPE_ROOM_JOIN):
-                    log.debug('receive room-join info <%s>', payload_data)
-                    payload = EventRoomJoinPayload(
-                        invited_ids=payload_data.get('inviteeIdList', []),
-                        inviter_id=payload_data.get('inviterId'),
-                        room_id=payload_data.get('roomId'),
-                        timestamp=payload_data.get('timestamp')
+        self._start_event_queue()
+
+        backoff = self.event_stream_backoff
+        backoff.reset()
+        while self._puppet_stub is not None:
+            # the pool is closed and dropped by stop() while the stream is open
+            pool = self.channel_pool
+            member = pool.primary
+            stalled = False
+            try:
+                await self._consume_event_stream(member, backoff)
+                error = 'event stream is closed by the service'
+            except asyncio.TimeoutError as e:
+                stalled = True
+                error = f'there is no heartbeat in {self.event_stream_stall_timeout}s'
+                pool.record(member, e)
+            except (GRPCError, StreamTerminatedError, OSError) as e:
+                error = f'event stream is broken: {e!r}'
+                pool.record(member, e)
+
+            if self._puppet_stub is None:
+                break
+
+            self.event_stream_metrics.on_disconnected(error, stalled=stalled)
+            delay = backoff.next_delay()
+            log.warning('%s, reconnecting to <%s> in %.1fs ...',
+                        error, pool.primary.end_point, delay)
+            await asyncio.sleep(delay)
+
+    async def _consume_event_stream(self, member: PoolMember,
+                                    backoff: ExponentialBackoff) -> None:
+        """
+        read the event stream until it's closed, raise asyncio.TimeoutError if it's stalled
+        """
+        # the builtin aiter() and anext() are not available before python 3.10
+        stream = member.stub.event().__aiter__()  # pylint: disable=C2801
+        try:
+            while True:
+                try:
+                    response = await asyncio.wait_for(
+                        stream.__anext__(),  # pylint: disable=C2801
+                        timeout=self.event_stream_stall_timeout
                     )
-                    self._event_stream.emit('room-join', payload)
+                except StopAsyncIteration:
+                    return
+
+                if not self.event_stream_metrics.connected:
+                    log.info('event stream is connected to <%s>', member.end_point)
+                    self.event_stream_metrics.on_connected()
+                    backoff.reset()
+
+                if response is None:
+                    continue
+                if self.event_recorder is not None:
+                    self.event_recorder.record(response)
+                await self._receive_event(response)
+        finally:
+            await stream.aclose()
 
-                elif response.type == int(EventType.EVENT_TYPE_ROOM_INVITE):
-                    log.debug('receive room-invite info <%s>', payload_data)
-                    payload = EventRoomInvitePayload(
-                        room_invitation_id=payload_data.get(
-                            'roomInvitationId', None)
-                    )
-                    self._event_stream.emit('room-invite', payload)
-
-                elif response.type == int(EventType.EVENT_TYPE_ROOM_LEAVE):
-                    log.debug('receive room-leave info <%s>', payload_data)
-                    payload = EventRoomLeavePayload(
-                        removed_ids=payload_data.get('removeeIdList', []),
-                        remover_id=payload_data.get('removerId'),
-                        room_id=payload_data.get('roomId'),
-                        timestamp=payload_data.get('timestamp')
-                    )
-                    self._event_stream.emit('room-leave', payload)
-
-                elif response.type == int(EventType.EVENT_TYPE_ROOM_TOPIC):
-                    log.debug('receive room-topic info <%s>', payload_data)
-                    payload = EventRoomTopicPayload(
-                        changer_id=payload_data.get('changerId'),
-                        new_topic=payload_data.get('newTopic'),
-                        old_topic=payload_data.get('oldTopic'),
-                        room_id=payload_data.get('roomId'),
-                        timestamp=payload_data.get('timestamp')
-                    )
-                    self._event_stream.emit('room-topic', payload)
-
-                elif response.type == int(EventType.EVENT_TYPE_READY):
-                    log.debug('receive ready info <%s>', payload_data)
-                    payload = EventReadyPayload(**payload_data)
-                    self._event_stream.emit('ready', payload)
-
-                elif response.type == int(EventType.EVENT_TYPE_LOGIN):
-                    log.debug('receive login info <%s>', payload_data)
-                    event_login_payload = EventLoginPayload(
-                        contact_id=payload_data['contactId'])
-                    self.login_user_id = payload_data.get('contactId', None)
-                    self._event_stream.emit('login', event_login_payload)
-
-                elif response.type == int(EventType.EVENT_TYPE_LOGOUT):
-                    log.debug('receive logout info <%s>', payload_data)
-                    payload = EventLogoutPayload(
-                        contact_id=payload_data['contactId'],
-                        data=payload_data.get('data', None)
-                    )
-                    self.login_user_id = None
-                    self._event_stream.emit('logout', payload)
+    def register_event_decoder(self, event_type: int, name: str,
+                               decoder: EventDecoder) -> None:
+        """
+        register the decoder of event type, which replaces the builtin one or
+            supports a new event type. The decoded payload is emitted with the name.
+
+        The internal handling of the builtin event is kept, so the decoder of a builtin
+            event type should return the same type of payload.
 
-                elif response.type == int(EventType.EVENT_TYPE_UNSPECIFIED):
-                    pass
+        Args:
+            event_type (int): the value of EventType
+            name (str): the event name which the listeners listen on
+            decoder (Callable): decode the json data of event into the payload
+        """
+        route = self._event_routes.get(event_type, None)
+        hook = route.hook if route is not None else None
+        self._event_routes[event_type] = EventRoute(name=name, decode=decoder, hook=hook)
+
+    def _on_event_response(self, response: EventResponse) -> None:
+        """
+        decode the event response and emit it to the listeners, the decoding is
+            skipped if there is no listener, consumer of events() or internal hook
+        """
+        route = self._event_routes.get(response.type, None)
+        if route is None:
+            return
+
+        if route.hook is None and not self._has_consumers(route.name):
+            return
+
+        payload_data: dict = self.json_codec.loads(response.payload)
+        log.debug('receive %s info <%s>', route.name, payload_data)
+        if self.event_deduplicator is not None and \
+                self.event_deduplicator.is_duplicate(response.type, payload_data):
+            return
+        payload = route.decode(payload_data)
+
+        if route.hook is not None and not route.hook(payload):
+            return
+        self._emit_event(route.name, payload)
+
+    def _has_consumers(self, name: str) -> bool:
+        """whether there are listeners or consumers of events() of the event"""
+        return bool(self._event_stream.listeners(name)) or \
+            any(subscription.wants(name) for subscription in self._subscriptions)
+
+    def _emit_event(self, name: str, payload: Any) -> None:
+        """emit the decoded event to the consumers of events() and the listeners"""
+        for subscription in self._subscriptions:
+            if subscription.wants(name):
+                subscription.put(name, payload)
+        if not self._event_stream.listeners(name):
+            return
+        if self.event_dispatcher is not None:
+            self.event_dispatcher.dispatch(name, payload)
+        else:
+            self._event_stream.emit(name, payload)
+
+    def _on_dong_event(self, payload: EventDongPayload) -> bool:
+        # the dong of liveness probe is not emitted to the listeners
+        return not self.liveness_monitor.on_dong(payload.data)
+
+    def _on_message_event(self, payload: EventMessagePayload) -> bool:
+        self.message_store.add(payload.message_id)
+        if self.message_enricher is not None and \
+                self._has_consumers(ENRICHED_MESSAGE_EVENT):
+            self.message_enricher.enrich(payload.message_id)
+        return True
+
+    def _on_error_event(self, payload: EventErrorPayload) -> bool:
+        log.info('receive error info <%s>', payload)
+        return True
+
+    def _on_room_join_event(self, payload: EventRoomJoinPayload) -> bool:
+        self._invalidate_payload(PayloadType.PAYLOAD_TYPE_ROOM, payload.room_id)
+        self.room_member_index.add_members(payload.room_id, payload.invited_ids)
+        if payload.room_id not in self.room_search_index:
+            # a new room, it's indexed in the next search
+            self.room_search_index.complete = False
+        return True
+
+    def _on_room_leave_event(self, payload: EventRoomLeavePayload) -> bool:
+        self._invalidate_payload(PayloadType.PAYLOAD_TYPE_ROOM, payload.room_id)
+        for contact_id in payload.removed_ids:
+            self.room_member_payload_cache.delete((payload.room_id, contact_id))
+        if self.login_user_id in payload.removed_ids:
+            self.room_member_index.remove_room(payload.room_id)
+            self.room_search_index.remove(payload.room_id)
+        else:
+            self.room_member_index.remove_members(payload.room_id, payload.removed_ids)
+        return True
+
+    def _on_room_topic_event(self, payload: EventRoomTopicPayload) -> bool:
+        self._invalidate_payload(PayloadType.PAYLOAD_TYPE_ROOM, payload.room_id)
+        self.room_search_index.update(payload.room_id, payload.new_topic)
+        return True
+
+    def _on_ready_event(self, _: EventReadyPayload) -> bool:
+        if self.payload_store is not None and (
+                self._reconcile_task is None or self._reconcile_task.done()):
+            self._reconcile_task = asyncio.ensure_future(self._reconcile_payload_store())
+        if self.prefetch_on_ready and (
+                self._prefetch_task is None or self._prefetch_task.done()):
+            self._prefetch_task = asyncio.ensure_future(self.prefetch())
+        return True
+
+    def _on_login_event(self, payload: EventLoginPayload) -> bool:
+        self.login_user_id = payload.contact_id
+        return True
+
+    def _on_logout_event(self, _: EventLogoutPayload) -> bool:
+        self.login_user_id = None
+        self._reset_account_state()
+        return True
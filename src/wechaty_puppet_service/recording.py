@@ -0,0 +1,133 @@
+"""
+Python Wechaty - https://github.com/wechaty/python-wechaty
+
+Authors:    Huan LI (李卓桓) <https://github.com/huan>
+            Jingjing WU (吴京京) <https://github.com/wj-Mcat>
+
+2020-now @ Copyright Wechaty
+
+Licensed under the Apache License, Version 2.0 (the 'License');
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an 'AS IS' BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import struct
+import time
+from typing import Awaitable, BinaryIO, Callable, Iterator, Optional, Tuple
+
+from wechaty_grpc.wechaty.puppet import EventResponse
+from wechaty_puppet import get_logger
+from wechaty_puppet.exceptions import WechatyPuppetError
+
+log = get_logger('EventRecording')
+
+RECORDING_MAGIC = b'WPSEVT1\n'
+# the unix timestamp(float64) and the length(uint32) of the serialized EventResponse
+_RECORD_HEADER = struct.Struct('<dI')
+
+
+class EventRecorder:
+    """
+    append the raw event responses to the recording file, each record is the
+        receiving timestamp, the length and the protobuf bytes of EventResponse
+    """
+
+    def __init__(self, path: str, clock: Callable[[], float] = time.time):
+        """
+        Args:
+            path (str): the path of recording file, the new records are appended
+            clock (Callable): the clock of the timestamps in seconds
+        """
+        self.path = path
+        self._clock = clock
+        self.count: int = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file: Optional[BinaryIO] = open(path, 'ab')  # pylint: disable=R1732
+        if self._file.tell() == 0:
+            self._file.write(RECORDING_MAGIC)
+
+    def record(self, response: EventResponse) -> None:
+        """append the event response, the writing is buffered"""
+        if self._file is None:
+            return
+        data = bytes(response)
+        self._file.write(_RECORD_HEADER.pack(self._clock(), len(data)))
+        self._file.write(data)
+        self.count += 1
+
+    def flush(self) -> None:
+        """write the buffered records to the file"""
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self) -> None:
+        """flush and close the recording file"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_recording(path: str) -> Iterator[Tuple[float, EventResponse]]:
+    """
+    read the records of the recording file in order, the truncated last record is
+        ignored
+
+    Return:
+        the receiving timestamp and the event response
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(RECORDING_MAGIC)) != RECORDING_MAGIC:
+            raise WechatyPuppetError(f'<{path}> is not an event recording file')
+        while True:
+            header = f.read(_RECORD_HEADER.size)
+            if len(header) < _RECORD_HEADER.size:
+                return
+            timestamp, length = _RECORD_HEADER.unpack(header)
+            data = f.read(length)
+            if len(data) < length:
+                log.warning('the last record of <%s> is truncated', path)
+                return
+            yield timestamp, EventResponse().parse(data)
+
+
+async def replay_recording(path: str, receive: Callable[[EventResponse], Awaitable[None]],
+                           speed: Optional[float] = 1.0) -> int:
+    """
+    feed the recorded event responses in the recorded pace
+
+    Args:
+        path (str): the path of recording file
+        receive (Callable): handle the event response
+        speed (float, optional): 1 is real time, 2 is twice as fast, None or 0 is as
+            fast as possible
+
+    Return:
+        the count of replayed events
+    """
+    loop = asyncio.get_event_loop()
+    start: Optional[Tuple[float, float]] = None
+    count = 0
+    for timestamp, response in read_recording(path):
+        if speed:
+            if start is None:
+                start = (timestamp, loop.time())
+            delay = start[1] + (timestamp - start[0]) / speed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        await receive(response)
+        count += 1
+    return count
@@ -0,0 +1,277 @@
+"""
+Python Wechaty - https://github.com/wechaty/python-wechaty
+
+Authors:    Huan LI (李卓桓) <https://github.com/huan>
+            Jingjing WU (吴京京) <https://github.com/wj-Mcat>
+
+2020-now @ Copyright Wechaty
+
+Licensed under the Apache License, Version 2.0 (the 'License');
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an 'AS IS' BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from __future__ import annotations
+
+import bisect
+import re
+from typing import Dict, Iterable, List, Optional, Pattern, Set, Tuple, Union
+
+from wechaty_puppet import ContactPayload
+
+
+class RoomSearchIndex:
+    """
+    local index of the room topics, which supports exact, prefix, substring and
+        regex matching without calling the service
+    """
+
+    def __init__(self) -> None:
+        self._topics: Dict[str, str] = {}
+        self._rooms: Dict[str, Set[str]] = {}
+        # the distinct topics in order, for the prefix matching
+        self._sorted_topics: List[str] = []
+
+        # whether all of the rooms of the account are indexed
+        self.complete: bool = False
+
+    def update(self, room_id: str, topic: str) -> None:
+        """index the room with its latest topic"""
+        old_topic = self._topics.get(room_id, None)
+        if old_topic == topic:
+            return
+        if old_topic is not None:
+            self._unlink(room_id, old_topic)
+
+        self._topics[room_id] = topic
+        rooms = self._rooms.get(topic, None)
+        if rooms is None:
+            rooms = self._rooms[topic] = set()
+            bisect.insort(self._sorted_topics, topic)
+        rooms.add(room_id)
+
+    def remove(self, room_id: str) -> None:
+        """drop the room from the index"""
+        topic = self._topics.pop(room_id, None)
+        if topic is not None:
+            self._unlink(room_id, topic)
+
+    def _unlink(self, room_id: str, topic: str) -> None:
+        rooms = self._rooms[topic]
+        rooms.discard(room_id)
+        if not rooms:
+            del self._rooms[topic]
+            del self._sorted_topics[bisect.bisect_left(self._sorted_topics, topic)]
+
+    def _collect(self, topics: Iterable[str]) -> List[str]:
+        return [room_id for topic in topics for room_id in self._rooms[topic]]
+
+    def topic(self, room_id: str) -> Optional[str]:
+        """the indexed topic of the room"""
+        return self._topics.get(room_id, None)
+
+    def exact(self, topic: str) -> List[str]:
+        """the rooms whose topic is exactly the same"""
+        return list(self._rooms.get(topic, ()))
+
+    def prefix(self, prefix: str) -> List[str]:
+        """the rooms whose topic starts with the prefix"""
+        start = bisect.bisect_left(self._sorted_topics, prefix)
+        topics = []
+        for topic in self._sorted_topics[start:]:
+            if not topic.startswith(prefix):
+                break
+            topics.append(topic)
+        return self._collect(topics)
+
+    def contains(self, text: str) -> List[str]:
+        """the rooms whose topic contains the text"""
+        return self._collect(topic for topic in self._sorted_topics if text in topic)
+
+    def regex(self, pattern: Union[str, Pattern]) -> List[str]:
+        """the rooms whose topic matches the regex"""
+        compiled = re.compile(pattern)
+        return self._collect(
+            topic for topic in self._sorted_topics if compiled.search(topic))
+
+    def ids(self) -> List[str]:
+        """all of the indexed rooms"""
+        return list(self._topics)
+
+    def clear(self) -> None:
+        """drop all of the rooms"""
+        self._topics.clear()
+        self._rooms.clear()
+        self._sorted_topics.clear()
+        self.complete = False
+
+    def __contains__(self, room_id: str) -> bool:
+        return room_id in self._topics
+
+    def __len__(self) -> int:
+        return len(self._topics)
+
+
+# the fields of contact payload which are indexed for the full text search
+CONTACT_SEARCH_FIELDS = ('name', 'alias', 'weixin', 'corporation', 'title', 'phone')
+# the fields of contact payload which can be matched exactly by ContactQueryFilter
+CONTACT_FILTER_FIELDS = ('name', 'alias', 'weixin')
+
+# the size of the grams, the shorter query is matched by the substrings of the grams
+NGRAM_SIZE = 2
+
+
+def ngrams(text: str, size: int = NGRAM_SIZE) -> Set[str]:
+    """
+    split the text into the grams of `size` characters, which works for the CJK
+        text without the word boundary as well as the latin text
+    """
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def _short_substrings(gram: str) -> Set[str]:
+    """the substrings of the gram which are shorter than it"""
+    return {gram[start:start + size] for size in range(1, len(gram))
+            for start in range(len(gram) - size + 1)}
+
+
+def _normalize(text: str) -> str:
+    return text.casefold()
+
+
+def contact_search_fields(payload: ContactPayload) -> Dict[str, str]:
+    """get the indexed fields from the contact payload"""
+    fields = {key: getattr(payload, key) or '' for key in CONTACT_SEARCH_FIELDS}
+    fields['phone'] = ' '.join(payload.phone or [])
+    return fields
+
+
+class ContactSearchIndex:
+    """
+    local index of the contacts over name, alias, weixin and the other text fields,
+        which supports the full text search with n-grams and the exact matching
+        of the fields without calling the service
+    """
+
+    def __init__(self) -> None:
+        # contact_id -> field -> value
+        self._fields: Dict[str, Dict[str, str]] = {}
+        # contact_id -> the normalized values of the searched fields
+        self._texts: Dict[str, List[str]] = {}
+        # gram -> contact_ids
+        self._grams: Dict[str, Set[str]] = {}
+        # gram substring -> grams, for the query shorter than the gram
+        self._short_grams: Dict[str, Set[str]] = {}
+        # (field, value) -> contact_ids
+        self._values: Dict[Tuple[str, str], Set[str]] = {}
+
+        # whether all of the contacts of the account are indexed
+        self.complete: bool = False
+
+    def update(self, contact_id: str, fields: Dict[str, str]) -> None:
+        """index the contact with its latest fields"""
+        self.remove(contact_id)
+
+        fields = {key: value for key, value in fields.items() if value}
+        self._fields[contact_id] = fields
+        for field_name in CONTACT_FILTER_FIELDS:
+            if field_name in fields:
+                self._values.setdefault((field_name, fields[field_name]), set()).add(contact_id)
+
+        texts = [_normalize(fields[key]) for key in CONTACT_SEARCH_FIELDS if key in fields]
+        self._texts[contact_id] = texts
+        for gram in set().union(*[ngrams(text) for text in texts]):
+            contact_ids = self._grams.get(gram, None)
+            if contact_ids is None:
+                contact_ids = self._grams[gram] = set()
+                for substring in _short_substrings(gram):
+                    self._short_grams.setdefault(substring, set()).add(gram)
+            contact_ids.add(contact_id)
+
+    def update_field(self, contact_id: str, field_name: str, value: str) -> None:
+        """change one field of the indexed contact"""
+        fields = self._fields.get(contact_id, None)
+        if fields is None:
+            return
+        self.update(contact_id, dict(fields, **{field_name: value}))
+
+    def remove(self, contact_id: str) -> None:
+        """drop the contact from the index"""
+        fields = self._fields.pop(contact_id, None)
+        if fields is None:
+            return
+
+        for field_name in CONTACT_FILTER_FIELDS:
+            if field_name in fields:
+                key = (field_name, fields[field_name])
+                self._values[key].discard(contact_id)
+                if not self._values[key]:
+                    del self._values[key]
+
+        texts = self._texts.pop(contact_id)
+        for gram in set().union(*[ngrams(text) for text in texts]):
+            contact_ids = self._grams[gram]
+            contact_ids.discard(contact_id)
+            if not contact_ids:
+                del self._grams[gram]
+                for substring in _short_substrings(gram):
+                    short_grams = self._short_grams[substring]
+                    short_grams.discard(gram)
+                    if not short_grams:
+                        del self._short_grams[substring]
+
+    def search(self, text: str) -> List[str]:
+        """the contacts which contain the text in any of the searched fields"""
+        query = _normalize(text)
+        if not query:
+            return self.ids()
+
+        if len(query) < NGRAM_SIZE:
+            return list(set().union(*[
+                self._grams[gram] for gram in self._short_grams.get(query, ())
+            ], self._grams.get(query, set())))
+
+        postings = sorted(
+            (self._grams.get(gram, set()) for gram in ngrams(query)), key=len)
+        candidates = postings[0].intersection(*postings[1:])
+        # the grams can be matched in different places, verify the whole query
+        return [contact_id for contact_id in candidates
+                if any(query in field_text for field_text in self._texts[contact_id])]
+
+    def match(self, field_name: str, value: Union[str, Pattern]) -> List[str]:
+        """
+        the contacts whose field is exactly the value, or matches the value
+            if it's a compiled regex pattern
+        """
+        if isinstance(value, str):
+            return list(self._values.get((field_name, value), ()))
+        return [contact_id for contact_id, fields in self._fields.items()
+                if value.search(fields.get(field_name, ''))]
+
+    def ids(self) -> List[str]:
+        """all of the indexed contacts"""
+        return list(self._fields)
+
+    def clear(self) -> None:
+        """drop all of the contacts"""
+        self._fields.clear()
+        self._texts.clear()
+        self._grams.clear()
+        self._short_grams.clear()
+        self._values.clear()
+        self.complete = False
+
+    def __contains__(self, contact_id: str) -> bool:
+        return contact_id in self._fields
+
+    def __len__(self) -> int:
+        return len(self._fields)
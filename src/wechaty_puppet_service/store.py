@@ -0,0 +1,234 @@
+"""
+Python Wechaty - https://github.com/wechaty/python-wechaty
+
+Authors:    Huan LI (李卓桓) <https://github.com/huan>
+            Jingjing WU (吴京京) <https://github.com/wj-Mcat>
+
+2020-now @ Copyright Wechaty
+
+Licensed under the Apache License, Version 2.0 (the 'License');
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an 'AS IS' BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from wechaty_puppet import get_logger
+
+log = get_logger('PayloadStore')
+
+# pylint: disable=C0103
+ResultType = TypeVar('ResultType')
+
+# bump it when the layout of table or the serialization of payload is changed,
+#   the outdated store will be dropped
+SCHEMA_VERSION = 1
+
+FLUSH_INTERVAL = 1
+FLUSH_BATCH_SIZE = 500
+
+# the stored payloads older than this are refreshed in the reconciliation
+PAYLOAD_STORE_MAX_AGE = 24 * 60 * 60
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS payloads (
+    type INTEGER NOT NULL,
+    id TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1,
+    updated_at REAL NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (type, id)
+);
+'''
+
+_UPSERT = '''
+INSERT INTO payloads (type, id, updated_at, data) VALUES (?, ?, ?, ?)
+ON CONFLICT (type, id) DO UPDATE SET
+    version = version + 1,
+    updated_at = excluded.updated_at,
+    data = excluded.data
+'''
+
+
+class _SqliteWorker:
+    """
+    embedded sqlite database whose operations run in a dedicated thread to keep the
+        event loop free, the pending writes are flushed in batch by a background
+        task. The subclass creates its tables in `_setup()` and writes the pending
+        writes in `flush()`.
+    """
+
+    def __init__(self, path: str,
+                 flush_interval: float = FLUSH_INTERVAL,
+                 flush_batch_size: int = FLUSH_BATCH_SIZE):
+        """
+        Args:
+            path (str): the path of sqlite database file
+            flush_interval (float): seconds to buffer the writes
+            flush_batch_size (int): flush immediately when there are so many writes
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_batch_size = flush_batch_size
+
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def _setup(self, conn: sqlite3.Connection) -> None:
+        """create the tables when the database is opened"""
+
+    def _open(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._setup(conn)
+            self._conn = conn
+        return self._conn
+
+    async def _run(self, func: Callable[..., ResultType], *args: Any) -> ResultType:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _schedule_flush(self, pending: int) -> None:
+        """flush the pending writes later, or at once if there are a batch of them"""
+        if self._flush_task is not None and not self._flush_task.done():
+            return
+        delay = 0 if pending >= self.flush_batch_size else self.flush_interval
+        self._flush_task = asyncio.ensure_future(self._delayed_flush(delay))
+
+    async def _delayed_flush(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        try:
+            await self.flush()
+        # pylint: disable=W0703
+        except Exception as e:
+            log.error('flush sqlite database <%s> failed: %s', self.path, e)
+
+    async def flush(self) -> None:
+        """write all of the pending writes to the database"""
+
+    async def close(self) -> None:
+        """flush the pending writes, close the database and its thread"""
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        self._flush_task = None
+        await self.flush()
+        if self._conn is not None:
+            await self._run(self._conn.close)
+            self._conn = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+class PayloadStore(_SqliteWorker):
+    """
+    embedded sqlite store of the serialized payloads keyed by (type, id).
+
+    The writes are buffered and flushed in batch by a background task, and all of
+        the database operations run in a dedicated thread to keep the event loop free.
+    """
+
+    def __init__(self, path: str,
+                 flush_interval: float = FLUSH_INTERVAL,
+                 flush_batch_size: int = FLUSH_BATCH_SIZE):
+        """
+        Args:
+            path (str): the path of sqlite database file
+            flush_interval (float): seconds to buffer the writes
+            flush_batch_size (int): flush immediately when there are so many writes
+        """
+        super().__init__(path, flush_interval=flush_interval,
+                         flush_batch_size=flush_batch_size)
+
+        # (type, id) -> data, None means deleted, the latest write wins
+        self._pending: Dict[Tuple[int, str], Optional[bytes]] = {}
+
+        self.writes: int = 0
+        self.flushes: int = 0
+
+    def _setup(self, conn: sqlite3.Connection) -> None:
+        conn.executescript(_SCHEMA)
+
+        row = conn.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+        if row is not None and int(row[0]) != SCHEMA_VERSION:
+            log.warning('payload store <%s> is outdated: version <%s>, dropping it',
+                        self.path, row[0])
+            conn.execute('DELETE FROM payloads')
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('schema_version', ?)",
+                     (str(SCHEMA_VERSION),))
+        conn.commit()
+
+    def _load(self, payload_type: int) -> Dict[str, Tuple[bytes, float]]:
+        conn = self._open()
+        rows = conn.execute(
+            'SELECT id, data, updated_at FROM payloads WHERE type = ?', (payload_type,)
+        ).fetchall()
+        return {row[0]: (row[1], row[2]) for row in rows}
+
+    def _write(self, batch: List[Tuple[Tuple[int, str], Optional[bytes]]]) -> None:
+        conn = self._open()
+        now = time.time()
+        with conn:
+            conn.executemany(
+                _UPSERT,
+                [(key[0], key[1], now, data) for key, data in batch if data is not None]
+            )
+            conn.executemany(
+                'DELETE FROM payloads WHERE type = ? AND id = ?',
+                [key for key, data in batch if data is None]
+            )
+
+    async def load(self, payload_type: int) -> Dict[str, Tuple[bytes, float]]:
+        """
+        load all of the payloads with the type
+
+        Return:
+            id -> (data, updated_at)
+        """
+        return await self._run(self._load, payload_type)
+
+    def put(self, payload_type: int, payload_id: str, data: bytes) -> None:
+        """save the payload in the next flush"""
+        self._pending[(payload_type, payload_id)] = data
+        self.writes += 1
+        self._schedule_flush(len(self._pending))
+
+    def delete(self, payload_type: int, payload_id: str) -> None:
+        """delete the payload in the next flush"""
+        self._pending[(payload_type, payload_id)] = None
+        self.writes += 1
+        self._schedule_flush(len(self._pending))
+
+    async def flush(self) -> None:
+        """write all of the pending payloads to the database"""
+        while self._pending:
+            batch = list(self._pending.items())[:self.flush_batch_size]
+            for key, _ in batch:
+                del self._pending[key]
+            await self._run(self._write, batch)
+            self.flushes += 1
@@ -0,0 +1,126 @@
+"""
+Python Wechaty - https://github.com/wechaty/python-wechaty
+
+Authors:    Huan LI (李卓桓) <https://github.com/huan>
+            Jingjing WU (吴京京) <https://github.com/wj-Mcat>
+
+2020-now @ Copyright Wechaty
+
+Licensed under the Apache License, Version 2.0 (the 'License');
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an 'AS IS' BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from typing import Any, Deque, Iterable, List, NamedTuple, Optional, Set
+
+# the max count of events buffered for the consumer
+EVENT_SUBSCRIPTION_SIZE = 1000
+EVENT_BATCH_SIZE = 100
+# milliseconds to wait for more events after the first one of a batch
+EVENT_BATCH_WAIT_MS = 100
+
+
+class StreamEvent(NamedTuple):
+    """the decoded event"""
+    name: str
+    payload: Any
+
+
+class EventSubscription:
+    """
+    bounded buffer of the events for one consumer of `PuppetService.events()`, the
+        reader of event stream waits when it's full
+    """
+
+    def __init__(self, names: Optional[Iterable[str]] = None,
+                 max_size: int = EVENT_SUBSCRIPTION_SIZE):
+        """
+        Args:
+            names (Iterable, optional): the event names to receive, all of the events
+                are received if it's None
+            max_size (int): the max count of buffered events
+        """
+        self.names: Optional[Set[str]] = set(names) if names is not None else None
+        self.max_size = max_size
+        self.closed: bool = False
+
+        self._events: Deque[StreamEvent] = deque()
+        # the signals are created in the running loop
+        self._changed: Optional[asyncio.Event] = None
+
+    def wants(self, name: str) -> bool:
+        """whether the event is subscribed"""
+        return not self.closed and (self.names is None or name in self.names)
+
+    def put(self, name: str, payload: Any) -> None:
+        """buffer the event, the reader should wait for the capacity after it"""
+        self._events.append(StreamEvent(name, payload))
+        self._notify()
+
+    @property
+    def full(self) -> bool:
+        """whether the buffer is full"""
+        return not self.closed and len(self._events) >= self.max_size
+
+    def close(self) -> None:
+        """stop the consumer after the buffered events"""
+        self.closed = True
+        self._notify()
+
+    def _notify(self) -> None:
+        if self._changed is not None:
+            self._changed.set()
+
+    async def _wait_changed(self, timeout: Optional[float] = None) -> None:
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        self._changed.clear()
+        if timeout is None:
+            await self._changed.wait()
+        else:
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def wait_for_capacity(self) -> None:
+        """wait until the buffer is not full"""
+        while self.full:
+            await self._wait_changed()
+
+    async def get_batch(self, max_batch: int = EVENT_BATCH_SIZE,
+                        max_wait_ms: float = EVENT_BATCH_WAIT_MS) -> List[StreamEvent]:
+        """
+        wait for the first event, and then for more events until the batch is full
+            or the max wait is passed
+
+        Return:
+            the events in order, it's empty only if the subscription is closed
+        """
+        while not self._events and not self.closed:
+            await self._wait_changed()
+
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + max_wait_ms / 1000
+        while len(self._events) < max_batch and not self.closed:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            await self._wait_changed(timeout=remaining)
+
+        count = min(max_batch, len(self._events))
+        batch = [self._events.popleft() for _ in range(count)]
+        # the reader may wait for the capacity
+        self._notify()
+        return batch
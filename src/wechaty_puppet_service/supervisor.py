@@ -0,0 +1,104 @@
+"""
+Python Wechaty - https://github.com/wechaty/python-wechaty
+
+Authors:    Huan LI (李卓桓) <https://github.com/huan>
+            Jingjing WU (吴京京) <https://github.com/wj-Mcat>
+
+2020-now @ Copyright Wechaty
+
+Licensed under the Apache License, Version 2.0 (the 'License');
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an 'AS IS' BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from __future__ import annotations
+
+import random
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+# the event stream is treated as stalled if there is no event (including
+#   heartbeat) in this seconds
+EVENT_STREAM_STALL_TIMEOUT = 90
+
+RECONNECT_INITIAL_DELAY = 1
+RECONNECT_MAX_DELAY = 60
+
+
+class ExponentialBackoff:
+    """
+    exponential backoff delay with jitter, which avoids that all of the clients
+        reconnect to the service at the same time
+    """
+
+    def __init__(self, initial: float = RECONNECT_INITIAL_DELAY,
+                 maximum: float = RECONNECT_MAX_DELAY,
+                 factor: float = 2,
+                 jitter: float = 0.5):
+        """
+        Args:
+            initial (float): the delay of the first attempt
+            maximum (float): the upper bound of the delay
+            factor (float): the multiplier of delay after every attempt
+            jitter (float): the ratio of delay which is randomized
+        """
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.jitter = jitter
+
+        self.attempts = 0
+
+    def next_delay(self) -> float:
+        """get the delay of next attempt"""
+        delay = min(self.maximum, self.initial * self.factor ** self.attempts)
+        self.attempts += 1
+        return delay * (1 - self.jitter * random.random())
+
+    def reset(self) -> None:
+        """reset the delay after a successful attempt"""
+        self.attempts = 0
+
+
+@dataclass
+class EventStreamMetrics:
+    """the metrics of the event stream connection"""
+    connected: bool = False
+    reconnects: int = 0
+    stalls: int = 0
+    # total seconds that the event stream is disconnected
+    downtime: float = 0.0
+    last_error: Optional[str] = None
+    disconnected_at: Optional[float] = None
+
+    def on_connected(self) -> None:
+        """the event stream receives the first event"""
+        if self.disconnected_at is not None:
+            self.downtime += time.monotonic() - self.disconnected_at
+            self.disconnected_at = None
+            self.reconnects += 1
+        self.connected = True
+
+    def on_disconnected(self, error: str, stalled: bool = False) -> None:
+        """the event stream is broken"""
+        if self.disconnected_at is None:
+            self.disconnected_at = time.monotonic()
+        if stalled:
+            self.stalls += 1
+        self.connected = False
+        self.last_error = error
+
+    @property
+    def current_downtime(self) -> float:
+        """total downtime including the ongoing one"""
+        if self.disconnected_at is None:
+            return self.downtime
+        return self.downtime + time.monotonic() - self.disconnected_at
@@ -20,14 +20,26 @@ limitations under the License.
 """
 from __future__ import annotations
 
-from telnetlib import Telnet
-
+import asyncio
 import socket
-from typing import Tuple
+import time
+from typing import Dict, List, Optional, Set, Tuple
 from urllib.parse import urlsplit
-from xml.dom import minidom
+from xml.parsers import expat
 
 from wechaty_puppet import FileBox, WechatyPuppetError
+from wechaty_puppet.exceptions import WechatyPuppetPayloadError
+
+from wechaty_puppet_service.cache import TTLCache
+
+PING_TIMEOUT = 3
+
+# the delay between connection attempts which is recommended by RFC 8305
+HAPPY_EYEBALLS_DELAY = 0.25
+
+EMOTICON_CACHE_SIZE = 1000
+# md5 -> the cdn url of the sticker, the FileBox is mutable so it isn't shared
+_EMOTICON_CACHE: TTLCache[str, str] = TTLCache(max_size=EMOTICON_CACHE_SIZE, ttl=None)
 
 
 def extract_host_and_port(url: str) -> Tuple[str, int]:
@@ -57,15 +69,25 @@ def extract_host_and_port(url: str) -> Tuple[str, int]:
     return host, port
 
 
-def ping_endpoint(end_point: str) -> bool:
+def split_endpoints(end_point: str) -> List[str]:
+    """
+    split the comma separated endpoints of the services which serve the same account
+
+    Examples:
+        >>> split_endpoints('10.0.0.1:8788, 10.0.0.2:8788')
+        ['10.0.0.1:8788', '10.0.0.2:8788']
+    """
+    return [item.strip() for item in end_point.split(',') if item.strip()]
+
+
+def ping_endpoint(end_point: str, timeout: float = PING_TIMEOUT) -> bool:
     """
-    Check end point is valid
-    Use different method:
-        1. If there is port: telnet
-        2. If there is host/domain: ping
+    Check end point is valid with a blocking tcp connection,
+        use `probe_endpoint` in the event loop instead.
 
     Args:
         end_point (str): host and port
+        timeout (float): seconds to wait for the connection
 
     Return:
         return True if end point is valid, otherwise False
@@ -76,30 +98,140 @@ def ping_endpoint(end_point: str) -> bool:
 
     """
     # 1. extract host & port
-    tn = Telnet()
     host, port = extract_host_and_port(end_point)
 
     # 2. test host:port with socket
-    res = True
     try:
-        tn.open(host, port=port, timeout=3)
-    except socket.error:
-        res = False
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except (socket.error, socket.timeout):
+        return False
+
+
+async def probe_endpoint(end_point: str, timeout: float = PING_TIMEOUT
+                         ) -> Optional[float]:
+    """
+    Check end point with an asyncio tcp connection
+
+    Args:
+        end_point (str): host and port
+        timeout (float): seconds to wait for the connection
 
-    return res
+    Return:
+        the connect latency(seconds) if end point is valid, otherwise None
+    """
+    host, port = extract_host_and_port(end_point)
+
+    start = time.perf_counter()
+    try:
+        _, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port), timeout=timeout)
+    except (OSError, asyncio.TimeoutError):
+        return None
+    latency = time.perf_counter() - start
+
+    writer.close()
+    return latency
+
+
+async def probe_endpoints(end_points: List[str],
+                          timeout: float = PING_TIMEOUT,
+                          delay: float = HAPPY_EYEBALLS_DELAY
+                          ) -> Optional[Tuple[str, float]]:
+    """
+    Check the candidate end points concurrently in Happy Eyeballs style:
+        the next end point is probed when the previous one fails or has not
+        answered in <delay> seconds, and the first healthy one wins.
+
+    Args:
+        end_points (List[str]): candidate end points in preference order
+        timeout (float): seconds to wait for each connection
+        delay (float): seconds to wait before probing the next end point
+
+    Return:
+        (end_point, latency) of the first healthy end point, otherwise None
+    """
+    candidates = list(end_points)
+    probes: Dict[asyncio.Future, str] = {}
+    pending: Set[asyncio.Future] = set()
+
+    try:
+        while candidates or pending:
+            if candidates:
+                end_point = candidates.pop(0)
+                probe = asyncio.ensure_future(probe_endpoint(end_point, timeout))
+                probes[probe] = end_point
+                pending.add(probe)
+
+            done, pending = await asyncio.wait(
+                pending,
+                timeout=delay if candidates else None,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            healthy: List[Tuple[str, float]] = []
+            for finished in done:
+                latency = finished.result()
+                if latency is not None:
+                    healthy.append((probes[finished], latency))
+            if healthy:
+                return min(healthy, key=lambda item: item[1])
+    finally:
+        for unfinished in pending:
+            unfinished.cancel()
+
+    return None
+
+
+class _EmojiFound(Exception):
+    """stop parsing the xml once the emoji element is found"""
+
+    def __init__(self, attributes: Dict[str, str]):
+        super().__init__()
+        self.attributes = attributes
+
+
+def _on_start_element(name: str, attributes: Dict[str, str]) -> None:
+    if name == 'emoji':
+        raise _EmojiFound(attributes)
+
+
+def parse_emoticon(message: str) -> Tuple[str, str]:
+    """
+    extract the attributes of emoji element from the emoticon message with expat,
+        the parsing is stopped at the emoji element without building the dom
+
+    Args:
+        message (str): the xml of emoticon message
+    Return:
+        (cdnurl, md5)
+    """
+    parser = expat.ParserCreate()
+    parser.StartElementHandler = _on_start_element
+    try:
+        parser.Parse(message, True)
+    except _EmojiFound as found:
+        return found.attributes.get('cdnurl', ''), found.attributes.get('md5', '')
+    except expat.ExpatError as e:
+        raise WechatyPuppetPayloadError(f'invalid emoticon message: {e}') from e
+    raise WechatyPuppetPayloadError('there is no emoji in emoticon message')
 
 
 async def message_emoticon(message: str) -> FileBox:
     """
-    emoticon from message
+    emoticon from message, the md5 identifies the sticker, so the FileBox of
+        the same sticker is always built from its first cdn url
 
     :param message:
     :return:
     """
-    dom_tree = minidom.parseString(message)
-    collection = dom_tree.documentElement
-    file_box = FileBox.from_url(
-        url=collection.getElementsByTagName('emoji')[0].getAttribute('cdnurl'),
-        name=collection.getElementsByTagName('emoji')[0].getAttribute('md5') + '.gif'
-    )
-    return file_box
+    cdn_url, md5 = parse_emoticon(message)
+    if not md5:
+        # the sticker without md5 can't be identified
+        return FileBox.from_url(url=cdn_url, name=md5 + '.gif')
+
+    cached_url = _EMOTICON_CACHE.get(md5)
+    if cached_url is None:
+        _EMOTICON_CACHE.set(md5, cdn_url)
+    else:
+        cdn_url = cached_url
+    return FileBox.from_url(url=cdn_url, name=md5 + '.gif')
@@ -0,0 +1,139 @@
+"""
+shared fixtures of the unit tests
+"""
+import asyncio
+import json
+from typing import Any, Callable, Dict, List, Optional, Set
+
+import pytest
+
+from wechaty_grpc.wechaty.puppet import (
+    ContactAliasResponse,
+    ContactListResponse,
+    MessageImageResponse,
+    MessageSendUrlResponse,
+    MessageUrlResponse,
+    RoomListResponse,
+    RoomMemberListResponse,
+)
+from wechaty_puppet import (
+    ContactPayload,
+    MessagePayload,
+    PuppetOptions,
+    RoomMemberPayload,
+    RoomPayload,
+)
+
+from wechaty_puppet_service import PuppetService
+
+
+# pylint: disable=W0622,R0902
+class FakeStub:
+    """
+    in-memory PuppetStub which serves the contacts, rooms, room members and messages,
+        and records the calls. The payload of an unknown id has only the id.
+    """
+
+    def __init__(self) -> None:
+        self.contacts: Dict[str, ContactPayload] = {}
+        self.rooms: Dict[str, RoomPayload] = {}
+        # room id -> member ids
+        self.room_members: Dict[str, List[str]] = {}
+        self.messages: Dict[str, MessagePayload] = {}
+        # message id -> the url link
+        self.url_links: Dict[str, Dict[str, Any]] = {}
+        # message id -> the json of the image file box
+        self.images: Dict[str, str] = {}
+
+        # the calls of these ids fail with OSError
+        self.broken: Set[str] = set()
+        # every call fails with it if it's set
+        self.error: Optional[BaseException] = None
+        # every call waits for it if it's set
+        self.gate: Optional[asyncio.Event] = None
+        # seconds to wait in every call, which always yields to the event loop
+        self.delay: float = 0
+
+        # the names of the called methods, in order
+        self.calls: List[str] = []
+
+    def count(self, method: str) -> int:
+        """the count of calls of the method"""
+        return self.calls.count(method)
+
+    async def _call(self, method: str, id: str = '') -> None:
+        self.calls.append(method)
+        if self.error is not None:
+            raise self.error
+        await asyncio.sleep(self.delay)
+        if self.gate is not None:
+            await self.gate.wait()
+        if id in self.broken:
+            raise OSError(f'{id} is broken')
+
+    async def contact_list(self) -> ContactListResponse:
+        await self._call('contact_list')
+        return ContactListResponse(ids=list(self.contacts))
+
+    async def contact_payload(self, id: str = '') -> ContactPayload:
+        await self._call('contact_payload', id)
+        return self.contacts.get(id, ContactPayload(id=id))
+
+    async def contact_alias(self, id: str = '', alias: str = '') -> ContactAliasResponse:
+        await self._call('contact_alias', id)
+        return ContactAliasResponse(alias=alias)
+
+    async def room_list(self) -> RoomListResponse:
+        await self._call('room_list')
+        return RoomListResponse(ids=list(self.rooms))
+
+    async def room_payload(self, id: str = '') -> RoomPayload:
+        await self._call('room_payload', id)
+        return self.rooms.get(id, RoomPayload(id=id))
+
+    async def room_member_list(self, id: str = '') -> RoomMemberListResponse:
+        await self._call('room_member_list', id)
+        return RoomMemberListResponse(member_ids=self.room_members.get(id, []))
+
+    async def room_member_payload(self, id: str = '', member_id: str = ''
+                                  ) -> RoomMemberPayload:
+        await self._call('room_member_payload', member_id)
+        return RoomMemberPayload(id=member_id)
+
+    async def message_payload(self, id: str = '') -> MessagePayload:
+        await self._call('message_payload', id)
+        return self.messages.get(id, MessagePayload(id=id))
+
+    async def message_url(self, id: str = '') -> MessageUrlResponse:
+        await self._call('message_url', id)
+        return MessageUrlResponse(url_link=json.dumps(self.url_links[id]))
+
+    async def message_send_url(self, conversation_id: str = '', url_link: str = ''
+                               ) -> MessageSendUrlResponse:
+        await self._call('message_send_url', conversation_id)
+        return MessageSendUrlResponse(id=f'message-{len(self.calls)}')
+
+    async def message_image(self, id: str = '', type: int = 0) -> MessageImageResponse:
+        await self._call('message_image', id)
+        return MessageImageResponse(filebox=self.images[id])
+
+
+@pytest.fixture
+def make_stub() -> Callable[[], FakeStub]:
+    """create the empty fake stubs"""
+    return FakeStub
+
+
+@pytest.fixture
+def stub() -> FakeStub:
+    """the fake stub of the puppet fixture"""
+    return FakeStub()
+
+
+@pytest.fixture
+def puppet(stub: FakeStub) -> PuppetService:
+    """the puppet which calls the fake stub instead of the service"""
+    puppet_service = PuppetService(
+        PuppetOptions(end_point='127.0.0.1:8788', token='your-token'))
+    puppet_service._puppet_stub = stub  # pylint: disable=W0212
+    return puppet_service
@@ -0,0 +1,66 @@
+"""
+unit test for batched payload lookups
+"""
+import asyncio
+
+from wechaty_puppet_service.batch import MicroBatcher, gather_batch
+
+
+def test_gather_batch():
+    async def run():
+        in_flight = {'current': 0, 'max': 0}
+
+        async def fetch(key: int) -> int:
+            in_flight['current'] += 1
+            in_flight['max'] = max(in_flight['max'], in_flight['current'])
+            await asyncio.sleep(0.001)
+            in_flight['current'] -= 1
+            if key % 10 == 0:
+                raise ValueError(key)
+            return key * 2
+
+        result = await gather_batch(list(range(100)) + [1, 2], fetch, concurrency=8)
+        assert len(result) == 100
+        assert not result.ok
+        assert sorted(result.errors) == list(range(0, 100, 10))
+        assert result.results[3] == 6
+        assert in_flight['max'] == 8
+
+    asyncio.run(run())
+
+
+def test_micro_batcher():
+    async def run():
+        calls = []
+
+        async def fetch(key: str) -> str:
+            calls.append(key)
+            return key.upper()
+
+        batcher: MicroBatcher[str, str] = MicroBatcher(fetch, window=0.01)
+        results = await asyncio.gather(*[batcher.load(key) for key in 'abca'])
+        assert results == ['A', 'B', 'C', 'A']
+        assert sorted(calls) == ['a', 'b', 'c']
+        assert batcher.batches == 1
+
+    asyncio.run(run())
+
+
+def test_contact_payload_batch(puppet, stub):
+    async def run():
+        stub.delay = 0.001
+        stub.broken.add('broken')
+        puppet.enable_micro_batch(window=0.01)
+
+        ids = [f'contact-{i}' for i in range(300)]
+        result = await puppet.contact_payload_batch(ids + ['broken'], concurrency=400)
+        assert len(result.results) == 300
+        assert isinstance(result.errors['broken'], OSError)
+        assert puppet.contact_payload_batcher.batches == 1
+
+        # served by the cache
+        result = await puppet.contact_payload_batch(ids)
+        assert result.ok
+        assert stub.count('contact_payload') == 301
+
+    asyncio.run(run())
@@ -0,0 +1,140 @@
+"""
+unit test for payload cache
+"""
+import asyncio
+import json
+import time
+
+from wechaty_grpc.wechaty.puppet import EventResponse, EventType
+from wechaty_puppet import MessagePayload, MessageType, RoomPayload
+
+from wechaty_puppet_service.cache import SingleFlight, TTLCache
+
+
+def test_lru_eviction():
+    cache: TTLCache[str, int] = TTLCache(max_size=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+
+    cache.set('c', 3)
+    assert 'b' not in cache
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_ttl_expiration():
+    cache: TTLCache[str, int] = TTLCache(max_size=10, ttl=0.01)
+    cache.set('a', 1)
+    assert cache.get('a') == 1
+    time.sleep(0.02)
+    assert cache.get('a') is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_room_payload_invalidated_by_event(puppet, stub):
+    async def run():
+        stub.rooms['room-id'] = RoomPayload(id='room-id', topic='topic-1')
+
+        assert (await puppet.room_payload('room-id')).topic == 'topic-1'
+        assert (await puppet.room_payload('room-id')).topic == 'topic-1'
+        assert stub.count('room_payload') == 1
+
+        stub.rooms['room-id'] = RoomPayload(id='room-id', topic='topic-2')
+        puppet._on_event_response(EventResponse(  # pylint: disable=W0212
+            type=EventType.EVENT_TYPE_ROOM_TOPIC,
+            payload=json.dumps({
+                'changerId': 'contact-id', 'newTopic': 'topic-2', 'oldTopic': 'topic-1',
+                'roomId': 'room-id', 'timestamp': 0
+            })
+        ))
+        assert (await puppet.room_payload('room-id')).topic == 'topic-2'
+        assert stub.count('room_payload') == 2
+
+    asyncio.run(run())
+
+
+def test_single_flight():
+    async def run():
+        flights: SingleFlight[str, str] = SingleFlight()
+        calls = []
+
+        async def fetch() -> str:
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return 'payload'
+
+        results = await asyncio.gather(*[flights.do('room-id', fetch) for _ in range(10)])
+        assert results == ['payload'] * 10
+        assert len(calls) == 1
+        assert flights.shared == 9
+        assert len(flights) == 0
+
+        # the landed call is not shared
+        assert await flights.do('room-id', fetch) == 'payload'
+        assert len(calls) == 2
+
+    asyncio.run(run())
+
+
+def test_concurrent_room_payload_coalesced(puppet, stub):
+    async def run():
+        stub.rooms['room-id'] = RoomPayload(id='room-id', topic='topic-1')
+
+        payloads = await asyncio.gather(*[puppet.room_payload('room-id') for _ in range(10)])
+        assert all(payload.topic == 'topic-1' for payload in payloads)
+        assert stub.count('room_payload') == 1
+        assert puppet.single_flight.shared == 9
+
+    asyncio.run(run())
+
+
+def test_concurrent_message_payload(puppet, stub):
+    async def run():
+        # the type of ts-wechaty-puppet, which is Text
+        stub.messages['message-1'] = MessagePayload(id='message-1', text='hello', type=7)
+
+        # the calls share one in-flight response, which is mapped only once
+        payloads = await asyncio.gather(
+            *[puppet.message_payload('message-1') for _ in range(3)])
+        assert [payload.type for payload in payloads] == [MessageType.MESSAGE_TYPE_TEXT] * 3
+        assert puppet.single_flight.calls == 1
+
+    asyncio.run(run())
+
+
+def test_stale_payload_rejected():
+    cache: TTLCache[str, int] = TTLCache(max_size=10)
+    version = cache.version('a')
+    cache.delete('a')
+    assert not cache.set('a', 1, version=version)
+    assert cache.get('a') is None
+    assert cache.set('a', 2, version=cache.version('a'))
+
+    version = cache.version('b')
+    cache.clear()
+    assert not cache.set('b', 1, version=version)
+
+
+def test_in_flight_room_payload_invalidated(puppet, stub):
+    async def run():
+        stub.rooms['room-id'] = RoomPayload(id='room-id', topic='topic-1')
+
+        in_flight = asyncio.ensure_future(puppet.room_payload('room-id'))
+        await asyncio.sleep(0)
+        # the topic is changed while the old payload is being fetched
+        puppet._on_event_response(EventResponse(  # pylint: disable=W0212
+            type=EventType.EVENT_TYPE_ROOM_TOPIC,
+            payload=json.dumps({
+                'changerId': 'contact-id', 'newTopic': 'Wechaty', 'oldTopic': 'topic-1',
+                'roomId': 'room-id', 'timestamp': 0
+            })
+        ))
+        assert (await in_flight).topic == 'topic-1'
+
+        assert 'room-id' not in puppet.room_payload_cache
+        assert puppet.room_search_index.exact('Wechaty') == ['room-id']
+        assert puppet.room_search_index.exact('topic-1') == []
+
+    asyncio.run(run())
@@ -0,0 +1,124 @@
+"""
+unit test for channel pool
+"""
+import asyncio
+
+import pytest
+
+from grpclib.const import Status
+from grpclib.exceptions import GRPCError
+from wechaty_puppet import PuppetOptions
+
+from wechaty_puppet_service import PuppetService
+
+from wechaty_puppet_service.channel_pool import ChannelPool, PooledPuppetStub
+
+
+def _create_pool(make_stub) -> ChannelPool:
+    pool = ChannelPool(['127.0.0.1:8001', '127.0.0.1:8002'], max_failures=2, ejection_time=60)
+    for member in pool.members:
+        member.stub = make_stub()
+        member.stub.gate = asyncio.Event()
+    return pool
+
+
+def test_least_outstanding_requests(make_stub):
+    async def call():
+        pool = _create_pool(make_stub)
+        stub = PooledPuppetStub(pool)
+
+        tasks = [asyncio.ensure_future(stub.contact_payload(id=str(i))) for i in range(4)]
+        await asyncio.sleep(0)
+        assert [member.in_flight for member in pool.members] == [2, 2]
+
+        for member in pool.members:
+            member.stub.gate.set()
+        payloads = await asyncio.gather(*tasks)
+        assert [payload.id for payload in payloads] == ['0', '1', '2', '3']
+        assert [member.in_flight for member in pool.members] == [0, 0]
+        pool.close()
+
+    asyncio.run(call())
+
+
+def test_eject_unhealthy_member(make_stub):
+    async def call():
+        pool = _create_pool(make_stub)
+        stub = PooledPuppetStub(pool)
+        broken, healthy = pool.members
+        broken.stub.error = GRPCError(Status.UNAVAILABLE, 'service is down')
+        healthy.stub.gate.set()
+
+        # the first member is picked when there is no in-flight call
+        for _ in range(2):
+            with pytest.raises(GRPCError):
+                await stub.contact_payload(id='0')
+        assert not broken.is_healthy()
+        assert pool.primary is healthy
+
+        for _ in range(3):
+            assert (await stub.contact_payload(id='1')).id == '1'
+        assert healthy.stub.count('contact_payload') == 3
+
+        # re-admit the member after the ejection time
+        broken.ejected_until = 0
+        assert broken.is_healthy()
+        pool.close()
+
+    asyncio.run(call())
+
+
+def test_readmit_after_health_check(make_stub):
+    async def call():
+        results = [None, 0.001]
+
+        async def health_check(end_point: str):
+            return results.pop(0)
+
+        pool = ChannelPool(['127.0.0.1:8001', '127.0.0.1:8002'], max_failures=2,
+                           ejection_time=60, health_check=health_check)
+        for member in pool.members:
+            member.stub = make_stub()
+        broken, healthy = pool.members
+        pool.eject(broken.end_point, ejection_time=0)
+
+        # the failed check keeps the member ejected
+        assert pool.pick() is healthy
+        await asyncio.sleep(0)
+        assert not broken.is_healthy()
+
+        broken.ejected_until = 0
+        pool.pick()
+        await asyncio.sleep(0)
+        assert broken.is_healthy()
+        assert broken.failures == 0
+        pool.close()
+
+    asyncio.run(call())
+
+
+def test_init_puppet_with_reachable_endpoint_first():
+    async def run():
+        server = await asyncio.start_server(
+            lambda reader, writer: writer.close(), '127.0.0.1', 0)
+        valid_endpoint = f'127.0.0.1:{server.sockets[0].getsockname()[1]}'
+        # nothing listens on the port of the closed server
+        closed = await asyncio.start_server(lambda reader, writer: None, '127.0.0.1', 0)
+        unreachable_endpoint = f'127.0.0.1:{closed.sockets[0].getsockname()[1]}'
+        closed.close()
+        await closed.wait_closed()
+
+        puppet = PuppetService(PuppetOptions(
+            end_point=f'{unreachable_endpoint},{valid_endpoint}', token='your-token'))
+        await puppet._init_puppet()  # pylint: disable=W0212
+        assert [member.end_point for member in puppet.channel_pool.members] == \
+            [valid_endpoint, unreachable_endpoint]
+        assert puppet.channel_pool.primary.end_point == valid_endpoint
+        # the endpoint which didn't answer the probe isn't picked
+        assert not puppet.channel_pool.members[1].is_healthy()
+
+        puppet.channel_pool.close()
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(run())
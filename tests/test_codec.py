@@ -0,0 +1,31 @@
+"""
+unit test for json codec
+"""
+import pytest
+from wechaty_puppet import UrlLinkPayload
+from wechaty_puppet.exceptions import WechatyPuppetConfigurationError
+
+from wechaty_puppet_service.codec import CODEC_FACTORIES, get_json_codec
+
+
+@pytest.mark.parametrize('name', list(CODEC_FACTORIES))
+def test_codec_round_trip(name):
+    try:
+        codec = get_json_codec(name)
+    except WechatyPuppetConfigurationError:
+        pytest.skip(f'{name} is not installed')
+
+    data = {'messageId': 'message-id', 'text': '你好', 'mentionIds': ['a'], 'timestamp': 1}
+    assert codec.loads(codec.dumps(data)) == data
+    assert codec.loads(codec.dumps(data).encode('utf-8')) == data
+
+    # the dataclass payload is serialized as dict
+    url_link = UrlLinkPayload(url='https://wechaty.js.org', title='wechaty',
+                              description='', thumbnailUrl='')
+    assert codec.loads(codec.dumps(url_link))['url'] == 'https://wechaty.js.org'
+
+
+def test_unknown_codec():
+    assert get_json_codec(None).name in CODEC_FACTORIES
+    with pytest.raises(WechatyPuppetConfigurationError):
+        get_json_codec('unknown')
@@ -0,0 +1,83 @@
+"""
+unit test for event deduplication
+"""
+import asyncio
+import json
+
+from wechaty_grpc.wechaty.puppet import EventResponse, EventType
+
+from wechaty_puppet_service.dedup import EventDeduplicator, SeenSet
+
+
+def _event(event_type: EventType, **data) -> EventResponse:
+    return EventResponse(type=event_type, payload=json.dumps(data))
+
+
+def test_seen_set_window_and_size():
+    now = [0.0]
+    seen = SeenSet(window=10, max_size=100, clock=lambda: now[0])
+    assert not seen.add(1)
+    assert seen.add(1)
+
+    # it's remembered in the whole window
+    now[0] = 9
+    assert not seen.add(2)
+    assert seen.add(1)
+
+    # it's still remembered in the previous generation
+    now[0] = 10
+    assert seen.add(1)
+    assert not seen.add(3)
+
+    # the first generation is dropped
+    now[0] = 20
+    assert not seen.add(1)
+    assert seen.add(3)
+
+    for fingerprint in range(1000):
+        seen.add(fingerprint + 1000)
+    assert len(seen) <= 100
+
+
+def test_suppress_duplicated_events():
+    deduplicator = EventDeduplicator()
+    events = [
+        (EventType.EVENT_TYPE_MESSAGE, {'messageId': 'message-1'}),
+        (EventType.EVENT_TYPE_MESSAGE, {'messageId': 'message-2'}),
+        (EventType.EVENT_TYPE_FRIENDSHIP, {'friendshipId': 'message-1'}),
+        # the same id in another layout of the payload
+        (EventType.EVENT_TYPE_MESSAGE, {'timestamp': 1, 'messageId': 'message-1'}),
+        (EventType.EVENT_TYPE_ROOM_INVITE, {'roomInvitationId': 'invitation-1'}),
+        (EventType.EVENT_TYPE_ROOM_INVITE, {'roomInvitationId': 'invitation-1'}),
+        (EventType.EVENT_TYPE_ROOM_JOIN, {'roomId': 'room-1', 'inviterId': 'contact-1',
+                                          'inviteeIdList': ['contact-2'], 'timestamp': 1}),
+        (EventType.EVENT_TYPE_ROOM_JOIN, {'roomId': 'room-1', 'inviterId': 'contact-1',
+                                          'inviteeIdList': ['contact-2'], 'timestamp': 1}),
+        (EventType.EVENT_TYPE_ROOM_JOIN, {'roomId': 'room-1', 'inviterId': 'contact-1',
+                                          'inviteeIdList': ['contact-2'], 'timestamp': 2}),
+        # the event without the ids is never suppressed
+        (EventType.EVENT_TYPE_ROOM_TOPIC, {'roomId': 'room-1'}),
+        (EventType.EVENT_TYPE_ROOM_TOPIC, {'roomId': 'room-1'}),
+        (EventType.EVENT_TYPE_HEARTBEAT, {'data': 'heartbeat'}),
+        (EventType.EVENT_TYPE_HEARTBEAT, {'data': 'heartbeat'}),
+    ]
+    assert [deduplicator.is_duplicate(event_type, data) for event_type, data in events] == \
+        [False, False, False, True, False, True, False, True, False, False, False, False, False]
+    assert deduplicator.stats()['duplicates'] == {
+        int(EventType.EVENT_TYPE_MESSAGE): 1,
+        int(EventType.EVENT_TYPE_ROOM_INVITE): 1,
+        int(EventType.EVENT_TYPE_ROOM_JOIN): 1,
+    }
+
+
+def test_puppet_suppresses_replayed_events(puppet):
+    async def run():
+        received = []
+        puppet.enable_event_dedup()
+        puppet.on('message', lambda payload: received.append(payload.message_id))
+        for message_id in ['message-1', 'message-2', 'message-1']:
+            await puppet._receive_event(  # pylint: disable=W0212
+                _event(EventType.EVENT_TYPE_MESSAGE, messageId=message_id))
+        return received
+
+    assert asyncio.run(run()) == ['message-1', 'message-2']
@@ -0,0 +1,66 @@
+"""
+unit test for endpoint discovery
+"""
+import asyncio
+import time
+
+import pytest
+
+from wechaty_puppet.exceptions import WechatyPuppetGrpcError
+
+from wechaty_puppet_service import discovery
+from wechaty_puppet_service.discovery import EndpointResolver
+
+
+def test_resolve_and_cache(tmp_path, monkeypatch):
+    calls = []
+
+    def fake_fetch_endpoint(token, timeout=10):
+        calls.append(token)
+        return '1.2.3.4:8788'
+
+    monkeypatch.setattr(discovery, 'fetch_endpoint', fake_fetch_endpoint)
+    cache_file = str(tmp_path / 'endpoints.json')
+
+    resolver = EndpointResolver('your-token', cache_file=cache_file, ttl=60)
+    assert asyncio.run(resolver.resolve()) == '1.2.3.4:8788'
+    assert len(calls) == 1
+
+    # a restarted worker should be served from the warm cache
+    resolver = EndpointResolver('your-token', cache_file=cache_file, ttl=60)
+    assert asyncio.run(resolver.resolve()) == '1.2.3.4:8788'
+    assert len(calls) == 1
+
+    assert 'your-token' not in (tmp_path / 'endpoints.json').read_text()
+
+
+def test_stale_endpoint_refreshed_in_background(tmp_path, monkeypatch):
+    monkeypatch.setattr(discovery, 'fetch_endpoint', lambda token, timeout=10: '5.6.7.8:80')
+    cache_file = str(tmp_path / 'endpoints.json')
+
+    resolver = EndpointResolver('your-token', cache_file=cache_file, ttl=0, max_stale=60)
+    resolver._save('1.2.3.4:8788')  # pylint: disable=W0212
+
+    async def resolve() -> str:
+        end_point = await resolver.resolve()
+        await resolver._refresh_task  # pylint: disable=W0212
+        return end_point
+
+    assert asyncio.run(resolve()) == '1.2.3.4:8788'
+    assert resolver.cached()['endpoint'] == '5.6.7.8:80'
+
+
+def test_expired_endpoint_as_fallback(tmp_path, monkeypatch):
+    def fake_fetch_endpoint(token, timeout=10):
+        raise WechatyPuppetGrpcError('chatie server is down')
+
+    monkeypatch.setattr(discovery, 'fetch_endpoint', fake_fetch_endpoint)
+    cache_file = str(tmp_path / 'endpoints.json')
+
+    resolver = EndpointResolver('your-token', cache_file=cache_file, ttl=0, max_stale=0)
+    with pytest.raises(WechatyPuppetGrpcError):
+        asyncio.run(resolver.resolve())
+
+    resolver._save('1.2.3.4:8788')  # pylint: disable=W0212
+    assert resolver.cached()['updated_at'] <= time.time()
+    assert asyncio.run(resolver.resolve()) == '1.2.3.4:8788'
@@ -0,0 +1,124 @@
+"""
+unit test for event dispatcher
+"""
+import asyncio
+import json
+from typing import List
+
+from wechaty_grpc.wechaty.puppet import EventResponse, EventType
+from wechaty_puppet import EventMessagePayload, MessagePayload
+
+from wechaty_puppet_service.dispatch import EventDispatcher
+
+
+def test_order_by_conversation():
+    async def run():
+        handled: List[str] = []
+
+        async def listener(payload):
+            room_id, index = payload
+            if room_id == 'slow-room':
+                await asyncio.sleep(0.05)
+            handled.append(f'{room_id}:{index}')
+
+        async def conversation_key(_, payload):
+            return payload[0]
+
+        dispatcher = EventDispatcher(
+            listeners=lambda name: [listener], conversation_key=conversation_key, workers=4)
+        for index in range(3):
+            dispatcher.dispatch('message', ('slow-room', index))
+            dispatcher.dispatch('message', ('fast-room', index))
+        assert dispatcher.depth == 6
+
+        await dispatcher.join()
+        assert [item for item in handled if item.startswith('slow')] == \
+            ['slow-room:0', 'slow-room:1', 'slow-room:2']
+        assert [item for item in handled if item.startswith('fast')] == \
+            ['fast-room:0', 'fast-room:1', 'fast-room:2']
+        assert dispatcher.stats()['handled'] == 6
+        assert dispatcher.stats()['latency_max'] >= 0.05
+        await dispatcher.stop()
+
+    asyncio.run(run())
+
+
+def test_slow_listener_does_not_block_other_conversations():
+    async def run():
+        handled: List[str] = []
+
+        async def listener(payload):
+            if payload == 'slow':
+                await asyncio.sleep(10)
+            handled.append(payload)
+
+        async def conversation_key(_, payload):
+            return payload
+
+        dispatcher = EventDispatcher(
+            listeners=lambda name: [listener], conversation_key=conversation_key,
+            workers=2, max_size=2)
+        dispatcher.dispatch('message', 'slow')
+        await asyncio.sleep(0)
+        # the conversation in the other shard
+        other = next(f'room-{i}' for i in range(100) if hash(f'room-{i}') % 2 != hash('slow') % 2)
+        dispatcher.dispatch('message', other)
+        await asyncio.wait_for(dispatcher.wait_for_capacity(), timeout=1)
+        assert handled == [other]
+        assert dispatcher.depth == 1
+        await dispatcher.stop()
+
+    asyncio.run(run())
+
+
+def test_hanging_conversation_lookup():
+    async def run():
+        handled: List[str] = []
+
+        async def conversation_key(_, payload):
+            if payload == 'hanging':
+                await asyncio.sleep(10)
+            return payload
+
+        dispatcher = EventDispatcher(
+            listeners=lambda name: [handled.append], conversation_key=conversation_key,
+            workers=2, key_timeout=0.01)
+        dispatcher.dispatch('message', 'hanging')
+        dispatcher.dispatch('message', 'room-1')
+        await asyncio.wait_for(dispatcher.join(), timeout=1)
+        # the event is handled without its conversation, and the next one isn't blocked
+        assert handled == ['hanging', 'room-1']
+        assert dispatcher.stats()['key_timeouts'] == 1
+        await dispatcher.stop()
+
+    asyncio.run(run())
+
+
+def test_puppet_dispatch_message_event(puppet):
+    async def run():
+        puppet.enable_event_dispatch(workers=4)
+        puppet.login_user_id = 'login-user'
+        puppet.message_payload_cache.set(
+            'message-1', MessagePayload(id='message-1', from_id='contact-1', to_id='login-user'))
+        puppet.message_payload_cache.set(
+            'message-2', MessagePayload(id='message-2', from_id='login-user', to_id='contact-1'))
+
+        received: List[str] = []
+
+        async def on_message(payload: EventMessagePayload):
+            received.append(payload.message_id)
+
+        puppet.on('message', on_message)
+        for message_id in ('message-1', 'message-2'):
+            puppet._on_event_response(EventResponse(
+                type=EventType.EVENT_TYPE_MESSAGE,
+                payload=json.dumps({'messageId': message_id})
+            ))
+
+        assert await puppet._event_conversation(
+            'message', EventMessagePayload(message_id='message-2')) == 'contact-1'
+        await puppet.event_dispatcher.join()
+        assert received == ['message-1', 'message-2']
+        await puppet.event_dispatcher.stop()
+
+    asyncio.run(run())
@@ -0,0 +1,113 @@
+"""
+unit test for enriched message event
+"""
+import asyncio
+import gc
+import json
+
+from wechaty_grpc.wechaty.puppet import EventResponse, EventType
+from wechaty_puppet import ContactPayload, MessagePayload, RoomPayload
+
+from wechaty_puppet_service.enrich import MessageEnricher
+
+
+def test_enrich_in_order_with_deadline():
+    async def run():
+        calls = []
+
+        async def message_payload(message_id):
+            calls.append(message_id)
+            # the first message is slower than the second one
+            await asyncio.sleep(0.02 if message_id == 'message-1' else 0)
+            return MessagePayload(id=message_id, from_id=f'talker-{message_id}',
+                                  room_id='room-1')
+
+        async def contact_payload(contact_id):
+            calls.append(contact_id)
+            if contact_id == 'talker-message-2':
+                await asyncio.sleep(0.2)
+                calls.append('late talker')
+            return ContactPayload(id=contact_id)
+
+        async def room_payload(room_id):
+            calls.append(room_id)
+            return RoomPayload(id=room_id)
+
+        emitted = []
+        enricher = MessageEnricher(message_payload, contact_payload, room_payload,
+                                   emit=emitted.append, deadline=0.1)
+        enricher.enrich('message-1')
+        enricher.enrich('message-2')
+        await asyncio.sleep(0.2)
+
+        assert [payload.message_id for payload in emitted] == ['message-1', 'message-2']
+        assert emitted[0].complete
+        assert emitted[0].talker.id == 'talker-message-1'
+        assert emitted[0].room.id == 'room-1'
+        # the room is fetched, but the talker is over the deadline
+        assert not emitted[1].complete
+        assert emitted[1].talker is None and emitted[1].room.id == 'room-1'
+        assert enricher.stats() == {'pending': 0, 'enriched': 2, 'partial': 1}
+
+        # the fetch is not cancelled by the deadline
+        await asyncio.sleep(0.1)
+        assert calls[-1] == 'late talker'
+        enricher.stop()
+
+    asyncio.run(run())
+
+
+def test_late_failure_is_retrieved():
+    async def run():
+        errors = []
+        asyncio.get_event_loop().set_exception_handler(
+            lambda loop, context: errors.append(context))
+
+        async def message_payload(message_id):
+            return MessagePayload(id=message_id, from_id='talker')
+
+        async def contact_payload(contact_id):
+            await asyncio.sleep(0.05)
+            raise OSError('broken')
+
+        async def room_payload(room_id):
+            return RoomPayload(id=room_id)
+
+        emitted = []
+        enricher = MessageEnricher(message_payload, contact_payload, room_payload,
+                                   emit=emitted.append, deadline=0.01)
+        enricher.enrich('message-1')
+        await asyncio.sleep(0.1)
+        assert not emitted[0].complete
+
+        # the failed fetch is not left to the garbage collector
+        gc.collect()
+        assert errors == []
+        assert enricher.stats()['pending'] == 0
+        enricher.stop()
+
+    asyncio.run(run())
+
+
+def test_puppet_enriched_message_event(puppet):
+    async def run():
+        puppet.enable_message_enrichment(deadline=1)
+        puppet.message_payload_cache.set(
+            'message-1', MessagePayload(id='message-1', from_id='contact-1', room_id='room-1'))
+        puppet.contact_payload_cache.set('contact-1', ContactPayload(id='contact-1'))
+        puppet.room_payload_cache.set('room-1', RoomPayload(id='room-1'))
+
+        received = []
+        puppet.on('enriched-message', received.append)
+        puppet._on_event_response(EventResponse(
+            type=EventType.EVENT_TYPE_MESSAGE, payload=json.dumps({'messageId': 'message-1'})))
+        await asyncio.sleep(0.01)
+
+        assert len(received) == 1
+        assert received[0].complete
+        assert received[0].message.from_id == 'contact-1'
+        assert received[0].talker.id == 'contact-1'
+        assert received[0].room.id == 'room-1'
+        puppet.message_enricher.stop()
+
+    asyncio.run(run())
@@ -0,0 +1,95 @@
+"""
+unit test for event queue
+"""
+import asyncio
+import json
+
+from wechaty_grpc.wechaty.puppet import EventResponse, EventType
+
+from wechaty_puppet_service.event_queue import EventQueue, EventSpill, OverflowPolicy
+
+
+def _event(event_type: EventType, index: int) -> EventResponse:
+    return EventResponse(type=event_type, payload=json.dumps({'index': index}))
+
+
+async def _drain(queue: EventQueue):
+    events = []
+    while len(queue):
+        response = await queue.get()
+        events.append((response.type, json.loads(response.payload)['index']))
+    return events
+
+
+def test_keep_latest_and_drop():
+    async def run():
+        queue = EventQueue(max_size=10, high_watermark=2, low_watermark=0, policies={
+            int(EventType.EVENT_TYPE_HEARTBEAT): OverflowPolicy.KEEP_LATEST,
+            int(EventType.EVENT_TYPE_FRIENDSHIP): OverflowPolicy.DROP,
+        })
+        for index in range(3):
+            await queue.put(_event(EventType.EVENT_TYPE_HEARTBEAT, index))
+            await queue.put(_event(EventType.EVENT_TYPE_MESSAGE, index))
+            await queue.put(_event(EventType.EVENT_TYPE_FRIENDSHIP, index))
+
+        assert queue.overflowing
+        assert queue.stats()['dropped'] == {int(EventType.EVENT_TYPE_FRIENDSHIP): 3}
+        assert queue.stats()['replaced'] == {int(EventType.EVENT_TYPE_HEARTBEAT): 2}
+        assert await _drain(queue) == [
+            (EventType.EVENT_TYPE_HEARTBEAT, 2),
+            (EventType.EVENT_TYPE_MESSAGE, 0),
+            (EventType.EVENT_TYPE_MESSAGE, 1),
+            (EventType.EVENT_TYPE_MESSAGE, 2),
+        ]
+        assert not queue.overflowing
+
+    asyncio.run(run())
+
+
+def test_spill_in_order(tmp_path):
+    async def run():
+        queue = EventQueue(max_size=3, spill=EventSpill(str(tmp_path / 'events.db')))
+        for index in range(10):
+            await queue.put(_event(EventType.EVENT_TYPE_MESSAGE, index))
+
+        assert len(queue) == 10
+        assert queue.stats()['spilled'] == 7
+        assert [index for _, index in await _drain(queue)] == list(range(10))
+        await queue.close()
+
+    asyncio.run(run())
+
+
+def test_wait_without_spill():
+    async def run():
+        queue = EventQueue(max_size=2)
+        for index in range(2):
+            await queue.put(_event(EventType.EVENT_TYPE_MESSAGE, index))
+
+        put = asyncio.ensure_future(queue.put(_event(EventType.EVENT_TYPE_MESSAGE, 2)))
+        await asyncio.sleep(0)
+        assert not put.done()
+        assert json.loads((await queue.get()).payload)['index'] == 0
+        await asyncio.wait_for(put, timeout=1)
+        assert queue.stats()['blocked'] == 1
+        assert [index for _, index in await _drain(queue)] == [1, 2]
+
+    asyncio.run(run())
+
+
+def test_puppet_consume_event_queue(puppet):
+    async def run():
+        puppet.enable_event_queue(max_size=10)
+        received = []
+        puppet.on('message', lambda payload: received.append(payload.message_id))
+
+        for index in range(3):
+            await puppet.event_queue.put(EventResponse(
+                type=EventType.EVENT_TYPE_MESSAGE,
+                payload=json.dumps({'messageId': f'message-{index}'})))
+        task = asyncio.ensure_future(puppet._consume_event_queue())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        assert received == ['message-0', 'message-1', 'message-2']
+
+    asyncio.run(run())
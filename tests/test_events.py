@@ -0,0 +1,37 @@
+"""
+unit test for event decoding
+"""
+import json
+
+from wechaty_grpc.wechaty.puppet import EventResponse, EventType
+from wechaty_puppet import EventHeartbeatPayload
+
+
+def test_skip_decoding_without_listener(puppet):
+    # the invalid payload is not decoded at all
+    puppet._on_event_response(EventResponse(  # pylint: disable=W0212
+        type=EventType.EVENT_TYPE_HEARTBEAT, payload='not json'))
+
+    payloads = []
+    puppet.on('heartbeat', payloads.append)
+    puppet._on_event_response(EventResponse(  # pylint: disable=W0212
+        type=EventType.EVENT_TYPE_HEARTBEAT, payload=json.dumps({'data': 'beat', 'timeout': 60})))
+    assert payloads == [EventHeartbeatPayload(data='beat')]
+
+
+def test_hook_without_listener(puppet):
+    puppet._on_event_response(EventResponse(  # pylint: disable=W0212
+        type=EventType.EVENT_TYPE_LOGIN, payload=json.dumps({'contactId': 'contact-id'})))
+    assert puppet.login_user_id == 'contact-id'
+
+
+def test_register_event_decoder(puppet):
+    payloads = []
+    puppet.on('dirty', payloads.append)
+    puppet.register_event_decoder(
+        int(EventType.EVENT_TYPE_DIRTY), 'dirty', lambda data: data['payloadId'])
+
+    puppet._on_event_response(EventResponse(  # pylint: disable=W0212
+        type=EventType.EVENT_TYPE_DIRTY,
+        payload=json.dumps({'payloadType': 2, 'payloadId': 'contact-id'})))
+    assert payloads == ['contact-id']
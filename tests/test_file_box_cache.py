@@ -0,0 +1,87 @@
+"""
+unit test for file box cache
+"""
+import asyncio
+import base64
+import json
+
+from wechaty_puppet import FileBox
+
+from wechaty_puppet_service import file_box_cache
+from wechaty_puppet_service.file_box_cache import FileBoxCache
+
+
+def _file_box(content: bytes, name: str) -> FileBox:
+    return FileBox.from_base64(base64.b64encode(content), name=name)
+
+
+def test_content_addressed_and_lru(tmp_path):
+    async def run():
+        cache = FileBoxCache(str(tmp_path), max_bytes=10)
+        await cache.put('key-1', _file_box(b'123456', 'a.txt'))
+        # the same content is saved once
+        await cache.put('key-2', _file_box(b'123456', 'b.txt'))
+        assert cache.stats()['files'] == 1
+
+        file_box = await cache.get('key-2')
+        assert file_box.name == 'b.txt'
+        assert base64.b64decode(file_box.base64) == b'123456'
+
+        await cache.put('key-3', _file_box(b'abcdef', 'c.txt'))
+        assert cache.evictions == 1
+        assert await cache.get('key-1') is None
+        assert cache.total_bytes == 6
+
+        # the index is rebuilt from the disk
+        assert await FileBoxCache(str(tmp_path)).get('key-3') is not None
+
+    asyncio.run(run())
+
+
+def test_metadata_restored_and_keys_evicted(tmp_path, monkeypatch):
+    async def run():
+        cache = FileBoxCache(str(tmp_path), max_bytes=10)
+        voice = _file_box(b'voice', 'voice.sil')
+        voice.mediaType = 'audio/silk'
+        voice.metadata = {'voiceLength': 3000}
+        await cache.put('voice', voice)
+
+        file_box = await FileBoxCache(str(tmp_path)).get('voice')
+        assert file_box.name == 'voice.sil'
+        assert file_box.mediaType == 'audio/silk'
+        assert file_box.metadata == {'voiceLength': 3000}
+        assert base64.b64decode(json.loads(file_box.to_json_str())['base64']) == b'voice'
+
+        avatar = FileBox.from_url('https://example.com/avatar.jpg', name='avatar.jpg',
+                                  headers={'Referer': 'https://example.com'})
+        monkeypatch.setattr(file_box_cache, 'file_box_content', lambda _: b'avatar')
+        await cache.put('url:avatar', avatar)
+        file_box = await cache.get('url:avatar')
+        assert file_box.remoteUrl == 'https://example.com/avatar.jpg'
+        assert file_box.headers == {'Referer': 'https://example.com'}
+        # the content is read when it's used
+        assert 'base64' not in file_box.__dict__
+        assert base64.b64decode(file_box.base64) == b'avatar'
+
+        # the key of the evicted content is removed too
+        assert cache.evictions == 1
+        key_files = [str(path) for path in (tmp_path / 'keys').rglob('*') if path.is_file()]
+        assert key_files == [cache._key_path('url:avatar')]  # pylint: disable=W0212
+
+    asyncio.run(run())
+
+
+def test_message_image_cached(tmp_path, puppet, stub):
+    async def run():
+        stub.delay = 0.01
+        stub.images['message-id'] = _file_box(b'image', 'message-id.jpg').to_json_str()
+        puppet.file_box_cache = FileBoxCache(str(tmp_path))
+
+        file_boxes = await asyncio.gather(
+            *[puppet.message_image('message-id') for _ in range(3)])
+        file_boxes.append(await puppet.message_image('message-id'))
+        assert all(base64.b64decode(file_box.base64) == b'image' for file_box in file_boxes)
+        assert file_boxes[-1].name == 'message-id.jpg'
+        assert stub.count('message_image') == 1
+
+    asyncio.run(run())
@@ -0,0 +1,77 @@
+"""
+unit test for room member index
+"""
+import asyncio
+import json
+
+from wechaty_grpc.wechaty.puppet import EventResponse, EventType
+from wechaty_puppet import RoomPayload
+
+from wechaty_puppet_service.index import RoomMemberIndex
+
+
+def test_room_member_index():
+    index = RoomMemberIndex()
+    index.set_members('room-1', ['a', 'b'])
+    index.set_members('room-2', ['b'])
+    assert sorted(index.rooms('b')) == ['room-1', 'room-2']
+
+    index.add_members('room-1', ['c'])
+    index.remove_members('room-1', ['b'])
+    assert sorted(index.members('room-1')) == ['a', 'c']
+    assert index.rooms('b') == ['room-2']
+
+    # the members fetched before the change are out of date
+    version = index.version('room-3')
+    index.add_members('room-3', ['d'])
+    assert not index.set_members('room-3', ['a'], version=version)
+    assert index.members('room-3') is None
+
+    index.remove_room('room-2')
+    assert index.rooms('b') == []
+    assert len(index) == 1
+
+    # the members are kept in the order of the service
+    index.set_members('room-4', ['owner', 'z', 'a'])
+    index.add_members('room-4', ['m'])
+    assert index.members('room-4') == ['owner', 'z', 'a', 'm']
+    assert index.members('room-4') == ['owner', 'z', 'a', 'm']
+
+
+def test_index_fed_by_events(puppet, stub):
+    async def run():
+        stub.rooms = {'room-1': RoomPayload(id='room-1'), 'room-2': RoomPayload(id='room-2')}
+        stub.room_members = {'room-1': ['a', 'b'], 'room-2': ['b']}
+
+        assert sorted(await puppet.contact_room_list('b')) == ['room-1', 'room-2']
+        assert stub.count('room_member_list') == 2
+
+        puppet._on_event_response(EventResponse(  # pylint: disable=W0212
+            type=EventType.EVENT_TYPE_ROOM_JOIN,
+            payload=json.dumps({'inviteeIdList': ['c'], 'inviterId': 'a',
+                                'roomId': 'room-2', 'timestamp': 0})
+        ))
+        puppet._on_event_response(EventResponse(  # pylint: disable=W0212
+            type=EventType.EVENT_TYPE_ROOM_LEAVE,
+            payload=json.dumps({'removeeIdList': ['b'], 'removerId': 'a',
+                                'roomId': 'room-1', 'timestamp': 0})
+        ))
+        assert await puppet.room_members('room-1') == ['a']
+        assert sorted(await puppet.room_members('room-2')) == ['b', 'c']
+        assert await puppet.contact_room_list('b') == ['room-2']
+        assert stub.count('room_member_list') == 2
+        # the rooms are listed once, and then answered from the index
+        assert stub.count('room_list') == 1
+
+        # a new room is indexed in the next call
+        stub.rooms['room-3'] = RoomPayload(id='room-3')
+        stub.room_members['room-3'] = ['b']
+        puppet._on_event_response(EventResponse(  # pylint: disable=W0212
+            type=EventType.EVENT_TYPE_ROOM_JOIN,
+            payload=json.dumps({'inviteeIdList': ['b'], 'inviterId': 'a',
+                                'roomId': 'room-3', 'timestamp': 0})
+        ))
+        assert sorted(await puppet.contact_room_list('b')) == ['room-2', 'room-3']
+        assert stub.count('room_list') == 2
+
+    asyncio.run(run())
@@ -0,0 +1,89 @@
+"""
+unit test for message store
+"""
+import asyncio
+import json
+
+from wechaty_grpc.wechaty.puppet import EventResponse, EventType
+from wechaty_puppet import MessagePayload, MessageQueryFilter, MessageType
+
+from wechaty_puppet_service.messages import MessageSpill, MessageStore
+
+
+def _message(index: int, room_id: str = 'room-1') -> MessagePayload:
+    return MessagePayload(
+        id=f'message-{index}', room_id=room_id, from_id=f'contact-{index % 2}',
+        text=f'hello {index}', timestamp=index, type=MessageType.MESSAGE_TYPE_TEXT)
+
+
+def test_query_memory():
+    store = MessageStore(max_size=3)
+    for index in range(5):
+        store.update(_message(index, room_id='room-1' if index % 2 else 'room-2'))
+
+    assert len(store) == 3
+    assert [p.id for p in store.query_memory(MessageQueryFilter(room_id='room-2'))] == \
+        ['message-2', 'message-4']
+    assert [p.id for p in store.query_memory(
+        MessageQueryFilter(type=MessageType.MESSAGE_TYPE_TEXT), limit=1)] == ['message-4']
+    assert [p.id for p in store.query_memory(since=3)] == ['message-3', 'message-4']
+    assert [p.id for p in store.query_memory(MessageQueryFilter(text='hello 3'))] == ['message-3']
+
+
+def test_spill(tmp_path):
+    async def run():
+        spill = MessageSpill(str(tmp_path / 'messages.db'))
+        store = MessageStore(max_size=2, spill=spill)
+        for index in range(5):
+            store.update(_message(index))
+
+        # the latest messages are served from memory only
+        assert [p.id for p in await store.query(limit=2)] == ['message-3', 'message-4']
+
+        payloads = await store.query(MessageQueryFilter(room_id='room-1', from_id='contact-0'))
+        assert [p.id for p in payloads] == ['message-0', 'message-2', 'message-4']
+        assert payloads[0].type == MessageType.MESSAGE_TYPE_TEXT
+        await spill.close()
+
+    asyncio.run(run())
+
+
+def _text_message(message_id: str) -> MessagePayload:
+    # the type of ts-wechaty-puppet, which is Text
+    return MessagePayload(id=message_id, room_id='room-1', text='hello', type=7)
+
+
+def test_message_search(puppet, stub):
+    async def run():
+        stub.messages = {message_id: _text_message(message_id)
+                         for message_id in ['message-1', 'message-2']}
+
+        for message_id in ['message-1', 'message-2']:
+            puppet._on_event_response(EventResponse(  # pylint: disable=W0212
+                type=EventType.EVENT_TYPE_MESSAGE,
+                payload=json.dumps({'messageId': message_id})
+            ))
+        await puppet.message_payload('message-2')
+
+        assert await puppet.message_search(MessageQueryFilter(room_id='room-1')) == ['message-2']
+        assert await puppet.message_search(
+            MessageQueryFilter(type=MessageType.MESSAGE_TYPE_TEXT)) == ['message-2']
+
+    asyncio.run(run())
+
+
+def test_message_payload_cached_by_forward(puppet, stub):
+    async def run():
+        # the type of ts-wechaty-puppet, which is Url
+        stub.messages['message-1'] = MessagePayload(id='message-1', type=14)
+        stub.url_links['message-1'] = {'url': 'https://wechaty.js.org'}
+
+        await puppet.message_forward('room-1', 'message-1')
+        payload = await puppet.message_payload('message-1')
+        assert payload.type == MessageType.MESSAGE_TYPE_URL
+        url_links = await asyncio.gather(*[puppet.message_url('message-1') for _ in range(3)])
+        assert all(url_link.url == 'https://wechaty.js.org' for url_link in url_links)
+
+        assert stub.calls == ['message_payload', 'message_url', 'message_send_url']
+
+    asyncio.run(run())
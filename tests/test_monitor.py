@@ -0,0 +1,44 @@
+"""
+unit test for liveness monitor
+"""
+import asyncio
+
+from wechaty_puppet_service.monitor import LivenessMonitor, percentile
+
+
+def test_percentile():
+    assert percentile([], 0.5) is None
+    assert percentile([4, 3, 2, 1], 0.5) == 2
+    assert percentile(list(range(1, 101)), 0.99) == 99
+    assert percentile([1], 0.99) == 1
+
+
+def test_probe_rtt_and_loss():
+    async def probe():
+        lost = {'enabled': False}
+
+        async def ding(data: str) -> None:
+            if lost['enabled']:
+                return
+            loop = asyncio.get_event_loop()
+            loop.call_later(0.01, monitor.on_dong, data)
+
+        monitor = LivenessMonitor(ding, timeout=0.1, loss_threshold=0.3)
+
+        for _ in range(3):
+            rtt = await monitor.probe()
+            assert rtt is not None and rtt >= 0.01
+        assert monitor.p50 is not None
+        assert monitor.loss_ratio == 0
+        assert not monitor.degraded
+
+        # the dong of user is not swallowed
+        assert not monitor.on_dong('user-data')
+
+        lost['enabled'] = True
+        for _ in range(2):
+            assert await monitor.probe() is None
+        assert monitor.loss_ratio == 0.4
+        assert monitor.degraded
+
+    asyncio.run(probe())
@@ -0,0 +1,55 @@
+"""
+unit test for prefetching the payloads
+"""
+import asyncio
+
+from wechaty_puppet import ContactPayload, RoomPayload
+
+
+def _add_payloads(stub) -> None:
+    """two contacts and one room, the payload of contact-2 is broken"""
+    stub.contacts = {contact_id: ContactPayload(id=contact_id)
+                     for contact_id in ['contact-1', 'contact-2']}
+    stub.rooms = {'room-1': RoomPayload(id='room-1')}
+    stub.room_members = {'room-1': ['contact-1']}
+    stub.broken.add('contact-2')
+
+
+def test_prefetch(puppet, stub):
+    async def run():
+        _add_payloads(stub)
+
+        reports = []
+        progress = await puppet.prefetch(concurrency=2, on_progress=reports.append)
+        assert (progress.contacts, progress.rooms, progress.room_members) == (2, 1, 1)
+        # 3 payloads and 1 member list are fetched, contact-2 is failed
+        assert (progress.fetched, progress.failed) == (4, 1)
+        assert progress.done == progress.total == 5
+        assert reports[-1] is progress
+
+        calls = len(stub.calls)
+        await puppet.contact_payload('contact-1')
+        await puppet.room_payload('room-1')
+        await puppet.room_member_payload('room-1', 'contact-1')
+        assert len(stub.calls) == calls
+
+    asyncio.run(run())
+
+
+def test_prefetch_cancelled_when_logged_out(puppet, stub):
+    async def run():
+        _add_payloads(stub)
+        # the payloads are never returned
+        stub.gate = asyncio.Event()
+
+        prefetch = asyncio.ensure_future(puppet.prefetch())
+        await asyncio.sleep(0.01)
+        puppet._reset_account_state()  # pylint: disable=W0212
+        try:
+            await asyncio.wait_for(prefetch, 1)
+            assert False, 'the prefetch should be cancelled'
+        except asyncio.CancelledError:
+            pass
+        assert not puppet._prefetch_tasks  # pylint: disable=W0212
+
+    asyncio.run(run())
@@ -0,0 +1,54 @@
+"""
+unit test for recording and replaying the event stream
+"""
+import asyncio
+import json
+import time
+
+from wechaty_grpc.wechaty.puppet import EventResponse, EventType
+
+from wechaty_puppet_service.recording import EventRecorder, read_recording
+
+
+def _record(path, count: int, interval: float = 0.0) -> None:
+    timestamps = iter([1000 + index * interval for index in range(count)])
+    recorder = EventRecorder(str(path), clock=lambda: next(timestamps))
+    for index in range(count):
+        recorder.record(EventResponse(type=EventType.EVENT_TYPE_MESSAGE,
+                                      payload=json.dumps({'messageId': f'message-{index}'})))
+    recorder.close()
+
+
+def test_read_recording(tmp_path):
+    path = tmp_path / 'events.rec'
+    _record(path, 3, interval=0.5)
+    # the truncated record is ignored
+    with open(path, 'ab') as f:
+        f.write(b'\x00\x01')
+
+    records = list(read_recording(str(path)))
+    assert [timestamp for timestamp, _ in records] == [1000, 1000.5, 1001]
+    assert [json.loads(response.payload)['messageId'] for _, response in records] == \
+        ['message-0', 'message-1', 'message-2']
+    assert records[0][1].type == EventType.EVENT_TYPE_MESSAGE
+
+
+def test_replay_events(tmp_path, puppet):
+    path = tmp_path / 'events.rec'
+    _record(path, 3, interval=0.1)
+
+    async def run():
+        received = []
+        puppet.on('message', lambda payload: received.append(payload.message_id))
+
+        start = time.perf_counter()
+        assert await puppet.replay_events(str(path), speed=2) == 3
+        assert time.perf_counter() - start >= 0.09
+        assert received == ['message-0', 'message-1', 'message-2']
+
+        start = time.perf_counter()
+        assert await puppet.replay_events(str(path), speed=None) == 3
+        assert time.perf_counter() - start < 0.09
+        assert len(received) == 6
+
+    asyncio.run(run())
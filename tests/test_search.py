@@ -0,0 +1,107 @@
+"""
+unit test for local search indexes
+"""
+import asyncio
+import json
+import re
+
+from wechaty_grpc.wechaty.puppet import EventResponse, EventType
+from wechaty_puppet import (
+    ContactPayload,
+    ContactQueryFilter,
+    RoomPayload,
+    RoomQueryFilter,
+)
+
+from wechaty_puppet_service.search import ContactSearchIndex, RoomSearchIndex
+
+
+def test_room_search_index():
+    index = RoomSearchIndex()
+    index.update('room-1', 'Wechaty Developers')
+    index.update('room-2', 'Wechaty Users')
+    index.update('room-3', 'Python')
+
+    assert index.exact('Python') == ['room-3']
+    assert sorted(index.prefix('Wechaty')) == ['room-1', 'room-2']
+    assert index.contains('Dev') == ['room-1']
+    assert sorted(index.regex(r'(?i)wechaty\s+u')) == ['room-2']
+
+    index.update('room-3', 'Wechaty Python')
+    assert index.exact('Python') == []
+    assert len(index.prefix('Wechaty')) == 3
+
+    index.remove('room-1')
+    assert index.contains('Dev') == []
+
+
+def test_room_search(puppet, stub):
+    async def run():
+        stub.rooms = {room_id: RoomPayload(id=room_id, topic=f'topic of {room_id}')
+                      for room_id in ['room-1', 'room-2']}
+
+        assert await puppet.room_search(RoomQueryFilter(topic='topic of room-1')) == ['room-1']
+        assert sorted(await puppet.room_search(
+            RoomQueryFilter(topic=re.compile('^topic')))) == ['room-1', 'room-2']
+        assert await puppet.room_search(RoomQueryFilter(id='room-2')) == ['room-2']
+
+        puppet._on_event_response(EventResponse(  # pylint: disable=W0212
+            type=EventType.EVENT_TYPE_ROOM_TOPIC,
+            payload=json.dumps({
+                'changerId': 'contact-id', 'newTopic': 'Wechaty', 'oldTopic': 'topic of room-2',
+                'roomId': 'room-2', 'timestamp': 0
+            })
+        ))
+        assert await puppet.room_search(RoomQueryFilter(topic='Wechaty')) == ['room-2']
+        assert stub.count('room_payload') == 2
+
+        # the cached payloads are indexed again after logout
+        puppet._reset_account_state()  # pylint: disable=W0212
+        assert await puppet.room_search(RoomQueryFilter(topic='topic of room-1')) == ['room-1']
+
+    asyncio.run(run())
+
+
+def test_contact_search_index():
+    index = ContactSearchIndex()
+    index.update('contact-1', {'name': '李卓桓', 'alias': 'Huan', 'weixin': 'zixia'})
+    index.update('contact-2', {'name': '吴京京', 'alias': 'Jingjing'})
+
+    assert index.search('卓桓') == ['contact-1']
+    assert index.search('京') == ['contact-2']
+    # the last character of the name
+    assert index.search('桓') == ['contact-1']
+    assert index.search('HUAN') == ['contact-1']
+    assert index.search('李京') == []
+    assert index.match('weixin', 'zixia') == ['contact-1']
+    assert index.match('alias', re.compile('^Jing')) == ['contact-2']
+
+    index.update_field('contact-1', 'alias', 'Huan LI')
+    assert index.search('huan li') == ['contact-1']
+    index.remove('contact-2')
+    assert index.search('京') == []
+
+
+def test_contact_search(puppet, stub):
+    async def run():
+        stub.contacts = {
+            contact_id: ContactPayload(id=contact_id, name=name, alias=f'alias of {contact_id}')
+            for contact_id, name in [('contact-1', '李卓桓'), ('contact-2', '吴京京')]
+        }
+
+        assert await puppet.contact_search('京京') == ['contact-2']
+        assert await puppet.contact_search(ContactQueryFilter(name='李卓桓')) == ['contact-1']
+        assert stub.count('contact_payload') == 2
+
+        await puppet.contact_alias('contact-2', 'Jingjing')
+        assert await puppet.contact_search(
+            ContactQueryFilter(alias=re.compile('jing', re.I))) == ['contact-2']
+        assert stub.count('contact_payload') == 2
+
+        # the cached payloads are indexed again after logout
+        puppet._reset_account_state()  # pylint: disable=W0212
+        assert await puppet.contact_search('卓桓') == ['contact-1']
+        # only contact-2 is fetched again, whose alias is changed
+        assert stub.count('contact_payload') == 3
+
+    asyncio.run(run())
@@ -0,0 +1,64 @@
+"""
+unit test for payload store
+"""
+import asyncio
+import sqlite3
+
+from wechaty_puppet import ContactPayload
+from wechaty_puppet.schemas.types import PayloadType
+
+from wechaty_puppet_service.store import PayloadStore
+
+
+def test_write_behind_and_versioning(tmp_path):
+    path = str(tmp_path / 'payloads.db')
+
+    async def run():
+        store = PayloadStore(path, flush_interval=60)
+        store.put(1, 'contact-id', b'v1')
+        store.put(1, 'contact-id', b'v2')
+        store.put(1, 'removed-id', b'v1')
+        store.delete(1, 'removed-id')
+
+        # nothing is written before the flush
+        assert await store.load(1) == {}
+
+        await store.flush()
+        records = await store.load(1)
+        assert list(records) == ['contact-id']
+        assert records['contact-id'][0] == b'v2'
+        assert store.flushes == 1
+
+        store.put(1, 'contact-id', b'v3')
+        await store.close()
+
+        # the database and its thread are opened again after closing
+        assert (await store.load(1))['contact-id'][0] == b'v3'
+        await store.close()
+
+    asyncio.run(run())
+
+    conn = sqlite3.connect(path)
+    assert conn.execute('SELECT version, data FROM payloads').fetchall() == [(2, b'v3')]
+    conn.close()
+
+
+def test_warm_up_payload_cache(tmp_path, puppet, stub):
+    path = str(tmp_path / 'payloads.db')
+
+    async def run():
+        store = PayloadStore(path)
+        store.put(PayloadType.PAYLOAD_TYPE_CONTACT.value, 'contact-id',
+                  bytes(ContactPayload(id='contact-id', name='wechaty')))
+        await store.close()
+
+        puppet.payload_store = PayloadStore(path)
+        await puppet._load_payload_store()  # pylint: disable=W0212
+
+        # the payload is served without calling the stub
+        payload = await puppet.contact_payload('contact-id')
+        assert payload.name == 'wechaty'
+        assert stub.calls == []
+        await puppet.payload_store.close()
+
+    asyncio.run(run())
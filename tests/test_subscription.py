@@ -0,0 +1,65 @@
+"""
+unit test for the batch consumption of events
+"""
+import asyncio
+import json
+
+from wechaty_grpc.wechaty.puppet import EventResponse, EventType
+
+from wechaty_puppet_service.subscription import EventSubscription
+
+
+def _message_event(index: int) -> EventResponse:
+    return EventResponse(type=EventType.EVENT_TYPE_MESSAGE,
+                         payload=json.dumps({'messageId': f'message-{index}'}))
+
+
+def test_events_in_batches(puppet):
+    async def run():
+        batches = []
+
+        async def consume():
+            async for batch in puppet.events(types=['message'], max_batch=4, max_wait_ms=10):
+                batches.append([event.payload.message_id for event in batch])
+
+        task = asyncio.ensure_future(consume())
+        await asyncio.sleep(0)
+        for index in range(6):
+            puppet._on_event_response(_message_event(index))
+        # the heartbeat is not subscribed
+        puppet._on_event_response(EventResponse(
+            type=EventType.EVENT_TYPE_HEARTBEAT, payload=json.dumps({'data': 'heartbeat'})))
+        await asyncio.sleep(0.05)
+
+        for subscription in puppet._subscriptions:
+            subscription.close()
+        await asyncio.wait_for(task, timeout=1)
+        assert batches == [
+            ['message-0', 'message-1', 'message-2', 'message-3'],
+            ['message-4', 'message-5'],
+        ]
+        assert not puppet._subscriptions
+
+    asyncio.run(run())
+
+
+def test_backpressure():
+    async def run():
+        subscription = EventSubscription(max_size=2)
+        subscription.put('message', 0)
+        subscription.put('message', 1)
+        assert subscription.full
+
+        waiter = asyncio.ensure_future(subscription.wait_for_capacity())
+        await asyncio.sleep(0)
+        assert not waiter.done()
+
+        batch = await subscription.get_batch(max_batch=1, max_wait_ms=0)
+        assert [event.payload for event in batch] == [0]
+        await asyncio.wait_for(waiter, timeout=1)
+
+        subscription.close()
+        assert [event.payload for event in await subscription.get_batch()] == [1]
+        assert await subscription.get_batch() == []
+
+    asyncio.run(run())
@@ -0,0 +1,124 @@
+"""
+unit test for the event stream supervisor
+"""
+import asyncio
+import json
+
+from grpclib.const import Status
+from grpclib.exceptions import GRPCError
+
+from wechaty_grpc.wechaty.puppet import EventResponse, EventType
+
+from wechaty_puppet_service.channel_pool import ChannelPool, PooledPuppetStub
+from wechaty_puppet_service.supervisor import ExponentialBackoff
+
+
+def _heartbeat() -> EventResponse:
+    return EventResponse(
+        type=EventType.EVENT_TYPE_HEARTBEAT,
+        payload=json.dumps({'data': 'heartbeat'})
+    )
+
+
+class FlakyStub:
+    """the event stream of this stub is broken or stalled after one heartbeat"""
+
+    def __init__(self, puppet) -> None:
+        self.puppet = puppet
+        self.connections = 0
+
+    async def event(self):
+        self.connections += 1
+        yield _heartbeat()
+        if self.connections == 1:
+            raise GRPCError(Status.UNAVAILABLE, 'service is restarting')
+        if self.connections == 2:
+            await asyncio.sleep(10)
+        # stop the puppet after the third connection
+        self.puppet._puppet_stub = None  # pylint: disable=W0212
+
+
+def test_backoff():
+    backoff = ExponentialBackoff(initial=1, maximum=4, jitter=0)
+    assert [backoff.next_delay() for _ in range(4)] == [1, 2, 4, 4]
+    backoff.reset()
+    assert backoff.next_delay() == 1
+
+    backoff = ExponentialBackoff(initial=1, maximum=4, jitter=0.5)
+    assert 0.5 <= backoff.next_delay() <= 1
+
+
+def test_reconnect_event_stream(puppet):
+    async def listen():
+        puppet.event_stream_stall_timeout = 0.1
+
+        pool = ChannelPool(['127.0.0.1:8788'], max_failures=100)
+        stub = FlakyStub(puppet)
+        pool.members[0].stub = stub
+        puppet._channel_pool = pool  # pylint: disable=W0212
+        puppet._puppet_stub = PooledPuppetStub(pool)  # pylint: disable=W0212
+
+        heartbeats = []
+        puppet.on('heartbeat', heartbeats.append)
+
+        puppet.event_stream_backoff = ExponentialBackoff(initial=0.01, jitter=0)
+        await puppet._listen_for_event()  # pylint: disable=W0212
+
+        assert stub.connections == 3
+        assert len(heartbeats) == 3
+        assert puppet.event_stream_metrics.reconnects == 2
+        assert puppet.event_stream_metrics.stalls == 1
+        assert puppet.event_stream_metrics.downtime > 0
+        pool.close()
+
+    asyncio.run(listen())
+
+
+class StoppedStub:
+    """the event stream is broken by stop() after the responses"""
+
+    def __init__(self, puppet, responses=None) -> None:
+        self.puppet = puppet
+        self.responses = responses or [_heartbeat()]
+
+    async def event(self):
+        for response in self.responses:
+            yield response
+        self.puppet._puppet_stub = None  # pylint: disable=W0212
+        self.puppet._channel_pool = None  # pylint: disable=W0212
+        raise GRPCError(Status.CANCELLED, 'channel is closed')
+
+
+def test_stop_while_listening(puppet):
+    async def listen():
+        pool = ChannelPool(['127.0.0.1:8788'], max_failures=100)
+        pool.members[0].stub = StoppedStub(puppet)
+        puppet._channel_pool = pool  # pylint: disable=W0212
+        puppet._puppet_stub = PooledPuppetStub(pool)  # pylint: disable=W0212
+
+        # the listener exits without touching the dropped pool
+        await puppet._listen_for_event()  # pylint: disable=W0212
+        pool.close()
+
+    asyncio.run(listen())
+
+
+def test_bad_event_does_not_break_stream(puppet):
+    async def listen():
+        pool = ChannelPool(['127.0.0.1:8788'], max_failures=100)
+        pool.members[0].stub = StoppedStub(puppet, responses=[
+            # the message event without messageId
+            EventResponse(type=EventType.EVENT_TYPE_MESSAGE, payload=json.dumps({})),
+            EventResponse(type=EventType.EVENT_TYPE_MESSAGE,
+                          payload=json.dumps({'messageId': 'message-1'})),
+        ])
+        puppet._channel_pool = pool  # pylint: disable=W0212
+        puppet._puppet_stub = PooledPuppetStub(pool)  # pylint: disable=W0212
+
+        received = []
+        puppet.on('message', lambda payload: received.append(payload.message_id))
+        await puppet._listen_for_event()  # pylint: disable=W0212
+        assert received == ['message-1']
+        pool.close()
+
+    asyncio.run(listen())
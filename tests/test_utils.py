@@ -1,9 +1,19 @@
 """
 unit test for utils module
 """
+import asyncio
+import socket
+
+import pytest
+from wechaty_puppet.exceptions import WechatyPuppetPayloadError
+
 from wechaty_puppet_service.utils import (
     extract_host_and_port,
-    ping_endpoint
+    message_emoticon,
+    parse_emoticon,
+    ping_endpoint,
+    probe_endpoint,
+    probe_endpoints,
 )
 
 
@@ -39,3 +49,69 @@ def test_ping_endpoint():
 
     invalid_endpoint: str = 'https://www.abababa111111.com'
     assert not ping_endpoint(invalid_endpoint)
+
+
+def _unused_endpoint() -> str:
+    """get a local endpoint which is refusing connections"""
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return f'127.0.0.1:{port}'
+
+
+def test_probe_endpoints():
+    async def probe():
+        server = await asyncio.start_server(
+            lambda reader, writer: writer.close(), '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        valid_endpoint = f'127.0.0.1:{port}'
+
+        latency = await probe_endpoint(valid_endpoint)
+        assert latency is not None and latency >= 0
+        assert await probe_endpoint(_unused_endpoint()) is None
+
+        result = await probe_endpoints([_unused_endpoint(), valid_endpoint])
+        assert result is not None
+        assert result[0] == valid_endpoint
+
+        assert await probe_endpoints([_unused_endpoint()]) is None
+        assert await probe_endpoints([]) is None
+
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(probe())
+
+
+EMOTICON_MESSAGE = (
+    '<msg><emoji fromusername="wxid_from" tousername="wxid_to" type="2" '
+    'md5="e5a7d2b5c1b1f4b6d0c6a1e3b1f5d7a9" len="1024" '
+    'cdnurl="http://emoji.qpic.cn/wx_emoji/abc/?a=1&amp;b=2" '
+    'width="240" height="240" /></msg>'
+)
+
+
+def test_message_emoticon():
+    async def run():
+        file_box = await message_emoticon(EMOTICON_MESSAGE)
+        assert file_box.remoteUrl == 'http://emoji.qpic.cn/wx_emoji/abc/?a=1&b=2'
+        assert file_box.name == 'e5a7d2b5c1b1f4b6d0c6a1e3b1f5d7a9.gif'
+
+        # the sticker is identified by md5, and every caller gets its own FileBox
+        file_box.name = 'renamed.gif'
+        other_message = EMOTICON_MESSAGE.replace('abc', 'def')
+        another = await message_emoticon(other_message)
+        assert another is not file_box
+        assert another.remoteUrl == 'http://emoji.qpic.cn/wx_emoji/abc/?a=1&b=2'
+        assert another.name == 'e5a7d2b5c1b1f4b6d0c6a1e3b1f5d7a9.gif'
+
+        # the stickers without md5 are not cached
+        first = await message_emoticon('<msg><emoji cdnurl="http://emoji/1" /></msg>')
+        second = await message_emoticon('<msg><emoji cdnurl="http://emoji/2" /></msg>')
+        assert (first.remoteUrl, second.remoteUrl) == ('http://emoji/1', 'http://emoji/2')
+
+    asyncio.run(run())
+
+    with pytest.raises(WechatyPuppetPayloadError):
+        parse_emoticon('<msg><img /></msg>')